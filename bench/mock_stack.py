@@ -0,0 +1,728 @@
+"""
+Local stand-ins for the services the bot talks to: Gamma, the CLOB, the Data
+API, the CLOB market WebSocket channel and a Polygon JSON-RPC node, seeded
+from one synthetic universe.
+
+Each service is a ThreadingHTTPServer on 127.0.0.1 (random port) that
+counts requests per route. The state is just rich enough for the bot's
+code paths to run end to end: paged /markets and /events feeds, batch
+books, open orders that fill a few at a time, batch post/cancel, Data API
+positions (some untracked, some redeemable), CTF TransferSingle logs and
+balances, and transactions that are mined as soon as they are sent.
+
+The WebSocket server speaks just enough RFC 6455 for websocket-client.
+On ws://…/ws/market, subscriptions get `book` snapshots with a per-asset
+`seq` and push_price_change() sends deltas. On ws://…/ws/user, every order
+that fills (Universe.fill) is announced to authenticated connections as an
+`order` UPDATE plus a `trade`. drop_ws() cuts every connection so
+reconnect paths can be exercised.
+
+Used by bench/suite.py; also handy on its own:
+    python bench/mock_stack.py --markets 1000 --positions 50
+"""
+
+import re
+import sys
+import json
+import time
+import base64
+import struct
+import socket
+import hashlib
+import random
+import argparse
+import threading
+from datetime import datetime, timezone, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+from eth_abi import decode as abi_decode, encode as abi_encode
+from eth_account import Account
+from web3 import Web3
+
+TAGS = ["crypto", "sports", "economics", "business"]
+HEAD_BLOCK = 70_000_000
+USDC_BALANCE = 50_000 * 10**6
+END_CURSOR = "LTE="
+
+SEL_ERC20_BALANCE = Web3.keccak(text="balanceOf(address)")[:4].hex()
+SEL_CTF_BALANCE = Web3.keccak(text="balanceOf(address,uint256)")[:4].hex()
+SEL_BALANCE_BATCH = Web3.keccak(text="balanceOfBatch(address[],uint256[])")[:4].hex()
+SEL_APPROVED = Web3.keccak(text="isApprovedForAll(address,address)")[:4].hex()
+TRANSFER_SINGLE = Web3.to_hex(Web3.keccak(text="TransferSingle(address,address,address,uint256,uint256)"))
+
+
+def _iso(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _topic(address: str) -> str:
+    return "0x" + "0" * 24 + address.lower().replace("0x", "")
+
+
+class Universe:
+    """Synthetic markets, positions, orders and chain state for one wallet."""
+
+    def __init__(self, n_markets: int, n_positions: int, wallet: str, seed: int = 7):
+        rng = random.Random(seed)
+        self.rng = random.Random(seed + 1)
+        self.wallet = wallet
+        now = datetime.now(timezone.utc)
+        self.lock = threading.Lock()
+
+        self.markets = []
+        self.tokens = {}  # token_id -> (market, outcome index, price)
+        for i in range(n_markets):
+            # A third of the outcomes sit inside the default buy band so scoring has work to do
+            p0 = round(rng.uniform(0.16, 0.28), 2) if rng.random() < 0.35 else round(rng.uniform(0.02, 0.98), 2)
+            prices = [p0, round(1 - p0, 2)]
+            tids = [str(rng.getrandbits(250)) for _ in prices]
+            end = now + timedelta(hours=rng.uniform(2, 24 * 6))
+            m = {
+                "id": str(600000 + i),
+                "question": f"Synthetic market {i}?",
+                "conditionId": "0x" + format(rng.getrandbits(256), "064x"),
+                "clobTokenIds": json.dumps(tids),
+                "outcomePrices": json.dumps([str(p) for p in prices]),
+                "outcomes": json.dumps(["Yes", "No"]),
+                "endDate": _iso(end),
+                "updatedAt": _iso(now - timedelta(seconds=rng.uniform(0, 3600))),
+                "volumeNum": round(rng.uniform(0, 2_000_000), 2),
+                "volume24hr": round(rng.uniform(0, 200_000), 2),
+                "bestBid": round(max(p0 - 0.01, 0.01), 2),
+                "bestAsk": p0,
+                "spread": 0.01,
+                "orderPriceMinTickSize": 0.001,
+                "negRisk": rng.random() < 0.2,
+                "active": True,
+                "closed": False,
+                "_tag": TAGS[i % len(TAGS)],
+                "_end_ts": end.timestamp(),
+            }
+            self.markets.append(m)
+            for k, tid in enumerate(tids):
+                self.tokens[tid] = (m, k, prices[k])
+        self.by_id = {m["id"]: m for m in self.markets}
+        self.by_volume = sorted(self.markets, key=lambda m: -m["volume24hr"])
+        self.by_updated = sorted(self.markets, key=lambda m: m["updatedAt"], reverse=True)
+        # ~10% of markets also appear in tag events, five markets per event
+        self.events = {t: [] for t in TAGS}
+        for t in TAGS:
+            tagged = [m for m in self.by_volume if m["_tag"] == t][: max(5, n_markets // 40)]
+            for j in range(0, len(tagged), 5):
+                self.events[t].append({"id": f"{t}-{j // 5}", "markets": tagged[j:j + 5]})
+
+        # Positions: held (with a live sell), pending (live buy), and a few in resolved markets
+        self.orders = {}           # order_id -> CLOB order dict
+        self.balances = {}         # token_id (int) -> raw CTF balance
+        self.positions = []        # bot-shaped position dicts to seed the state store
+        self.closed = []           # closed-history rows whose tokens are still on chain
+        picks = rng.sample(self.markets, min(len(self.markets), n_positions + n_positions // 5 + 4))
+        for j, m in enumerate(picks[:n_positions]):
+            tid = json.loads(m["clobTokenIds"])[0]
+            price = float(json.loads(m["outcomePrices"])[0])
+            size = 40
+            held = j % 3 != 0
+            buy_id = self._order(tid, "BUY", price, size, "MATCHED" if held else "LIVE")
+            sell_id = self._order(tid, "SELL", 0.40, size, "LIVE") if held else None
+            if held:
+                self.balances[int(tid)] = size * 10**6
+            if j % 20 == 7:
+                m["closed"] = True  # resolved — the claim path picks these up
+            self.positions.append({
+                "buy_order_id": buy_id, "sell_order_id": sell_id, "market_id": m["id"],
+                "question": m["question"] + " → Yes", "token_id": tid, "condition_id": m["conditionId"],
+                "buy_price": price, "sell_target": 0.40, "size": size, "cost": round(price * size, 2),
+                "tick_size": 0.01, "neg_risk": m["negRisk"], "end_date": m["endDate"],
+                "status": "held" if held else "pending",
+                "placed_at": (now - timedelta(minutes=rng.uniform(1, 90))).isoformat(),
+            })
+        # Closed positions with tokens left on chain (sweep candidates), half of them resolved
+        for j, m in enumerate(picks[n_positions:n_positions + n_positions // 5 + 2]):
+            tid = json.loads(m["clobTokenIds"])[1]
+            self.balances[int(tid)] = 5 * 10**6
+            m["closed"] = j % 2 == 0
+            self.closed.append({
+                "question": m["question"] + " → No", "buy_price": 0.2, "exit_price": 0.0, "size": 5,
+                "cost": 1.0, "revenue": 0.0, "pnl": -1.0, "exit_type": "expired", "opened_at": "",
+                "closed_at": _iso(now), "token_id": tid, "condition_id": m["conditionId"],
+                "market_id": m["id"],
+            })
+        # Data API: everything held, plus two untracked holdings and one redeemable
+        extra = picks[-2:]
+        self.data_positions = [{
+            "asset": p["token_id"], "conditionId": p["condition_id"], "size": p["size"],
+            "avgPrice": p["buy_price"], "curPrice": p["buy_price"], "outcome": "Yes",
+            "title": p["question"], "redeemable": False, "negativeRisk": p["neg_risk"],
+        } for p in self.positions if p["status"] == "held"]
+        for k, m in enumerate(extra):
+            tid = json.loads(m["clobTokenIds"])[0]
+            self.balances[int(tid)] = 10 * 10**6
+            self.data_positions.append({
+                "asset": tid, "conditionId": m["conditionId"], "size": 10, "avgPrice": 0.2,
+                "curPrice": 1.0 if k == 0 else 0.2, "outcome": "Yes", "title": m["question"],
+                "redeemable": k == 0, "negativeRisk": False,
+            })
+        self.head = HEAD_BLOCK
+        self.transfers = [(HEAD_BLOCK - rng.randint(10, 600_000), tid, bal) for tid, bal in self.balances.items()]
+        self.max_log_range = None  # eth_getLogs rejects wider ranges as "too many results" when set
+        self.logs_down = False  # eth_getLogs fails outright while set
+        self.txs = {}
+        self.on_fill = None  # called with each order dict that fills (MockStack pushes it to ws/user)
+
+    def _order(self, token_id: str, side: str, price: float, size: float, status: str) -> str:
+        oid = "0x" + format(self.rng.getrandbits(256), "064x")
+        self.orders[oid] = {
+            "id": oid, "status": status, "side": side, "asset_id": token_id, "price": str(price),
+            "original_size": str(size), "size_matched": str(size if status == "MATCHED" else 0),
+            "order_type": "GTC", "created_at": int(time.time()),
+        }
+        return oid
+
+    # ── CLOB behaviour ──
+
+    def book(self, token_id: str) -> dict:
+        m, _, price = self.tokens.get(token_id, ({"conditionId": "", "negRisk": False}, 0, 0.5))
+        ask = round(price, 3)
+        bid = round(max(ask - 0.001 * (1 + int(token_id[-1]) % 8), 0.001), 3)  # 1-8 ticks wide
+        return {
+            "market": m["conditionId"], "asset_id": token_id, "timestamp": str(int(time.time() * 1000)),
+            "hash": token_id[:16], "min_order_size": "5", "tick_size": "0.001", "neg_risk": m["negRisk"],
+            "last_trade_price": str(price),
+            "bids": [{"price": f"{max(bid - 0.001 * k, 0.001):.3f}", "size": str(100 + 50 * k)} for k in range(4, -1, -1)],
+            "asks": [{"price": f"{min(ask + 0.001 * k, 0.999):.3f}", "size": str(80 + 40 * k)} for k in range(4, -1, -1)],
+        }
+
+    def advance(self):
+        """Called on each open-orders snapshot: ~10% of live buys and ~3% of live sells fill."""
+        with self.lock:
+            for o in self.orders.values():
+                if o["status"] == "LIVE" and self.rng.random() < (0.10 if o["side"] == "BUY" else 0.03):
+                    self._fill(o)
+
+    def fill(self, order_id: str):
+        """Fill one live order now."""
+        with self.lock:
+            o = self.orders[order_id]
+            if o["status"] == "LIVE":
+                self._fill(o)
+
+    def _fill(self, o: dict):
+        o["status"] = "MATCHED"
+        o["size_matched"] = o["original_size"]
+        if o["side"] == "BUY":
+            tid = int(o["asset_id"])
+            self.balances[tid] = self.balances.get(tid, 0) + int(float(o["original_size"]) * 10**6)
+        if self.on_fill:
+            self.on_fill(dict(o))
+
+    def post(self, entry: dict) -> dict:
+        order, otype = entry["order"], entry.get("orderType", "GTC")
+        tid = str(order["tokenId"])
+        side = "BUY" if str(order["side"]).upper() in ("BUY", "0") else "SELL"
+        maker, taker = int(order["makerAmount"]), int(order["takerAmount"])
+        size = (taker if side == "BUY" else maker) / 10**6
+        price = round((maker / taker) if side == "BUY" else (taker / maker), 4) if maker and taker else 0
+        oid = "0x" + format(int(order["salt"]) & (2**256 - 1), "064x")
+        with self.lock:
+            if oid in self.orders and otype == "GTC" and self.orders[oid]["status"] == "LIVE":
+                return {"success": False, "errorMsg": "order already exists", "orderID": ""}
+            if otype in ("FAK", "FOK"):
+                ask = self.tokens.get(tid, (None, 0, 1.0))[2]
+                if side == "BUY" and price >= ask and self.rng.random() < 0.5:
+                    self.orders[oid] = {"id": oid, "status": "MATCHED", "side": side, "asset_id": tid,
+                                        "price": str(price), "original_size": str(size),
+                                        "size_matched": str(size), "order_type": otype}
+                    self.balances[int(tid)] = self.balances.get(int(tid), 0) + int(size * 10**6)
+                    if self.on_fill:
+                        self.on_fill(dict(self.orders[oid]))
+                    return {"success": True, "errorMsg": "", "orderID": oid, "status": "matched"}
+                return {"success": False, "errorMsg": "no orders found to match with FAK order", "orderID": ""}
+            self.orders[oid] = {"id": oid, "status": "LIVE", "side": side, "asset_id": tid, "price": str(price),
+                                "original_size": str(size), "size_matched": "0", "order_type": otype}
+        return {"success": True, "errorMsg": "", "orderID": oid, "status": "live"}
+
+    def cancel(self, ids: list) -> dict:
+        out = {"canceled": [], "not_canceled": {}}
+        with self.lock:
+            for oid in ids:
+                o = self.orders.get(oid)
+                if o and o["status"] == "LIVE":
+                    o["status"] = "CANCELED"
+                    out["canceled"].append(oid)
+                else:
+                    out["not_canceled"][oid] = "order can't be found - already canceled or matched"
+        return out
+
+    # ── chain behaviour ──
+
+    def receive(self, token_id: int, amount: int, blocks: int = 1):
+        """Mine `blocks` new blocks, the first one holding an inbound transfer of `amount` of token_id."""
+        with self.lock:
+            self.transfers.append((self.head + 1, token_id, amount))
+            self.balances[token_id] = self.balances.get(token_id, 0) + amount
+            self.head += blocks
+
+    def logs(self, flt: dict) -> list:
+        start, end = int(flt["fromBlock"], 16), int(flt["toBlock"], 16)
+        if self.logs_down:
+            raise RuntimeError("upstream unavailable")
+        if self.max_log_range and end - start + 1 > self.max_log_range:
+            raise RuntimeError("query returned more than 10000 results")
+        topics = flt.get("topics") or []
+        me = _topic(self.wallet)
+        if len(topics) < 4 or str(topics[3]).lower() != me:
+            return []  # only inbound transfers exist in this universe
+        address = flt.get("address")
+        address = address[0] if isinstance(address, list) else address
+        out = []
+        for block, tid, amount in self.transfers:
+            if not start <= block <= end:
+                continue
+            out.append({
+                "address": address, "blockNumber": hex(block), "blockHash": "0x" + "11" * 32,
+                "transactionHash": "0x" + format(tid & (2**256 - 1), "064x"), "transactionIndex": "0x0",
+                "logIndex": "0x0", "removed": False,
+                "topics": [TRANSFER_SINGLE, _topic("0x" + "22" * 20), _topic("0x" + "00" * 20), me],
+                "data": "0x" + abi_encode(["uint256", "uint256"], [tid, amount]).hex(),
+            })
+        return out
+
+    def eth_call(self, call: dict) -> str:
+        data = call.get("data") or call.get("input") or "0x"
+        sel, args = data[2:10], bytes.fromhex(data[10:])
+        if sel == SEL_ERC20_BALANCE:
+            return "0x" + abi_encode(["uint256"], [USDC_BALANCE]).hex()
+        if sel == SEL_CTF_BALANCE:
+            _, tid = abi_decode(["address", "uint256"], args)
+            return "0x" + abi_encode(["uint256"], [self.balances.get(tid, 0)]).hex()
+        if sel == SEL_BALANCE_BATCH:
+            _, ids = abi_decode(["address[]", "uint256[]"], args)
+            return "0x" + abi_encode(["uint256[]"], [[self.balances.get(t, 0) for t in ids]]).hex()
+        if sel == SEL_APPROVED:
+            return "0x" + abi_encode(["bool"], [True]).hex()
+        return "0x"
+
+    def rpc(self, method: str, params: list):
+        if method == "web3_clientVersion":
+            return "mock-polygon/1.0"
+        if method == "eth_chainId":
+            return "0x89"
+        if method == "net_version":
+            return "137"
+        if method == "eth_blockNumber":
+            return hex(self.head)
+        if method in ("eth_gasPrice", "eth_maxPriorityFeePerGas"):
+            return hex(30 * 10**9)
+        if method == "eth_getTransactionCount":
+            return hex(len(self.txs))
+        if method == "eth_estimateGas":
+            return hex(200_000)
+        if method == "eth_getBalance":
+            return hex(10**20)
+        if method == "eth_call":
+            return self.eth_call(params[0])
+        if method == "eth_getLogs":
+            return self.logs(params[0])
+        if method == "eth_getBlockByNumber":
+            return {"number": hex(self.head), "hash": "0x" + "11" * 32, "parentHash": "0x" + "00" * 32,
+                    "baseFeePerGas": hex(30 * 10**9), "timestamp": hex(int(time.time())),
+                    "gasLimit": hex(30_000_000), "gasUsed": "0x0", "transactions": []}
+        if method == "eth_sendRawTransaction":
+            h = Web3.to_hex(Web3.keccak(hexstr=params[0]))
+            with self.lock:
+                self.txs[h] = time.time()
+            return h
+        if method == "eth_getTransactionReceipt":
+            h = params[0]
+            if h not in self.txs:
+                return None
+            return {"transactionHash": h, "blockHash": "0x" + "11" * 32, "blockNumber": hex(self.head),
+                    "transactionIndex": "0x0", "from": self.wallet, "to": None, "gasUsed": hex(150_000),
+                    "cumulativeGasUsed": hex(150_000), "effectiveGasPrice": hex(30 * 10**9), "logs": [],
+                    "logsBloom": "0x" + "00" * 256, "status": "0x1", "type": "0x2", "contractAddress": None}
+        raise KeyError(method)
+
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class WSConn:
+    """Server side of one WebSocket connection: unfragmented text frames, ping/pong and close."""
+
+    def __init__(self, channel: str, sock, rfile, wfile):
+        self.channel = channel
+        self.sock = sock
+        self.rfile = rfile
+        self.wfile = wfile
+        self.assets = set()   # market channel subscriptions
+        self.authed = False   # user channel auth message received
+        self._lock = threading.Lock()
+
+    def _frame(self, opcode: int, payload: bytes):
+        n = len(payload)
+        head = bytes([0x80 | opcode])
+        if n < 126:
+            head += bytes([n])
+        elif n < 1 << 16:
+            head += bytes([126]) + struct.pack(">H", n)
+        else:
+            head += bytes([127]) + struct.pack(">Q", n)
+        with self._lock:
+            self.wfile.write(head + payload)
+            self.wfile.flush()
+
+    def send(self, text: str):
+        try:
+            self._frame(0x1, text.encode())
+        except OSError:
+            pass  # the client went away; its handler thread cleans up
+
+    def recv(self):
+        """Next text message, or None once the client closed or the socket died."""
+        while True:
+            head = self.rfile.read(2)
+            if len(head) < 2:
+                return None
+            opcode, n = head[0] & 0x0F, head[1] & 0x7F
+            if n == 126:
+                n = struct.unpack(">H", self.rfile.read(2))[0]
+            elif n == 127:
+                n = struct.unpack(">Q", self.rfile.read(8))[0]
+            mask = self.rfile.read(4) if head[1] & 0x80 else b"\0\0\0\0"
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(self.rfile.read(n)))
+            if opcode == 0x8:
+                self.close()
+                return None
+            if opcode == 0x9:
+                self._frame(0xA, payload)
+            elif opcode == 0x1:
+                return payload.decode()
+
+    def close(self):
+        try:
+            self._frame(0x8, b"")
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class MockStack:
+    """Gamma, CLOB, Data API, JSON-RPC and WebSocket servers over one Universe, with per-route request counts."""
+
+    SERVICES = ("gamma", "clob", "data", "rpc")
+    ID_SEGMENT = re.compile(r"/(0x[0-9a-fA-F]+|\d+)$")
+
+    def __init__(self, universe: Universe):
+        self.u = universe
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._servers = []
+        self._ws = []          # open WSConn objects
+        self._ws_seq = {}      # asset_id -> last book seq sent
+        self.urls = {}
+        universe.on_fill = self._ws_order_filled
+
+    def start(self) -> dict:
+        for name in self.SERVICES:
+            server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler(name))
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True, name=f"mock-{name}").start()
+            self._servers.append(server)
+            self.urls[name] = f"http://127.0.0.1:{server.server_address[1]}"
+        server = ThreadingHTTPServer(("127.0.0.1", 0), self._ws_handler())
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True, name="mock-ws").start()
+        self._servers.append(server)
+        self.urls["ws"] = f"ws://127.0.0.1:{server.server_address[1]}"
+        return self.urls
+
+    def stop(self):
+        self.drop_ws()
+        for server in self._servers:
+            server.shutdown()
+
+    def counts(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + n
+
+    def _handler(self, service: str):
+        stack = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, payload, status: int = 200):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _body(self):
+                n = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(n) or b"null") if n else None
+
+            def _route(self, method: str):
+                parts = urlsplit(self.path)
+                if service != "rpc":  # JSON-RPC is counted per method instead
+                    stack._count(f"{service} {method} {stack.ID_SEGMENT.sub('/{id}', parts.path)}")
+                try:
+                    status, payload = getattr(stack, f"_{service}")(method, parts.path,
+                                                                    parse_qs(parts.query), self._body())
+                except Exception as e:
+                    status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+                self._reply(payload, status)
+
+            def do_GET(self):
+                self._route("GET")
+
+            def do_POST(self):
+                self._route("POST")
+
+            def do_DELETE(self):
+                self._route("DELETE")
+
+        return Handler
+
+    def _ws_handler(self):
+        stack = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                channel = urlsplit(self.path).path.rstrip("/").rsplit("/", 1)[-1]
+                key = self.headers.get("Sec-WebSocket-Key")
+                if channel not in ("market", "user") or not key:
+                    self.send_error(404)
+                    return
+                accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+                self.send_response(101, "Switching Protocols")
+                self.send_header("Upgrade", "websocket")
+                self.send_header("Connection", "Upgrade")
+                self.send_header("Sec-WebSocket-Accept", accept)
+                self.end_headers()
+                self.wfile.flush()
+                self.close_connection = True
+                conn = WSConn(channel, self.connection, self.rfile, self.wfile)
+                with stack._lock:
+                    stack._ws.append(conn)
+                stack._count(f"ws {channel} connect")
+                try:
+                    while (msg := conn.recv()) is not None:
+                        getattr(stack, f"_ws_{channel}")(conn, msg)
+                except (OSError, ValueError):
+                    pass
+                finally:
+                    with stack._lock:
+                        stack._ws.remove(conn)
+
+        return Handler
+
+    def drop_ws(self):
+        """Close every WebSocket connection from the server side."""
+        with self._lock:
+            conns = list(self._ws)
+        for conn in conns:
+            conn.close()
+
+    def ws_connections(self, channel: str) -> list:
+        with self._lock:
+            return [c for c in self._ws if c.channel == channel]
+
+    # ── services ──
+
+    @staticmethod
+    def _public(m: dict) -> dict:
+        return {k: v for k, v in m.items() if not k.startswith("_")}
+
+    def _gamma(self, method, path, q, body):
+        u = self.u
+        limit = int(q.get("limit", ["100"])[0])
+        offset = int(q.get("offset", ["0"])[0])
+        if path == "/markets":
+            if "id" in q:
+                return 200, [self._public(u.by_id[i]) for i in q["id"] if i in u.by_id][:limit]
+            if "clob_token_ids" in q:
+                hit = u.tokens.get(q["clob_token_ids"][0])
+                return 200, [self._public(hit[0])] if hit else []
+            rows = u.by_updated if q.get("order", [""])[0] == "updatedAt" else u.by_volume
+            if q.get("closed", [""])[0] == "false":
+                rows = [m for m in rows if not m["closed"]]
+            lo, hi = q.get("end_date_min", [None])[0], q.get("end_date_max", [None])[0]
+            if lo or hi:
+                lo_ts = datetime.fromisoformat(lo.replace("Z", "+00:00")).timestamp() if lo else 0
+                hi_ts = datetime.fromisoformat(hi.replace("Z", "+00:00")).timestamp() if hi else float("inf")
+                rows = [m for m in rows if lo_ts <= m["_end_ts"] <= hi_ts]
+            return 200, [self._public(m) for m in rows[offset:offset + limit]]
+        if path == "/events":
+            events = u.events.get(q.get("tag_slug", [""])[0], [])[offset:offset + limit]
+            return 200, [{"id": e["id"], "markets": [self._public(m) for m in e["markets"]]} for e in events]
+        return 404, {"error": "not found"}
+
+    def _clob(self, method, path, q, body):
+        u = self.u
+        if path in ("/auth/api-key", "/auth/derive-api-key"):
+            return 200, {"apiKey": "bench-key", "secret": base64.urlsafe_b64encode(b"bench-secret").decode(),
+                         "passphrase": "bench-pass"}
+        if path == "/books":
+            return 200, [u.book(str(p["token_id"])) for p in body or []]
+        if path == "/book":
+            return 200, u.book(q["token_id"][0])
+        if path == "/tick-size":
+            return 200, {"minimum_tick_size": 0.001}
+        if path == "/neg-risk":
+            hit = u.tokens.get(q["token_id"][0])
+            return 200, {"neg_risk": bool(hit and hit[0]["negRisk"])}
+        if path == "/fee-rate":
+            return 200, {"base_fee": 0}
+        if path == "/balance-allowance":
+            if q.get("asset_type", [""])[0] == "CONDITIONAL":
+                bal = u.balances.get(int(q.get("token_id", ["0"])[0] or 0), 0)
+            else:
+                bal = USDC_BALANCE
+            return 200, {"balance": str(bal), "allowances": {}}
+        if path == "/data/orders":
+            cursor = q.get("next_cursor", ["MA=="])[0]
+            start = int(base64.b64decode(cursor).decode() or 0) if cursor != "MA==" else 0
+            if start == 0:
+                u.advance()
+            with u.lock:
+                live = [o for o in u.orders.values() if o["status"] == "LIVE"]
+            page = live[start:start + 100]
+            nxt = base64.b64encode(str(start + 100).encode()).decode() if start + 100 < len(live) else END_CURSOR
+            return 200, {"data": page, "next_cursor": nxt, "limit": 100, "count": len(page)}
+        if path.startswith("/data/order/"):
+            return 200, u.orders.get(path.rsplit("/", 1)[1]) or {}
+        if path == "/orders" and method == "POST":
+            return 200, [u.post(entry) for entry in body or []]
+        if path == "/orders" and method == "DELETE":
+            return 200, u.cancel(body or [])
+        if path == "/order" and method == "DELETE":
+            return 200, u.cancel([(body or {}).get("orderID")])
+        return 404, {"error": "not found"}
+
+    def _data(self, method, path, q, body):
+        if path == "/positions":
+            return 200, self.u.data_positions
+        if path == "/value":
+            value = sum(p["size"] * p["curPrice"] for p in self.u.data_positions)
+            return 200, [{"user": self.u.wallet, "value": round(value, 2)}]
+        return 404, {"error": "not found"}
+
+    def _rpc(self, method, path, q, body):
+        def one(req):
+            try:
+                return {"jsonrpc": "2.0", "id": req.get("id"), "result": self.u.rpc(req["method"], req.get("params") or [])}
+            except Exception as e:
+                return {"jsonrpc": "2.0", "id": req.get("id"), "error": {"code": -32000, "message": str(e)}}
+        if isinstance(body, list):
+            self._count("rpc batch")
+            self._count("rpc batch items", len(body))
+            return 200, [one(r) for r in body]
+        self._count(f"rpc {body.get('method')}")
+        return 200, one(body)
+
+
+    # ── WebSocket channels ──
+
+    def _ws_book(self, token_id: str) -> dict:
+        book = self.u.book(token_id)
+        with self._lock:
+            seq = self._ws_seq.setdefault(token_id, 0)
+        return {"event_type": "book", "asset_id": token_id, "market": book["market"],
+                "bids": book["bids"], "asks": book["asks"], "timestamp": book["timestamp"],
+                "last_trade_price": book["last_trade_price"], "seq": seq}
+
+    def _ws_market(self, conn: WSConn, text: str):
+        if text == "PING":
+            conn.send("PONG")
+            return
+        msg = json.loads(text)
+        ids = [str(t) for t in msg.get("assets_ids") or []]
+        op = msg.get("operation") or msg.get("type")
+        self._count(f"ws market {op}")
+        if op == "unsubscribe":
+            conn.assets.difference_update(ids)
+            return
+        if op == "market":  # initial subscription replaces the set
+            conn.assets = set(ids)
+        else:
+            conn.assets.update(ids)
+        if ids:
+            conn.send(json.dumps([self._ws_book(t) for t in ids]))
+
+    def push_price_change(self, token_id: str, side: str, price: float, size: float, seq: int = None) -> int:
+        """Send one price_change to every connection subscribed to token_id; returns its seq."""
+        with self._lock:
+            seq = self._ws_seq.get(token_id, 0) + 1 if seq is None else seq
+            self._ws_seq[token_id] = seq
+        ev = {"event_type": "price_change", "market": "", "timestamp": str(int(time.time() * 1000)),
+              "seq": seq, "price_changes": [{"asset_id": token_id, "price": f"{price:.3f}",
+                                             "size": str(size), "side": side}]}
+        for conn in self.ws_connections("market"):
+            if token_id in conn.assets:
+                conn.send(json.dumps(ev))
+        return seq
+
+    def _ws_user(self, conn: WSConn, text: str):
+        if text == "PING":
+            conn.send("PONG")
+            return
+        msg = json.loads(text)
+        self._count("ws user subscribe")
+        conn.authed = (msg.get("auth") or {}).get("apiKey") == "bench-key"
+
+    def push_user(self, events: list):
+        """Send raw user-channel events to every authenticated connection."""
+        for conn in self.ws_connections("user"):
+            if conn.authed:
+                conn.send(json.dumps(events))
+
+    def _ws_order_filled(self, o: dict):
+        now = str(int(time.time()))
+        self.push_user([
+            {"event_type": "order", "type": "UPDATE", "id": o["id"], "asset_id": o["asset_id"],
+             "side": o["side"], "price": o["price"], "original_size": o["original_size"],
+             "size_matched": o["size_matched"], "timestamp": now},
+            {"event_type": "trade", "id": "trade-" + o["id"][2:18], "taker_order_id": o["id"],
+             "asset_id": o["asset_id"], "side": o["side"], "price": o["price"], "size": o["original_size"],
+             "status": "MATCHED", "timestamp": now},
+        ])
+
+
+BENCH_KEY = "0x" + "4b" * 32  # throwaway key; nothing here ever leaves 127.0.0.1
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--markets", type=int, default=1000)
+    ap.add_argument("--positions", type=int, default=50)
+    args = ap.parse_args()
+    wallet = Account.from_key(BENCH_KEY).address
+    stack = MockStack(Universe(args.markets, args.positions, wallet))
+    for name, url in stack.start().items():
+        print(f"{name:6s} {url}")
+    print("Ctrl-C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stack.stop()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""
+Benchmark: end-to-end stages against a local mock Polymarket stack.
+
+Every scenario runs in its own process against bench/mock_stack.py (Gamma,
+CLOB, Data API, Polygon RPC and the CLOB WebSocket channels on 127.0.0.1),
+with a fresh DATA_DIR seeded with the scenario's positions and closed
+history. The streams stay off unless --streams is given. Stages:
+
+  scan_markets (cold, then warm), parse_market_candidates over every Gamma
+  row the mock serves (the plain candidate parser on 10k markets in the
+  medium and large scenarios), sweep_orphaned_tokens (cold, then warm),
+  run() startup and each tick, refresh_status_snapshot, and /api/status.
+
+For each stage it reports wall time, requests per service and the peak
+traced allocation (tracemalloc). Tick stages also get per-function timings
+for the main tick steps. Deliberate pacing sleeps on the tick threads (the
+main thread and stage-* workers) are skipped and reported as "paused";
+background threads sleep as usual.
+
+Results are compared against bench/baseline.json. Wall time more than
+--tolerance above the baseline (and at least 250ms) or request counts more
+than 10% above it are flagged, and the exit status is 1. Baseline timings
+are machine-specific; refresh them with --save-baseline on the machine you
+compare on.
+
+Run:
+    python bench/suite.py [--scenario small medium large] [--ticks 3] [--streams] [--save-baseline]
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import tempfile
+import multiprocessing
+import threading
+import subprocess
+import tracemalloc
+from functools import wraps
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+BASELINE = os.path.join(HERE, "baseline.json")
+SCENARIOS = {
+    "small": {"markets": 1000, "positions": 10},
+    "medium": {"markets": 10000, "positions": 100},
+    "large": {"markets": 10000, "positions": 500},
+}
+PROBES = [  # functions timed inside ticks (module-level names or Class.method)
+    "prepare_candidates", "fetch_books", "OrderIndex.refresh", "ResolutionTracker.resolved_markets",
+    "place_buys", "place_sells", "cancel_orders", "reconcile_positions", "_sweep_stage",
+    "RedemptionBatcher.flush",
+]
+
+
+# ── child: one scenario in this process ──
+
+class PacingClock:
+    """Stands in for the `time` module inside bot.py.
+
+    sleep() calls from tick threads are skipped and added up; once
+    `stop_after` ticks are done, the main thread's next sleep (the one
+    between ticks) raises KeyboardInterrupt so run() returns.
+    """
+
+    def __init__(self, real, skip: bool):
+        self._real = real
+        self.skip = skip
+        self.paused = 0.0
+        self.stop = False
+
+    def __getattr__(self, name):
+        return getattr(self._real, name)
+
+    def sleep(self, seconds):
+        t = threading.current_thread()
+        on_tick = t is threading.main_thread() or t.name.startswith("stage")
+        if t is threading.main_thread() and self.stop:
+            raise KeyboardInterrupt
+        if self.skip and on_tick:
+            self.paused += seconds
+            return
+        self._real.sleep(seconds)
+
+
+class StageRecorder:
+    """Wall time, per-service request deltas and tracemalloc peak per stage."""
+
+    def __init__(self, stack, clock, memory: bool):
+        self.stack = stack
+        self.clock = clock
+        self.memory = memory
+        self.stages = []
+        self.probes = {}
+        self._open = None
+
+    def begin(self, name: str):
+        if self.memory:
+            tracemalloc.reset_peak()
+        self._open = (name, time.perf_counter(), self.stack.counts(), self.clock.paused,
+                      tracemalloc.get_traced_memory()[0] if self.memory else 0)
+
+    def end(self, **extra):
+        if not self._open:
+            return
+        name, t0, before, paused, mem0 = self._open
+        self._open = None
+        after = self.stack.counts()
+        delta = {k: v - before.get(k, 0) for k, v in after.items() if v != before.get(k, 0)}
+        services = {}
+        for key, n in delta.items():
+            svc = key.split(" ", 1)[0]
+            if key != "rpc batch items":
+                services[svc] = services.get(svc, 0) + n
+        row = {
+            "stage": name,
+            "wall_s": round(time.perf_counter() - t0, 4),
+            "paused_s": round(self.clock.paused - paused, 2),
+            "requests": sum(services.values()),
+            "by_service": services,
+            "routes": delta,
+        }
+        if self.memory:
+            row["alloc_peak_mb"] = round((tracemalloc.get_traced_memory()[1] - mem0) / 2**20, 2)
+        row.update(extra)
+        self.stages.append(row)
+
+    def timed(self, name: str, fn, *args, **kwargs):
+        self.begin(name)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.end()
+
+    def probe(self, owner, attr: str, label: str):
+        fn = getattr(owner, attr)
+        stats = self.probes.setdefault(label, {"calls": 0, "total_s": 0.0})
+        lock = threading.Lock()
+
+        @wraps(fn)
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with lock:
+                    stats["calls"] += 1
+                    stats["total_s"] += time.perf_counter() - t0
+
+        setattr(owner, attr, timed)
+
+
+class TickMarks(logging.Handler):
+    """Turns the bot's own tick log lines into stage boundaries."""
+
+    def __init__(self, rec: StageRecorder, clock: PacingClock, ticks: int):
+        super().__init__(logging.INFO)
+        self.rec = rec
+        self.clock = clock
+        self.ticks = ticks
+        self.done = 0
+
+    def emit(self, record):
+        msg = record.getMessage()
+        if msg.startswith("── Tick"):
+            self.rec.end()  # closes "startup" before the first tick
+            self.rec.begin(f"tick {self.done + 1}")
+        elif msg.startswith("Persist:"):
+            self.done += 1
+            self.rec.end()
+            if self.done >= self.ticks:
+                self.clock.stop = True
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run_scenario(name: str, ticks: int, memory: bool, skip_pauses: bool, streams: bool = False) -> dict:
+    from eth_account import Account
+    from mock_stack import MockStack, Universe, BENCH_KEY
+
+    spec = SCENARIOS[name]
+    wallet = Account.from_key(BENCH_KEY).address
+    t0 = time.perf_counter()
+    universe = Universe(spec["markets"], spec["positions"], wallet)
+    stack = MockStack(universe)
+    urls = stack.start()
+    setup_s = time.perf_counter() - t0
+
+    os.environ.update({
+        "DATA_DIR": tempfile.mkdtemp(prefix=f"vig-bench-{name}-"),
+        "PRIVATE_KEY": BENCH_KEY,
+        "RPC_URL": urls["rpc"],
+        "PORT": str(_free_port()),
+        "MAX_BETS": str(spec["positions"] + 5),
+        "POLL_SECONDS": "1",
+        "MARKET_WS_ENABLED": str(streams).lower(),
+        "MARKET_WS_URL": urls["ws"] + "/ws/market",
+        "USER_WS_ENABLED": str(streams).lower(),
+        "USER_WS_URL": urls["ws"] + "/ws/user",
+    })
+    for k in ("POLY_BUILDER_API_KEY", "POLY_BUILDER_SECRET", "POLY_BUILDER_PASSPHRASE",
+              "RESIDENTIAL_PROXY_URL", "PROXY_URL"):
+        os.environ.pop(k, None)
+
+    import bot
+    bot.GAMMA_API, bot.DATA_API, bot.CLOB_HOST = urls["gamma"], urls["data"], urls["clob"]
+    logging.getLogger().setLevel(logging.WARNING)
+    bot.log.setLevel(logging.INFO)
+    bot.log.propagate = False
+    for h in list(bot.log.handlers):
+        bot.log.removeHandler(h)
+
+    store = bot.state_store()
+    for row in universe.closed:
+        store.add_closed(row)
+    bot.position_persister.mark_dirty(universe.positions)
+    bot.position_persister.flush()
+
+    clock = PacingClock(bot.time, skip_pauses)
+    bot.time = clock
+    if streams:  # between ticks the loop waits on the user stream instead of sleeping
+        stream_wait = bot.user_stream.wait
+
+        def wait(timeout):
+            if clock.stop:
+                raise KeyboardInterrupt
+            return stream_wait(timeout)
+        bot.user_stream.wait = wait
+    if memory:
+        tracemalloc.start()
+    rec = StageRecorder(stack, clock, memory)
+
+    # scan_markets: cold fills the universe index, warm is a pure index query
+    rec.timed("scan_markets (cold)", bot.scan_markets, set(), frozenset())
+    rec.begin("scan_markets (warm)")
+    found = bot.scan_markets(set(), frozenset())
+    rec.end(candidates=len(found))
+
+    # parse_market_candidates: the whole Gamma feed through the candidate parser, positions held
+    rows = [stack._public(m) for m in universe.markets]
+    held = {p["token_id"] for p in universe.positions}
+    rec.begin("parse_market_candidates")
+    for _ in range(3):
+        parsed = bot._parse_market_candidates(rows, held)
+    rec.end(candidates=len(parsed), markets=len(rows), repeat=3)
+
+    # sweep_orphaned_tokens: cold scans the discovery lookback, warm only new blocks
+    bot.bot_state["positions"] = bot.load_positions()
+    bot.bot_state["closed_positions"] = bot.load_closed()
+    w3, account, ctf, _ = bot.build_web3()
+    for stage in ("sweep_orphaned_tokens (cold)", "sweep_orphaned_tokens (warm)"):
+        rec.begin(stage)
+        n = bot.sweep_orphaned_tokens(w3, account, ctf)
+        rec.end(redeems=n)
+
+    for label in PROBES:
+        owner, attr = (bot, label) if "." not in label else (getattr(bot, label.split(".")[0]), label.split(".")[1])
+        rec.probe(owner, attr, label)
+    marks = TickMarks(rec, clock, ticks)
+    bot.log.addHandler(marks)
+    rec.begin("startup")
+    try:
+        bot.run()
+    except KeyboardInterrupt:
+        pass
+    bot.log.removeHandler(marks)
+    rec.end()
+
+    rec.timed("refresh_status_snapshot", bot.refresh_status_snapshot)
+    client = bot.flask_app.test_client()
+    rec.begin("api_status x100")
+    for _ in range(100):
+        assert client.get("/api/status").status_code == 200
+    rec.end()
+
+    stack.stop()
+    return {
+        "scenario": name,
+        **spec,
+        "ticks": ticks,
+        "setup_s": round(setup_s, 2),
+        "stages": rec.stages,
+        "probes": {k: {"calls": v["calls"], "total_s": round(v["total_s"], 4)} for k, v in rec.probes.items()},
+        "positions_after": len(bot.bot_state["positions"]),
+    }
+
+
+# ── parent: run scenarios, report, compare ──
+
+def _report(res: dict):
+    print(f"\n{res['scenario']}: {res['markets']} markets, {res['positions']} positions, {res['ticks']} ticks "
+          f"(mock setup {res['setup_s']}s, {res['positions_after']} positions after)")
+    print(f"  {'stage':32s} {'wall':>9s} {'paused':>7s} {'reqs':>6s} {'alloc':>8s}  by service")
+    for st in res["stages"]:
+        alloc = f"{st['alloc_peak_mb']:.1f}MB" if "alloc_peak_mb" in st else "-"
+        svc = " ".join(f"{k}={v}" for k, v in sorted(st["by_service"].items()))
+        print(f"  {st['stage']:32s} {st['wall_s']:8.3f}s {st['paused_s']:6.1f}s {st['requests']:6d} {alloc:>8s}  {svc}")
+    print(f"  {'in-tick function':32s} {'calls':>9s} {'total':>8s}")
+    for label, p in res["probes"].items():
+        if p["calls"]:
+            print(f"  {label:32s} {p['calls']:9d} {p['total_s']:7.3f}s")
+
+
+def _compare(results: dict, baseline: dict, tolerance: float) -> list:
+    problems = []
+    for name, res in results.items():
+        base = {s["stage"]: s for s in baseline.get(name, {}).get("stages", [])}
+        for st in res["stages"]:
+            b = base.get(st["stage"])
+            if not b:
+                continue
+            if st["wall_s"] > b["wall_s"] * (1 + tolerance) and st["wall_s"] - b["wall_s"] > 0.25:
+                problems.append(f"{name} / {st['stage']}: wall {b['wall_s']:.3f}s → {st['wall_s']:.3f}s")
+            if st["requests"] > b["requests"] * 1.1 + 2:
+                problems.append(f"{name} / {st['stage']}: requests {b['requests']} → {st['requests']}")
+    return problems
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--scenario", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    ap.add_argument("--ticks", type=int, default=3)
+    ap.add_argument("--tolerance", type=float, default=0.5, help="allowed wall-time growth vs baseline (0.5 = +50%%)")
+    ap.add_argument("--no-memory", action="store_true", help="skip tracemalloc (faster, no alloc column)")
+    ap.add_argument("--real-pauses", action="store_true", help="let tick threads sleep like production")
+    ap.add_argument("--streams", action="store_true", help="use the mock WebSocket channels (not comparable to a baseline without)")
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    ap.add_argument("--out", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        res = run_scenario(args.child, args.ticks, not args.no_memory, not args.real_pauses, args.streams)
+        with open(args.out, "w") as f:
+            json.dump(res, f)
+        for proc in multiprocessing.active_children():  # the bot's signing workers
+            proc.terminate()
+        os._exit(0)  # skip interpreter teardown of the bot's daemon threads
+
+    results = {}
+    for name in args.scenario:
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            out = f.name
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", name, "--ticks", str(args.ticks), "--out", out]
+        cmd += ["--no-memory"] if args.no_memory else []
+        cmd += ["--real-pauses"] if args.real_pauses else []
+        cmd += ["--streams"] if args.streams else []
+        with tempfile.TemporaryFile("w+") as log:
+            proc = subprocess.run(cmd, stdout=log, stderr=subprocess.STDOUT)
+            if proc.returncode != 0 or not os.path.getsize(out):
+                log.seek(0)
+                sys.stderr.write(log.read()[-4000:])
+                sys.exit(f"scenario {name} failed (exit {proc.returncode})")
+        with open(out) as f:
+            results[name] = json.load(f)
+        os.unlink(out)
+        _report(results[name])
+
+    if args.save_baseline:
+        saved = {}
+        if os.path.exists(BASELINE):
+            with open(BASELINE) as f:
+                saved = json.load(f)
+        saved.update(results)
+        with open(BASELINE, "w") as f:
+            json.dump(saved, f, indent=1, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline saved to {os.path.relpath(BASELINE)}")
+        return
+    if not os.path.exists(BASELINE):
+        print("\nNo baseline yet — run with --save-baseline to record one")
+        return
+    with open(BASELINE) as f:
+        problems = _compare(results, json.load(f), args.tolerance)
+    if problems:
+        print("\nREGRESSIONS vs baseline:")
+        for p in problems:
+            print("  " + p)
+        sys.exit(1)
+    print("\nNo regressions vs baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,22 +12,46 @@ Run:
 """
 
 import os
+import re
+import atexit
+import gzip
 import json
 import time
 import random
 import logging
+import signal
+import sqlite3
+import email.utils
+from urllib.parse import urlsplit
 import threading
-import requests
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
 from datetime import datetime, timezone, timedelta
 from dotenv import load_dotenv
 from flask import Flask, request as flask_request, jsonify, Response
 
 from py_clob_client.client import ClobClient
-from py_clob_client.clob_types import OrderArgs, OrderType, CreateOrderOptions, BalanceAllowanceParams, AssetType
+from py_clob_client.clob_types import (
+    OrderArgs, OrderType, CreateOrderOptions, BalanceAllowanceParams, AssetType, BookParams,
+    OrderBookSummary, OrderSummary, PostOrdersArgs,
+)
+from py_clob_client.order_builder.builder import OrderBuilder
 from py_clob_client.order_builder.constants import BUY, SELL
+from py_clob_client.signer import Signer
+from py_clob_client.utilities import is_tick_size_smaller, price_valid
 from py_clob_client.constants import POLYGON
+from py_clob_client.config import get_contract_config
+from py_clob_client.http_helpers import helpers as clob_http
 
 from web3 import Web3
+try:
+    from web3.exceptions import Web3RPCError
+except ImportError:  # web3 6 raises JSON-RPC error replies as ValueError
+    Web3RPCError = ValueError
+from poly_eip712_structs import make_domain
 import httpx
 
 load_dotenv()
@@ -59,6 +83,7 @@ logging.basicConfig(
     datefmt="%H:%M:%S",
 )
 log = logging.getLogger("vig")
+logging.getLogger("httpx").setLevel(logging.WARNING)  # per-request lines; latency is in http_pool.stats()
 
 # ── Config ────────────────────────────────────────────────────────────────────
 
@@ -74,7 +99,33 @@ PROFIT_PCT      = float(os.getenv("PROFIT_PCT", "0.05"))
 MAX_SPREAD_PCT  = float(os.getenv("MAX_SPREAD_PCT", "0.02"))
 MAX_EXPIRY_DAYS = int(os.getenv("MAX_EXPIRY_DAYS", "7"))
 POLL_SECONDS    = int(os.getenv("POLL_SECONDS", "30"))
+SCORE_WORKERS   = int(os.getenv("SCORE_WORKERS", "8"))
+BALANCE_BATCH_SIZE = int(os.getenv("BALANCE_BATCH_SIZE", "200"))
+BOOK_BATCH_SIZE = int(os.getenv("BOOK_BATCH_SIZE", "20"))
+BOOK_CACHE_TTL  = float(os.getenv("BOOK_CACHE_TTL", "2"))
+BOOK_CACHE_SIZE = int(os.getenv("BOOK_CACHE_SIZE", "2000"))
+HTTP_RETRIES    = int(os.getenv("HTTP_RETRIES", "3"))           # retries on 429/5xx/transport errors
+HTTP_BACKOFF    = float(os.getenv("HTTP_BACKOFF", "0.5"))       # base of the jittered exponential backoff
+HTTP_MAX_BACKOFF = float(os.getenv("HTTP_MAX_BACKOFF", "10"))   # cap, also applied to Retry-After
+HTTP_POOL_SIZE  = int(os.getenv("HTTP_POOL_SIZE", "20"))        # keep-alive connections per host
+HTTP2_ENABLED   = os.getenv("HTTP2_ENABLED", "true").lower() in ("1", "true", "yes")
+ORDER_BATCH_MAX = int(os.getenv("ORDER_BATCH_MAX", "15"))       # orders per post_orders request
+CANCEL_BATCH_MAX = int(os.getenv("CANCEL_BATCH_MAX", "100"))    # order ids per cancel_orders request
+ORDER_RETRIES   = int(os.getenv("ORDER_RETRIES", "1"))          # resends of GTC orders/cancels lost in transit
+SIGNING_WORKERS = int(os.getenv("SIGNING_WORKERS", "2"))       # order-signing processes (0 = sign inline)
+PRESIGN_SELLS   = os.getenv("PRESIGN_SELLS", "true").lower() in ("1", "true", "yes")  # sign sells when the buy is posted
+TICK_OVERLAP    = os.getenv("TICK_OVERLAP", "true").lower() in ("1", "true", "yes")  # run independent tick stages concurrently
+
+# Streaming L2 books from the CLOB market channel (optional, needs websocket-client)
+MARKET_WS_ENABLED    = os.getenv("MARKET_WS_ENABLED", "false").lower() in ("1", "true", "yes")
+MARKET_WS_URL        = os.getenv("MARKET_WS_URL", "wss://ws-subscriptions-clob.polymarket.com/ws/market")
+MARKET_WS_MAX_ASSETS = int(os.getenv("MARKET_WS_MAX_ASSETS", "500"))
+
+# Event-driven fill detection from the CLOB user channel (optional, needs websocket-client)
+USER_WS_ENABLED      = os.getenv("USER_WS_ENABLED", "false").lower() in ("1", "true", "yes")
+USER_WS_URL          = os.getenv("USER_WS_URL", "wss://ws-subscriptions-clob.polymarket.com/ws/user")
 PORT            = int(os.getenv("PORT", "8080"))
+STATUS_REFRESH_SECONDS = int(os.getenv("STATUS_REFRESH_SECONDS", "10"))
 
 CLOB_HOST       = "https://clob.polymarket.com"
 
@@ -86,6 +137,17 @@ GAMMA_API       = "https://gamma-api.polymarket.com"
 DATA_API        = "https://data-api.polymarket.com"
 POLY_API        = "https://gateway.polymarket.us"
 SCAN_TAG_SLUGS  = ["crypto", "sports", "economics", "business"]
+SCAN_PAGE_SIZE        = 500   # /markets page size (date-filtered universe)
+SCAN_MAX_PAGES        = int(os.getenv("SCAN_MAX_PAGES", "20"))
+SCAN_EVENT_PAGE_SIZE  = 50    # /events page size per tag
+SCAN_EVENT_MAX_PAGES  = int(os.getenv("SCAN_EVENT_MAX_PAGES", "4"))
+SCAN_WORKERS          = int(os.getenv("SCAN_WORKERS", "6"))
+SCAN_PAGES_AHEAD      = int(os.getenv("SCAN_PAGES_AHEAD", "4"))    # page offsets in flight per feed
+SCAN_TIME_BUDGET      = float(os.getenv("SCAN_TIME_BUDGET", "20"))  # seconds for the whole scan
+UNIVERSE_FULL_REFRESH = int(os.getenv("UNIVERSE_FULL_REFRESH", "600"))   # full rescan cadence
+UNIVERSE_DELTA_SECONDS = int(os.getenv("UNIVERSE_DELTA_SECONDS", "15"))  # updated-markets cadence
+UNIVERSE_DELTA_PAGE   = 100
+UNIVERSE_DELTA_MAX_PAGES = 5
 
 CTF_ADDRESS     = "0x4D97DCd97eC945f40cF65F87097ACe5EA0476045"
 USDC_ADDRESS    = "0x2791Bca1f2de4661ED88A30C99A7a9449Aa84174"
@@ -117,6 +179,16 @@ CTF_ABI = [
         "stateMutability": "view",
         "type": "function",
     },
+    {
+        "inputs": [
+            {"internalType": "address[]", "name": "accounts", "type": "address[]"},
+            {"internalType": "uint256[]", "name": "ids", "type": "uint256[]"},
+        ],
+        "name": "balanceOfBatch",
+        "outputs": [{"internalType": "uint256[]", "name": "", "type": "uint256[]"}],
+        "stateMutability": "view",
+        "type": "function",
+    },
     {
         "anonymous": False,
         "inputs": [
@@ -129,6 +201,18 @@ CTF_ABI = [
         "name": "TransferSingle",
         "type": "event",
     },
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": True, "name": "operator", "type": "address"},
+            {"indexed": True, "name": "from", "type": "address"},
+            {"indexed": True, "name": "to", "type": "address"},
+            {"indexed": False, "name": "ids", "type": "uint256[]"},
+            {"indexed": False, "name": "values", "type": "uint256[]"},
+        ],
+        "name": "TransferBatch",
+        "type": "event",
+    },
     {
         "inputs": [
             {"name": "owner", "type": "address"},
@@ -182,12 +266,21 @@ os.makedirs(DATA_DIR, exist_ok=True)
 POSITIONS_FILE = os.path.join(DATA_DIR, "positions.json")
 TRADES_FILE = os.path.join(DATA_DIR, "trades.json")
 CLOSED_FILE = os.path.join(DATA_DIR, "closed.json")
+BLACKLIST_FILE = os.path.join(DATA_DIR, "blacklist.json")
+STATE_DB = os.path.join(DATA_DIR, "state.db")
+TRADE_HISTORY_MAX = 500  # trades kept in memory for the dashboard
+CLOSED_HISTORY_MAX = 200  # closed positions restored at startup
+PERSIST_DEBOUNCE_SECONDS = float(os.getenv("PERSIST_DEBOUNCE_SECONDS", "2"))
+JOURNAL_DIR = os.path.join(DATA_DIR, "journal")
+JOURNAL_SEGMENT_BYTES = int(os.getenv("JOURNAL_SEGMENT_BYTES", str(4 * 1024 * 1024)))
+JOURNAL_FSYNC_SECONDS = float(os.getenv("JOURNAL_FSYNC_SECONDS", "1"))
 
 # ── Shared State ──────────────────────────────────────────────────────────────
 
 w3_instance = None
 account_instance = None
 usdc_contract = None
+tx_tracker = None  # ReceiptTracker for direct (non-relayer) transactions, set by build_web3
 clob_client = None
 bot_paused = False
 
@@ -210,45 +303,658 @@ trade_history = []
 
 # ── Persistence ───────────────────────────────────────────────────────────────
 
-def load_positions() -> list:
-    if os.path.exists(POSITIONS_FILE):
-        with open(POSITIONS_FILE) as f:
-            return json.load(f)
-    return []
+class StateStore:
+    """SQLite (WAL) store for positions, closed positions and the blacklist (trades go to TradeJournal).
 
+    Each row keeps the full record as JSON in `data`; the columns we look
+    things up by (token_id, condition_id, timestamps) are pulled out and
+    indexed. One connection is shared by the main loop and Flask threads,
+    serialized by a lock. Every write is its own transaction.
+    """
 
-def save_positions(positions: list):
-    with open(POSITIONS_FILE, "w") as f:
-        json.dump(positions, f, indent=2)
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS positions (
+            row_key      TEXT PRIMARY KEY,
+            token_id     TEXT,
+            condition_id TEXT,
+            status       TEXT,
+            placed_at    TEXT,
+            data         TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_positions_token ON positions(token_id);
+        CREATE INDEX IF NOT EXISTS ix_positions_condition ON positions(condition_id);
+
+        CREATE TABLE IF NOT EXISTS closed (
+            id           INTEGER PRIMARY KEY AUTOINCREMENT,
+            token_id     TEXT,
+            condition_id TEXT,
+            closed_at    TEXT,
+            data         TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_closed_token ON closed(token_id);
+        CREATE INDEX IF NOT EXISTS ix_closed_condition ON closed(condition_id);
+        CREATE INDEX IF NOT EXISTS ix_closed_time ON closed(closed_at);
+
+        CREATE TABLE IF NOT EXISTS blacklist (
+            token_id TEXT PRIMARY KEY,
+            added_at TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS chain_tokens (
+            token_id TEXT PRIMARY KEY,
+            balance  TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS chain_unseeded (
+            token_id TEXT PRIMARY KEY
+        );
+
+        CREATE TABLE IF NOT EXISTS chain_failed_ranges (
+            from_block INTEGER,
+            to_block   INTEGER,
+            PRIMARY KEY (from_block, to_block)
+        );
+
+        CREATE TABLE IF NOT EXISTS token_meta (
+            token_id      TEXT PRIMARY KEY,
+            condition_id  TEXT,
+            market_id     TEXT,
+            question      TEXT,
+            neg_risk      INTEGER,
+            outcome_index INTEGER,
+            end_date      TEXT,
+            resolved      INTEGER,
+            checked_at    REAL
+        );
+        CREATE INDEX IF NOT EXISTS ix_token_meta_condition ON token_meta(condition_id);
+
+        CREATE TABLE IF NOT EXISTS market_resolution (
+            market_id  TEXT PRIMARY KEY,
+            end_ts     REAL,
+            resolved   INTEGER,
+            checked_at REAL
+        );
+
+        CREATE TABLE IF NOT EXISTS meta (
+            key   TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
 
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        self._positions_lock = threading.Lock()  # guards _saved_positions across a whole sync
+        self._saved_positions = {}  # row_key -> JSON last written, to skip unchanged rows
+
+    def _tx(self, statements: list):
+        """Run [(sql, params), ...] atomically."""
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    cur.execute(sql, params)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    def _query(self, sql: str, params=()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # ── positions ──
+
+    def load_positions(self) -> list:
+        with self._positions_lock:
+            rows = self._query("SELECT row_key, data FROM positions ORDER BY rowid")
+            self._saved_positions = {key: data for key, data in rows}
+        return [json.loads(data) for _, data in rows]
+
+    @staticmethod
+    def _position_keys(positions: list) -> list:
+        """Row key per position: the token id, suffixed #n for its n-th repeat (empty ids included)."""
+        seen = {}
+        keys = []
+        for p in positions:
+            tid = str(p.get("token_id", ""))
+            n = seen.get(tid, 0)
+            seen[tid] = n + 1
+            keys.append(tid if n == 0 and tid else f"{tid}#{n}")
+        return keys
+
+    def sync_positions(self, positions: list) -> tuple:
+        """Make the positions table match `positions`. Only changed rows are written.
+
+        Returns (rows_written, bytes_written).
+        """
+        with self._positions_lock:
+            stmts, nbytes, saved = self._position_statements(positions)
+            if stmts:
+                self._tx(stmts)
+                self._saved_positions = saved
+        return len(stmts), nbytes
+
+    def _position_statements(self, positions: list) -> tuple:
+        """(statements, bytes, rows) that bring the table from _saved_positions to `positions`.
+
+        Caller holds _positions_lock and sets _saved_positions = rows once the statements commit.
+        """
+        current = {key: (p, json.dumps(p, separators=(",", ":")))
+                   for key, p in zip(self._position_keys(positions), positions)}
+        stmts = []
+        nbytes = 0
+        for key, (p, data) in current.items():
+            if self._saved_positions.get(key) != data:
+                nbytes += len(data)
+                stmts.append((
+                    "INSERT INTO positions (row_key, token_id, condition_id, status, placed_at, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(row_key) DO UPDATE SET "
+                    "token_id=excluded.token_id, condition_id=excluded.condition_id, "
+                    "status=excluded.status, placed_at=excluded.placed_at, data=excluded.data",
+                    (key, str(p.get("token_id", "")), p.get("condition_id", ""), p.get("status", ""),
+                     p.get("placed_at", ""), data),
+                ))
+        for key in self._saved_positions.keys() - current.keys():
+            stmts.append(("DELETE FROM positions WHERE row_key = ?", (key,)))
+        return stmts, nbytes, {key: data for key, (_, data) in current.items()}
+
+    # ── closed / blacklist ──
+
+    @staticmethod
+    def _closed_insert(entry: dict) -> tuple:
+        return (
+            "INSERT INTO closed (token_id, condition_id, closed_at, data) VALUES (?, ?, ?, ?)",
+            (str(entry.get("token_id", "")), entry.get("condition_id", ""),
+             entry.get("closed_at", ""), json.dumps(entry, separators=(",", ":"))),
+        )
 
-def load_trades() -> list:
-    if os.path.exists(TRADES_FILE):
-        with open(TRADES_FILE) as f:
+    @staticmethod
+    def _blacklist_insert(token_id: str) -> tuple:
+        return (
+            "INSERT OR IGNORE INTO blacklist (token_id, added_at) VALUES (?, ?)",
+            (str(token_id), datetime.now(timezone.utc).isoformat()),
+        )
+
+    def add_closed(self, entry: dict, blacklist_token: str = ""):
+        stmts = [self._closed_insert(entry)]
+        if blacklist_token:
+            stmts.append(self._blacklist_insert(blacklist_token))
+        self._tx(stmts)
+
+    def load_closed(self, limit: int) -> list:
+        """The newest `limit` closed positions, oldest first."""
+        return [json.loads(d) for (d,) in self._query(
+            "SELECT data FROM (SELECT id, data FROM closed ORDER BY id DESC LIMIT ?) ORDER BY id", (limit,))]
+
+    # ── on-chain discovery index ──
+
+    def load_chain_tokens(self) -> dict:
+        return {int(tid): int(bal) for tid, bal in self._query("SELECT token_id, balance FROM chain_tokens")}
+
+    def load_unseeded_tokens(self) -> set:
+        return {int(tid) for (tid,) in self._query("SELECT token_id FROM chain_unseeded")}
+
+    def load_failed_ranges(self) -> list:
+        return [tuple(r) for r in self._query(
+            "SELECT from_block, to_block FROM chain_failed_ranges ORDER BY from_block")]
+
+    def save_discovery(self, balances: dict, last_block: int, unseeded: set,
+                       add_failed: list, remove_failed: list):
+        """Persist balance changes, the checkpoint, unseeded IDs and failed ranges in one transaction."""
+        stmts = [("INSERT OR REPLACE INTO chain_tokens (token_id, balance) VALUES (?, ?)", (str(t), str(b)))
+                 for t, b in balances.items()]
+        stmts.append(("DELETE FROM chain_unseeded", ()))
+        stmts += [("INSERT INTO chain_unseeded (token_id) VALUES (?)", (str(t),)) for t in unseeded]
+        stmts += [("DELETE FROM chain_failed_ranges WHERE from_block = ? AND to_block = ?", r)
+                  for r in remove_failed]
+        stmts += [("INSERT OR IGNORE INTO chain_failed_ranges VALUES (?, ?)", r) for r in add_failed]
+        stmts.append(("INSERT OR REPLACE INTO meta (key, value) VALUES ('discovery_last_block', ?)",
+                      (str(last_block),)))
+        self._tx(stmts)
+
+    # ── Gamma token metadata ──
+
+    TOKEN_META_COLUMNS = ("token_id", "condition_id", "market_id", "question", "neg_risk",
+                          "outcome_index", "end_date", "resolved", "checked_at")
+
+    def load_token_meta(self) -> dict:
+        rows = self._query(f"SELECT {', '.join(self.TOKEN_META_COLUMNS)} FROM token_meta")
+        out = {}
+        for row in rows:
+            m = dict(zip(self.TOKEN_META_COLUMNS, row))
+            m["neg_risk"] = bool(m["neg_risk"])
+            m["resolved"] = bool(m["resolved"])
+            out[m["token_id"]] = m
+        return out
+
+    def upsert_token_meta(self, meta: dict):
+        """Write one token's metadata; a resolved flag is copied to every token of the condition."""
+        stmts = [(
+            f"INSERT OR REPLACE INTO token_meta ({', '.join(self.TOKEN_META_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(self.TOKEN_META_COLUMNS))})",
+            tuple(int(meta[c]) if c in ("neg_risk", "resolved") else meta[c] for c in self.TOKEN_META_COLUMNS),
+        )]
+        if meta["resolved"] and meta["condition_id"]:
+            stmts.append(("UPDATE token_meta SET resolved = 1 WHERE condition_id = ?", (meta["condition_id"],)))
+        self._tx(stmts)
+
+    # ── market resolution ──
+
+    def load_market_resolution(self) -> dict:
+        return {mid: {"end_ts": end_ts, "resolved": bool(resolved), "checked_at": checked_at}
+                for mid, end_ts, resolved, checked_at in self._query(
+                    "SELECT market_id, end_ts, resolved, checked_at FROM market_resolution")}
+
+    def save_market_resolution(self, states: dict):
+        self._tx([(
+            "INSERT OR REPLACE INTO market_resolution (market_id, end_ts, resolved, checked_at) "
+            "VALUES (?, ?, ?, ?)",
+            (mid, st["end_ts"], int(st["resolved"]), st["checked_at"]),
+        ) for mid, st in states.items()])
+
+    def get_meta(self, key: str):
+        rows = self._query("SELECT value FROM meta WHERE key = ?", (key,))
+        return rows[0][0] if rows else None
+
+    def set_meta(self, key: str, value: str):
+        self._tx([("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))])
+
+    def add_blacklist(self, token_id: str):
+        self._tx([self._blacklist_insert(token_id)])
+
+    def load_blacklist(self) -> set:
+        return {tid for (tid,) in self._query("SELECT token_id FROM blacklist")}
+
+    # ── legacy JSON import ──
+
+    def import_json_files(self):
+        """One-shot import of data/*.json from the pre-SQLite layout. Files are left in place.
+
+        trades.json is not read here; trade_journal() imports it into the journal.
+        Everything is written in one transaction with the json_imported marker
+        last, so a crash mid-import leaves nothing behind and the next start
+        retries it.
+        """
+        if self.get_meta("json_imported"):
+            return
+        positions = _read_legacy_json(POSITIONS_FILE)
+        closed = _read_legacy_json(CLOSED_FILE)
+        blacklist = _read_legacy_json(BLACKLIST_FILE)
+        with self._positions_lock:
+            position_stmts, _, saved = self._position_statements(positions)
+            stmts = [self._closed_insert(c) for c in closed]
+            stmts += [self._blacklist_insert(tid) for tid in blacklist]
+            stmts += position_stmts
+            stmts.append(("INSERT INTO meta (key, value) VALUES ('json_imported', ?)",
+                          (datetime.now(timezone.utc).isoformat(),)))
+            self._tx(stmts)
+            self._saved_positions = saved
+        if positions or closed or blacklist:
+            log.info("Imported legacy JSON state: %d positions, %d closed, %d blacklisted",
+                     len(positions), len(closed), len(blacklist))
+
+
+def _read_legacy_json(path: str) -> list:
+    try:
+        with open(path) as f:
             return json.load(f)
-    return []
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+
+
+class TradeJournal:
+    """Append-only JSONL log of trade events (BUY/SELL/CLAIM/REDEEM/CLOSE/WITHDRAW).
+
+    Events go to the active segment `trades-NNNNNN.jsonl` and are flushed to
+    the OS on every append; fsync is batched by a background thread every
+    JOURNAL_FSYNC_SECONDS. Once a segment passes JOURNAL_SEGMENT_BYTES a new
+    one is started, and the compactor rewrites closed segments as `.jsonl.gz`
+    (dropping torn lines left by a crash). Readers stream segments and never
+    load the full history; tail() and stats() hold the compaction lock, and
+    iter_events() follows a segment to its .gz if it is compacted mid-read.
+    """
+
+    SEGMENT_RE = re.compile(r"^trades-(\d{6})\.jsonl(\.gz)?$")
+    COMPACT_INTERVAL = 300
+
+    def __init__(self, directory: str, segment_bytes: int, fsync_seconds: float):
+        self.dir = directory
+        self.segment_bytes = max(1024, segment_bytes)
+        self.fsync_seconds = fsync_seconds
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._compact_wake = threading.Event()
+        self._unsynced = 0
+        self.appended = 0
+        self.rotations = 0
+        self.compacted = 0
+        segs = self._segments()
+        self._seq = segs[-1][0] if segs and not segs[-1][1].endswith(".gz") else (segs[-1][0] + 1 if segs else 1)
+        self._file = open(self._path(self._seq), "a", encoding="utf-8")
+        threading.Thread(target=self._flusher, daemon=True, name="journal-fsync").start()
+        threading.Thread(target=self._compactor, daemon=True, name="journal-compact").start()
+
+    def _path(self, seq: int, gz: bool = False) -> str:
+        return os.path.join(self.dir, f"trades-{seq:06d}.jsonl" + (".gz" if gz else ""))
+
+    def _segments(self) -> list:
+        """[(seq, path)] oldest first. A compacted .gz wins over a leftover plain file."""
+        found = {}
+        for name in os.listdir(self.dir):
+            m = self.SEGMENT_RE.match(name)
+            if m and (int(m.group(1)) not in found or m.group(2)):
+                found[int(m.group(1))] = os.path.join(self.dir, name)
+        return sorted(found.items())
+
+    # ── writing ──
+
+    def append(self, event: dict):
+        line = json.dumps(event, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file.tell() and self._file.tell() + len(line) > self.segment_bytes:
+                self._rotate()
+            self._file.write(line)
+            self._file.flush()
+            self._unsynced += 1
+            self.appended += 1
+
+    def _rotate(self):
+        self._fsync()
+        self._file.close()
+        self._seq += 1
+        self._file = open(self._path(self._seq), "a", encoding="utf-8")
+        self.rotations += 1
+        self._compact_wake.set()
+
+    def _fsync(self):
+        if self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def sync(self):
+        with self._lock:
+            self._fsync()
+
+    def _flusher(self):
+        while True:
+            time.sleep(self.fsync_seconds)
+            try:
+                self.sync()
+            except Exception as e:
+                log.warning("Journal fsync failed: %s", e)
+
+    # ── compaction ──
+
+    def _compactor(self):
+        while True:
+            self._compact_wake.wait(self.COMPACT_INTERVAL)
+            self._compact_wake.clear()
+            try:
+                self.compact()
+            except Exception as e:
+                log.warning("Journal compaction failed: %s", e)
+
+    def compact(self) -> int:
+        """Gzip every closed plain segment, keeping only well-formed lines."""
+        done = 0
+        with self._compact_lock:
+            for seq, path in self._segments():
+                if seq >= self._seq or path.endswith(".gz"):
+                    continue
+                tmp = self._path(seq, gz=True) + ".tmp"
+                with open(path, "rb") as src, gzip.open(tmp, "wb") as dst:
+                    for line in src:
+                        try:
+                            json.loads(line)
+                        except ValueError:
+                            continue
+                        dst.write(line if line.endswith(b"\n") else line + b"\n")
+                os.replace(tmp, self._path(seq, gz=True))
+                os.remove(path)
+                done += 1
+        if done:
+            self.compacted += done
+            log.info("Journal: compacted %d segment(s)", done)
+        return done
+
+    # ── reading ──
+
+    @staticmethod
+    def _lines_reversed(path: str, block: int = 65536):
+        """Yield raw lines of a plain segment from the end, one block at a time."""
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            rest = b""
+            while pos > 0:
+                step = min(block, pos)
+                pos -= step
+                f.seek(pos)
+                lines = (f.read(step) + rest).split(b"\n")
+                rest = lines[0]
+                for line in reversed(lines[1:]):
+                    if line.strip():
+                        yield line
+            if rest.strip():
+                yield rest
+
+    @staticmethod
+    def _parse(line):
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
 
+    def tail(self, n: int) -> list:
+        """Last n events, oldest first, reading only as many segments as needed."""
+        with self._compact_lock:  # a segment can't be swapped for its .gz mid-read
+            return self._tail(n)
+
+    def _tail(self, n: int) -> list:
+        out = []
+        for _, path in reversed(self._segments()):
+            need = n - len(out)
+            if need <= 0:
+                break
+            if path.endswith(".gz"):
+                chunk = deque(maxlen=need)
+                with gzip.open(path, "rb") as f:
+                    for line in f:
+                        ev = self._parse(line)
+                        if ev is not None:
+                            chunk.append(ev)
+                out.extend(reversed(chunk))
+            else:
+                for line in self._lines_reversed(path):
+                    ev = self._parse(line)
+                    if ev is not None:
+                        out.append(ev)
+                        if len(out) >= n:
+                            break
+        out.reverse()
+        return out
+
+    def iter_events(self):
+        """Stream every event, oldest first."""
+        for seq, path in self._segments():
+            try:
+                f = gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+            except FileNotFoundError:  # compacted since we listed it
+                f = gzip.open(self._path(seq, gz=True), "rb")
+            with f:
+                for line in f:
+                    ev = self._parse(line)
+                    if ev is not None:
+                        yield ev
+
+    def is_empty(self) -> bool:
+        return all(os.path.getsize(p) == 0 for _, p in self._segments())
+
+    def stats(self) -> dict:
+        with self._compact_lock:
+            segs = self._segments()
+            nbytes = sum(os.path.getsize(p) for _, p in segs)
+        return {
+            "segments": len(segs),
+            "bytes": nbytes,
+            "appended": self.appended,
+            "rotations": self.rotations,
+            "compacted": self.compacted,
+        }
 
-def save_trades(trades: list):
-    with open(TRADES_FILE, "w") as f:
-        json.dump(trades[-500:], f, indent=2)
+
+_state_store = None
+_state_store_lock = threading.Lock()
+_trade_journal = None
+
+
+def state_store() -> StateStore:
+    global _state_store
+    with _state_store_lock:
+        if _state_store is None:
+            _state_store = StateStore(STATE_DB)
+            _state_store.import_json_files()
+        return _state_store
+
+
+def trade_journal() -> TradeJournal:
+    global _trade_journal
+    store = state_store()
+    with _state_store_lock:
+        if _trade_journal is None:
+            _trade_journal = TradeJournal(JOURNAL_DIR, JOURNAL_SEGMENT_BYTES, JOURNAL_FSYNC_SECONDS)
+            if not store.get_meta("trades_journaled"):
+                legacy = _read_legacy_json(TRADES_FILE)
+                if _trade_journal.is_empty():
+                    for t in legacy:
+                        _trade_journal.append(t)
+                    _trade_journal.sync()
+                store.set_meta("trades_journaled", datetime.now(timezone.utc).isoformat())
+                if legacy:
+                    log.info("Imported %d legacy trades into the journal", len(legacy))
+        return _trade_journal
+
+
+class PositionPersister:
+    """Coalesces save_positions() calls into one flush per tick.
+
+    save_positions() only marks the list dirty. The main loop flushes at the
+    end of each tick; changes made between ticks (dashboard actions) are
+    flushed by a background thread once they've sat for PERSIST_DEBOUNCE_SECONDS.
+    Each flush is a single SQLite transaction, so a crash leaves either the
+    old or the new state, never a half-written one.
+
+    The debounce thread never reads the live position dicts, which the main
+    thread mutates mid-tick: mark_dirty() copies them on the caller's thread,
+    and flush() (called by the tick itself) re-copies the live list first so
+    in-place edits since the last mark_dirty() are included.
+    """
+
+    def __init__(self, debounce: float):
+        self.debounce = debounce
+        self._lock = threading.Lock()
+        self._live = None        # the list save_positions() was last given
+        self._snapshot = None    # shallow copies of its dicts, taken by the caller
+        self._dirty_since = None
+        self._tick = {"flushes": 0, "rows": 0, "bytes": 0}
+        self.total_flushes = 0
+        self.total_bytes = 0
+        self._thread = None
+
+    def mark_dirty(self, positions: list):
+        snapshot = [dict(p) for p in positions]
+        with self._lock:
+            self._live = positions
+            self._snapshot = snapshot
+            if self._dirty_since is None:
+                self._dirty_since = time.monotonic()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._debouncer, daemon=True, name="persist")
+            self._thread.start()
+
+    def flush(self) -> bool:
+        """Re-copy the live list and write it now. Returns False if nothing was dirty or the write failed."""
+        with self._lock:
+            live = self._live if self._dirty_since is not None else None
+        if live is not None:
+            self.mark_dirty(live)
+        return self._write()
+
+    def _write(self) -> bool:
+        with self._lock:
+            if self._dirty_since is None:
+                return False
+            try:
+                rows, nbytes = state_store().sync_positions(self._snapshot)
+            except Exception as e:
+                log.error("Position flush failed (will retry): %s", e)
+                return False
+            self._dirty_since = None
+            self._tick["flushes"] += 1
+            self._tick["rows"] += rows
+            self._tick["bytes"] += nbytes
+            self.total_flushes += 1
+            self.total_bytes += nbytes
+            return True
+
+    def _debouncer(self):
+        while True:
+            time.sleep(max(0.1, self.debounce / 2))
+            since = self._dirty_since
+            if since is not None and time.monotonic() - since >= self.debounce:
+                self._write()
+
+    def take_tick_metrics(self) -> dict:
+        """Return flush/rows/bytes since the last call and reset them."""
+        with self._lock:
+            metrics, self._tick = self._tick, {"flushes": 0, "rows": 0, "bytes": 0}
+            return metrics
+
+    def stats(self) -> dict:
+        return {"dirty": self._dirty_since is not None,
+                "total_flushes": self.total_flushes, "total_bytes": self.total_bytes}
+
+
+position_persister = PositionPersister(PERSIST_DEBOUNCE_SECONDS)
+
+
+def load_positions() -> list:
+    return state_store().load_positions()
+
+
+def save_positions(positions: list):
+    """Mark positions dirty; position_persister writes them (coalesced)."""
+    position_persister.mark_dirty(positions)
+
+
+def load_trades() -> list:
+    return trade_journal().tail(TRADE_HISTORY_MAX)
 
 
 def add_trade(trade: dict):
     trade_history.append(trade)
-    save_trades(trade_history)
+    del trade_history[:-TRADE_HISTORY_MAX]
+    trade_journal().append(trade)
 
 
 def load_closed() -> list:
-    if os.path.exists(CLOSED_FILE):
-        with open(CLOSED_FILE) as f:
-            return json.load(f)
-    return []
+    return state_store().load_closed(CLOSED_HISTORY_MAX)
 
 
-def save_closed(closed: list):
-    with open(CLOSED_FILE, "w") as f:
-        json.dump(closed[-200:], f, indent=2)
+def record_closed(entry: dict, blacklist: bool = True):
+    """Append a closed position to history and (by default) blacklist its token, atomically."""
+    tid = str(entry.get("token_id", "")) if blacklist else ""
+    bot_state["closed_positions"].append(entry)
+    state_store().add_closed(entry, blacklist_token=tid)
+    if tid:
+        blacklisted_tokens.add(tid)
 
 
 def close_position(pos: dict, exit_type: str, exit_price: float):
@@ -276,15 +982,127 @@ def close_position(pos: dict, exit_type: str, exit_price: float):
         "market_id": pos.get("market_id", ""),
     }
 
-    bot_state["closed_positions"].append(closed)
     if not no_cost:
         bot_state["total_returned"] += revenue
-    save_closed(bot_state["closed_positions"])
+    record_closed(closed)
 
-    tid = pos.get("token_id", "")
-    if tid:
-        blacklisted_tokens.add(tid)
-        save_blacklist(blacklisted_tokens)
+
+# ── HTTP ──────────────────────────────────────────────────────────────────────
+
+class HttpPool:
+    """Shared keep-alive HTTP clients: one pooled httpx.Client per host (and per proxy route).
+
+    Requests are retried on 429/5xx and transport errors with jittered
+    exponential backoff (a Retry-After header wins when present, capped at
+    max_backoff). Time to response headers is recorded per endpoint, with
+    ids in the path collapsed so /order/0xabc.. and /order/0xdef.. share a
+    row. HTTP/2 is used when enabled and the h2 package is importable.
+    """
+
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+    ID_SEGMENT = re.compile(r"^(0x)?[0-9a-fA-F-]{16,}$|^\d+$")
+
+    def __init__(self, retries: int, backoff: float, max_backoff: float, pool_size: int, http2: bool):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                http2 = False
+        self.http2 = http2
+        self._lock = threading.Lock()
+        self._clients = {}   # (host, proxied) -> httpx.Client
+        self._latency = {}   # endpoint -> {"n", "total", "max", "errors", "retries"}
+
+    def endpoint(self, url) -> str:
+        parts = urlsplit(str(url))
+        path = "/".join(":id" if self.ID_SEGMENT.match(seg) else seg for seg in parts.path.split("/"))
+        return f"{parts.netloc}{path}"
+
+    def _on_request(self, request):
+        request.extensions["vig_t0"] = time.time()
+
+    def _on_response(self, response):
+        t0 = response.request.extensions.get("vig_t0")
+        if t0 is not None:
+            self._record(self.endpoint(response.request.url), time.time() - t0,
+                         error=response.status_code >= 400)
+
+    def _record(self, endpoint: str, elapsed: float, error: bool = False, retry: bool = False):
+        with self._lock:
+            st = self._latency.setdefault(endpoint, {"n": 0, "total": 0.0, "max": 0.0, "errors": 0, "retries": 0})
+            if elapsed is not None:
+                st["n"] += 1
+                st["total"] += elapsed
+                st["max"] = max(st["max"], elapsed)
+            st["errors"] += int(error)
+            st["retries"] += int(retry)
+
+    def client(self, host: str, proxied: bool = False) -> httpx.Client:
+        """The pooled client for `host` (scheme://netloc), created on first use."""
+        key = (host, proxied and bool(_PROXY_URL))
+        with self._lock:
+            c = self._clients.get(key)
+            if c is None:
+                c = httpx.Client(
+                    http2=self.http2,
+                    proxy=_PROXY_URL if key[1] else None,  # explicit: skip the global proxy patch
+                    limits=httpx.Limits(max_connections=self.pool_size,
+                                        max_keepalive_connections=self.pool_size),
+                    follow_redirects=True,
+                    event_hooks={"request": [self._on_request], "response": [self._on_response]},
+                )
+                self._clients[key] = c
+            return c
+
+    def _delay(self, attempt: int, resp=None) -> float:
+        if resp is not None:
+            retry_after = resp.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return min(self.max_backoff, max(0.0, float(retry_after)))
+                except ValueError:
+                    try:
+                        when = email.utils.parsedate_to_datetime(retry_after)
+                        return min(self.max_backoff, max(0.0, when.timestamp() - time.time()))
+                    except (TypeError, ValueError):
+                        pass
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def request(self, method: str, url: str, proxied: bool = False, retries: int | None = None,
+                **kwargs) -> httpx.Response:
+        parts = urlsplit(url)
+        c = self.client(f"{parts.scheme}://{parts.netloc}", proxied)
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                resp = c.request(method, url, **kwargs)
+            except httpx.TransportError:
+                self._record(self.endpoint(url), None, error=True, retry=attempt < retries)
+                if attempt >= retries:
+                    raise
+                time.sleep(self._delay(attempt))
+                continue
+            if resp.status_code in self.RETRY_STATUS and attempt < retries:
+                self._record(self.endpoint(url), None, retry=True)
+                time.sleep(self._delay(attempt, resp))
+                continue
+            return resp
+
+    def get(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("GET", url, **kwargs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {ep: {"n": st["n"], "avg_ms": round(st["total"] / st["n"] * 1000, 1) if st["n"] else None,
+                         "max_ms": round(st["max"] * 1000, 1), "errors": st["errors"], "retries": st["retries"]}
+                    for ep, st in sorted(self._latency.items())}
+
+
+http_pool = HttpPool(HTTP_RETRIES, HTTP_BACKOFF, HTTP_MAX_BACKOFF, HTTP_POOL_SIZE, HTTP2_ENABLED)
 
 
 # ── Clients ───────────────────────────────────────────────────────────────────
@@ -292,6 +1110,10 @@ def close_position(pos: dict, exit_type: str, exit_price: float):
 def build_clob_client() -> ClobClient:
     if not PRIVATE_KEY:
         raise ValueError("PRIVATE_KEY not set in .env")
+    # py-clob-client keeps one module-level httpx client, created at import (before
+    # the proxy patch above could apply). Hand it our pooled one for the CLOB host,
+    # proxied when a residential proxy is configured.
+    clob_http._http_client = http_pool.client(CLOB_HOST, proxied=True)
     client = ClobClient(host=CLOB_HOST, key=PRIVATE_KEY, chain_id=POLYGON)
     client.set_api_creds(client.create_or_derive_api_creds())
     log.info("CLOB ready. Address: %s", client.get_address())
@@ -347,6 +1169,8 @@ def build_web3() -> tuple:
             log.info("CTF approved for NegRiskAdapter")
     except Exception as e:
         log.warning("CTF approval check failed: %s", e)
+    global tx_tracker
+    tx_tracker = ReceiptTracker(w3, account, NonceManager(w3, account.address))
     log.info("Web3 ready. Wallet: %s", account.address)
     return w3, account, ctf, neg_risk_adapter
 
@@ -374,6 +1198,30 @@ def get_matic_balance() -> float:
         return 0.0
 
 
+def read_token_balances(ctf, owner: str, token_ids, block_identifier="latest") -> dict:
+    """Read many CTF token balances with balanceOfBatch, BALANCE_BATCH_SIZE ids per eth_call.
+
+    Returns {token_id: raw_balance}. A failed batch falls back to per-token
+    balanceOf; tokens that still fail are left out.
+    """
+    ids = list(dict.fromkeys(int(t) for t in token_ids))
+    balances = {}
+    size = max(1, BALANCE_BATCH_SIZE)
+    for i in range(0, len(ids), size):
+        chunk = ids[i:i + size]
+        try:
+            raw = ctf.functions.balanceOfBatch([owner] * len(chunk), chunk).call(
+                block_identifier=block_identifier)
+            balances.update(zip(chunk, (int(b) for b in raw)))
+        except Exception as e:
+            log.debug("balanceOfBatch failed (%d ids): %s — per-token fallback", len(chunk), e)
+            for tid in chunk:
+                try:
+                    balances[tid] = int(ctf.functions.balanceOf(owner, tid).call(
+                        block_identifier=block_identifier))
+                except Exception:
+                    pass
+    return balances
 
 
 # ── Data API (authoritative source of truth) ─────────────────────────────────
@@ -381,8 +1229,8 @@ def get_matic_balance() -> float:
 def data_api_positions():
     """Fetch open positions from Polymarket Data API."""
     try:
-        r = requests.get(f"{DATA_API}/positions",
-                         params={"user": account_instance.address.lower()}, timeout=10)
+        r = http_pool.get(f"{DATA_API}/positions",
+                          params={"user": account_instance.address.lower()}, timeout=10)
         if r.status_code == 200:
             return r.json()
     except Exception as e:
@@ -393,8 +1241,8 @@ def data_api_positions():
 def data_api_value():
     """Fetch total portfolio value from Data API."""
     try:
-        r = requests.get(f"{DATA_API}/value",
-                         params={"user": account_instance.address.lower()}, timeout=10)
+        r = http_pool.get(f"{DATA_API}/value",
+                          params={"user": account_instance.address.lower()}, timeout=10)
         if r.status_code == 200:
             data = r.json()
             if data:
@@ -426,6 +1274,10 @@ def reconcile_positions():
 
     tracked_tokens = {p["token_id"] for p in bot_state["positions"]}
     changed = False
+    ctf = w3_instance.eth.contract(address=Web3.to_checksum_address(CTF_ADDRESS), abi=CTF_ABI)
+    redeem_bal = read_token_balances(ctf, account_instance.address, [
+        ap["asset"] for ap in api_pos
+        if ap.get("redeemable") and ap.get("negativeRisk") and ap.get("asset")])
 
     for ap in api_pos:
         token_id = ap.get("asset", "")
@@ -443,15 +1295,23 @@ def reconcile_positions():
             log.info("RECONCILE: redeemable — %s %s (%.0f tok @ $%.2f)",
                      title[:40], outcome, size, cur_price)
             is_neg = neg_risk
-            if relay_client and _relayer_redeem(
-                    w3_instance.eth.contract(address=Web3.to_checksum_address(CTF_ADDRESS), abi=CTF_ABI),
-                    condition_id, neg_risk=is_neg, token_id=token_id, outcome_index=0):
-                log.info("RECONCILE: redeemed via relayer — %s", title[:40])
-            elif try_claim(w3_instance, account_instance,
-                          w3_instance.eth.contract(address=Web3.to_checksum_address(CTF_ADDRESS), abi=CTF_ABI),
-                          {"condition_id": condition_id, "question": title,
-                           "neg_risk": is_neg, "token_id": token_id}):
-                log.info("RECONCILE: redeemed direct — %s", title[:40])
+            bal = redeem_bal.get(int(token_id)) if token_id and is_neg else None
+            outcome_index = int(ap.get("outcomeIndex") or 0)
+            claim = {"condition_id": condition_id, "question": title, "neg_risk": is_neg, "token_id": token_id,
+                     "outcome_index": outcome_index}
+
+            def on_relayer(ok, claim=claim, bal=bal):
+                if ok:
+                    log.info("RECONCILE: redeemed via relayer — %s", claim["question"][:40])
+                elif try_claim(w3_instance, account_instance, ctf, claim, balance=bal):
+                    log.info("RECONCILE: redeem sent direct — %s", claim["question"][:40])
+
+            if redemption_batcher.add(ctf, condition_id, title, on_relayer,
+                                      neg_risk=is_neg, token_id=token_id, outcome_index=outcome_index,
+                                      balance=bal):
+                log.info("RECONCILE: queued for gasless redeem — %s", title[:40])
+            elif try_claim(w3_instance, account_instance, ctf, claim, balance=bal):
+                log.info("RECONCILE: redeem sent direct — %s", title[:40])
 
             # Check if position was tracked and mark done
             if token_id in tracked_tokens:
@@ -464,7 +1324,7 @@ def reconcile_positions():
             else:
                 # Add to closed history
                 avg_price = float(ap.get("avgPrice", 0.25))
-                bot_state["closed_positions"].append({
+                record_closed({
                     "question": title, "buy_price": avg_price,
                     "exit_price": cur_price, "size": size,
                     "cost": round(size * avg_price, 2),
@@ -474,8 +1334,7 @@ def reconcile_positions():
                     "opened_at": "", "closed_at": datetime.now(timezone.utc).isoformat(),
                     "token_id": token_id, "condition_id": condition_id,
                     "market_id": "", "source": "data_api_reconcile",
-                })
-                save_closed(bot_state["closed_positions"])
+                }, blacklist=False)
                 changed = True
             time.sleep(2)
             continue
@@ -537,6 +1396,57 @@ def _is_priority_market(question: str) -> bool:
     return any(kw in q for kw in PRIORITY_KEYWORDS)
 
 
+def _iso_to_ts(value) -> float | None:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def _in_price_band(price: float) -> bool:
+    return BUY_MIN * 0.5 <= price <= BUY_MAX * 1.5
+
+
+def _market_outcomes(market: dict) -> list:
+    """Every outcome of a Gamma market as a candidate dict, unfiltered. Malformed markets give []."""
+    tokens = market.get("clobTokenIds")
+    outcome_prices = market.get("outcomePrices")
+    outcomes = market.get("outcomes")
+
+    if not tokens or not outcome_prices or not outcomes:
+        return []
+
+    try:
+        token_list = json.loads(tokens) if isinstance(tokens, str) else tokens
+        price_list = json.loads(outcome_prices) if isinstance(outcome_prices, str) else outcome_prices
+        outcome_list = json.loads(outcomes) if isinstance(outcomes, str) else outcomes
+    except (json.JSONDecodeError, TypeError):
+        return []
+
+    volume = float(market.get("volumeNum") or market.get("volume") or 0)
+    question = market.get("question", "Unknown")
+    found = []
+    for i in range(min(len(token_list), len(price_list), len(outcome_list))):
+        found.append({
+            "market_id": market.get("id"),
+            "question": f"{question} → {outcome_list[i]}",
+            "token_id": token_list[i],
+            "condition_id": market.get("conditionId"),
+            "outcome_index": i,
+            "price": float(price_list[i]),
+            "volume": volume,
+            "tick_size": market.get("orderPriceMinTickSize", 0.01),
+            "neg_risk": bool(market.get("negRisk")),
+            "end_date": market.get("endDate"),
+            "best_bid": float(market.get("bestBid") or 0),
+            "best_ask": float(market.get("bestAsk") or 0),
+            "spread": float(market.get("spread") or 0),
+        })
+    return found
+
+
 def _parse_market_candidates(markets: list, active_token_ids: set) -> list:
     """Extract ALL outcomes — let the order book scoring decide what's tradeable."""
     found = []
@@ -553,166 +1463,830 @@ def _parse_market_candidates(markets: list, active_token_ids: set) -> list:
                 except (ValueError, TypeError):
                     pass
 
-            tokens = market.get("clobTokenIds")
-            outcome_prices = market.get("outcomePrices")
-            outcomes = market.get("outcomes")
+            for c in _market_outcomes(market):
+                if c["token_id"] not in active_token_ids and _in_price_band(c["price"]):
+                    found.append(c)
 
-            if not tokens or not outcome_prices or not outcomes:
-                continue
+        except Exception as e:
+            log.debug("Skipped market: %s", e)
+            continue
+    return found
 
-            try:
-                token_list = json.loads(tokens) if isinstance(tokens, str) else tokens
-                price_list = json.loads(outcome_prices) if isinstance(outcome_prices, str) else outcome_prices
-                outcome_list = json.loads(outcomes) if isinstance(outcomes, str) else outcomes
-            except (json.JSONDecodeError, TypeError):
+
+def load_blacklist() -> set:
+    return state_store().load_blacklist()
+
+
+blacklisted_tokens: set = set()  # filled from the state store in run()
+
+
+def _fetch_markets_by_date(end_date_min: str, end_date_max: str,
+                           limit: int = 500, offset: int = 0, timeout: float = 15) -> list:
+    """Fetch one page of active markets from /markets with server-side date filtering."""
+    resp = http_pool.get(
+        f"{GAMMA_API}/markets",
+        params={
+            "closed": "false",
+            "active": "true",
+            "limit": limit,
+            "offset": offset,
+            "order": "volume24hr",
+            "ascending": "false",
+            "end_date_min": end_date_min,
+            "end_date_max": end_date_max,
+        },
+        timeout=timeout,
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+
+def _fetch_events_markets(tag_slug: str, limit: int = 50, offset: int = 0,
+                          timeout: float = 15) -> tuple:
+    """Fetch one page of events for a tag_slug. Returns (active markets, events on the page)."""
+    resp = http_pool.get(
+        f"{GAMMA_API}/events",
+        params={
+            "closed": "false",
+            "active": "true",
+            "limit": limit,
+            "offset": offset,
+            "order": "volume24hr",
+            "ascending": "false",
+            "tag_slug": tag_slug,
+        },
+        timeout=timeout,
+    )
+    resp.raise_for_status()
+    events = resp.json()
+    markets = []
+    for event in events:
+        for m in event.get("markets", []):
+            if m.get("closed") or not m.get("active"):
                 continue
+            markets.append(m)
+    return markets, len(events)
 
-            volume = float(market.get("volumeNum") or market.get("volume") or 0)
 
-            for i in range(min(len(token_list), len(price_list), len(outcome_list))):
-                p = float(price_list[i])
-                tid = token_list[i]
+def _scan_universe(on_markets, end_min: str, end_max: str) -> dict:
+    """Page through the date-filtered universe and every tag feed concurrently.
 
-                if tid in active_token_ids:
+    Every feed keeps SCAN_PAGES_AHEAD page offsets in flight, speculatively,
+    up to its page cap. A short page marks the end of its feed; queued pages
+    past it are cancelled, and ones already running are counted as
+    overshoot. A failed page stops new offsets for its feed. Pages are
+    handed to on_markets(tag, markets) as they complete. Anything still
+    outstanding when SCAN_TIME_BUDGET runs out is abandoned. Returns
+    per-feed stats.
+    """
+    deadline = time.time() + SCAN_TIME_BUDGET
+    feeds = {"date": (SCAN_PAGE_SIZE, SCAN_MAX_PAGES)}
+    feeds.update({slug: (SCAN_EVENT_PAGE_SIZE, SCAN_EVENT_MAX_PAGES) for slug in SCAN_TAG_SLUGS})
+    stats = {tag: {"pages": 0, "markets": 0, "errors": 0, "overshoot": 0, "abandoned": 0} for tag in feeds}
+    next_page = dict.fromkeys(feeds, 0)
+    end_page = {tag: max_pages for tag, (_, max_pages) in feeds.items()}  # first offset past the feed
+    inflight = dict.fromkeys(feeds, 0)
+    pending = {}
+
+    def fetch(tag, page):
+        size = feeds[tag][0]
+        timeout = max(1.0, min(15.0, deadline - time.time()))
+        if tag == "date":
+            markets = _fetch_markets_by_date(end_min, end_max, limit=size, offset=page * size, timeout=timeout)
+            return markets, len(markets)
+        return _fetch_events_markets(tag, limit=size, offset=page * size, timeout=timeout)
+
+    def top_up(tag):
+        while inflight[tag] < max(1, SCAN_PAGES_AHEAD) and next_page[tag] < end_page[tag]:
+            page = next_page[tag]
+            next_page[tag] += 1
+            inflight[tag] += 1
+            pending[pool.submit(fetch, tag, page)] = (tag, page)
+
+    def end_feed(tag, page):
+        end_page[tag] = min(end_page[tag], page + 1)
+        for fut, (t, p) in list(pending.items()):
+            if t == tag and p >= end_page[tag] and fut.cancel():
+                del pending[fut]
+                inflight[tag] -= 1
+
+    pool = ThreadPoolExecutor(max_workers=SCAN_WORKERS)
+    try:
+        for tag in feeds:
+            top_up(tag)
+        while pending:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for fut in done:
+                tag, page = pending.pop(fut)
+                inflight[tag] -= 1
+                try:
+                    markets, raw_count = fut.result()
+                except Exception as e:
+                    stats[tag]["errors"] += 1
+                    (log.error if tag == "date" else log.debug)("Scan %s page %d failed: %s", tag, page, e)
+                    end_page[tag] = min(end_page[tag], next_page[tag])  # no new offsets for a failing feed
                     continue
+                if page >= end_page[tag]:
+                    stats[tag]["overshoot"] += 1
+                else:
+                    stats[tag]["pages"] += 1
+                    if raw_count < feeds[tag][0]:
+                        end_feed(tag, page)
+                if markets:
+                    stats[tag]["markets"] += len(markets)
+                    on_markets(tag, markets)
+                top_up(tag)
+        for tag, _ in pending.values():
+            stats[tag]["abandoned"] += 1
+        if pending:
+            log.warning("Scan time budget (%.0fs) hit — abandoned %d page(s): %s",
+                        SCAN_TIME_BUDGET, len(pending),
+                        ", ".join(sorted({tag for tag, _ in pending.values()})))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return stats
+
+
+class MarketUniverse:
+    """In-memory index of every outcome of the scanned markets, kept fresh incrementally.
+
+    A full refresh (the paged, concurrent scan) rebuilds the index every
+    full_interval seconds. A refresh cut short by the time budget or by
+    failed pages is merged into the index instead of replacing it. In
+    between, a delta refresh every delta_interval seconds pulls only
+    markets updated since the last refresh (newest updatedAt first, stopping
+    at the watermark) and re-parses just those; closed or inactive markets
+    drop out. A delta that hits UNIVERSE_DELTA_MAX_PAGES before reaching the
+    watermark keeps the watermark and schedules a full refresh instead.
+    Markets past their endDate are evicted on every refresh.
+
+    Nothing is filtered by price or expiry when indexing. The price band and
+    the MAX_EXPIRY_DAYS window are applied per query, so a market that
+    drifts into either shows up without waiting for a refresh. Fetches
+    reach full_interval past the window so those markets are already
+    indexed.
+
+    Indexed by market id, token id and condition id. Refreshes run on one
+    background thread and are serialized with ensure_ready()'s fallback
+    scan; queries only take the index lock.
+    """
 
-                if p < BUY_MIN * 0.5 or p > BUY_MAX * 1.5:
+    WATERMARK_SLACK = 120  # seconds of overlap between deltas (clock skew, late writes)
+
+    def __init__(self, full_interval: float, delta_interval: float):
+        self.full_interval = full_interval
+        self.delta_interval = delta_interval
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # one refresh at a time
+        self._markets = {}       # market_id -> {"tag", "condition_id", "end_ts", "tokens"}
+        self.by_token = {}       # token_id -> candidate dict
+        self.by_condition = {}   # condition_id -> set(token_id)
+        self._watermark = 0.0    # updatedAt (epoch) covered by the last refresh
+        self._last_full = 0.0
+        self._last_delta = 0.0
+        self._full_due = False   # a delta was cut short before the watermark
+        self._started = False
+        self._ready = threading.Event()
+        self.full_refreshes = 0
+        self.truncated_refreshes = 0
+        self.delta_refreshes = 0
+        self.delta_updates = 0
+        self.last_scan_stats = {}
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        threading.Thread(target=self._run, daemon=True, name="universe").start()
+
+    def ensure_ready(self):
+        """Block until the index has been filled once (waits for the background refresh if running)."""
+        if self._started:
+            self._ready.wait(SCAN_TIME_BUDGET + 15)
+        if not self._ready.is_set():
+            with self._refresh_lock:
+                if not self._ready.is_set():  # the refresher may have finished while we waited
+                    self._refresh_full()
+
+    def _run(self):
+        while True:
+            try:
+                now = time.time()
+                if self._full_due or now - self._last_full >= self.full_interval:
+                    self.refresh_full()
+                elif now - self._last_delta >= self.delta_interval:
+                    self.refresh_delta()
+            except Exception as e:
+                log.warning("Universe refresh failed: %s", e)
+            time.sleep(1)
+
+    def _window(self) -> tuple:
+        """Gamma end-date filter: the expiry window, plus markets entering it before the next full refresh."""
+        now = datetime.now(timezone.utc)
+        return (now.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                (now + timedelta(days=MAX_EXPIRY_DAYS, seconds=self.full_interval))
+                .strftime("%Y-%m-%dT%H:%M:%SZ"))
+
+    @staticmethod
+    def _entries(tagged: dict) -> dict:
+        """{market_id: (tag, market)} -> {market_id: entry} with every outcome of each market."""
+        entries = {}
+        for mid, (tag, market) in tagged.items():
+            try:
+                cands = _market_outcomes(market)
+            except Exception as e:
+                log.debug("Skipped market %s: %s", mid, e)
+                continue
+            for c in cands:
+                c["_tag"] = tag
+            entries[mid] = {
+                "tag": tag,
+                "condition_id": market.get("conditionId"),
+                "end_ts": _iso_to_ts(market.get("endDate") or market.get("endDateIso")),
+                "tokens": {c["token_id"]: c for c in cands},
+            }
+        return entries
+
+    def _reindex(self):
+        """Rebuild by_token / by_condition from _markets. Caller holds the lock."""
+        self.by_token = {}
+        self.by_condition = {}
+        for entry in self._markets.values():
+            self.by_token.update(entry["tokens"])
+            if entry["condition_id"]:
+                self.by_condition.setdefault(entry["condition_id"], set()).update(entry["tokens"])
+
+    def _evict_expired(self, now: float):
+        expired = [mid for mid, e in self._markets.items() if e["end_ts"] is not None and e["end_ts"] < now]
+        for mid in expired:
+            del self._markets[mid]
+        return len(expired)
+
+    def refresh_full(self):
+        with self._refresh_lock:
+            self._refresh_full()
+
+    def _refresh_full(self):
+        started = time.time()
+        end_min, end_max = self._window()
+        markets = {}
+
+        def on_markets(tag, page):
+            for m in page:
+                mid = str(m.get("id", ""))
+                if mid and mid not in markets:
+                    markets[mid] = (tag, m)
+
+        stats = _scan_universe(on_markets, end_min, end_max)
+        complete = not any(st["errors"] or st["abandoned"] for st in stats.values())
+        markets = self._entries(markets)
+        with self._lock:
+            if complete or not self._markets:
+                self._markets = markets
+                self._watermark = started - self.WATERMARK_SLACK
+            else:
+                # Keep what the partial scan missed; the watermark stays put so deltas still cover it
+                self._markets.update(markets)
+                self.truncated_refreshes += 1
+            self._evict_expired(time.time())
+            self._reindex()
+            self._last_full = self._last_delta = started
+            self._full_due = False
+            self.full_refreshes += 1
+            self.last_scan_stats = stats
+            total, size = len(self._markets), len(self.by_token)
+        self._ready.set()
+        log.info("Universe full refresh%s: %d markets fetched, %d indexed, %d outcomes in %.1fs [%s]",
+                 "" if complete else " (partial, merged)", len(markets), total, size, time.time() - started,
+                 " ".join(f"{k}={st['markets']}/{st['pages']}p" for k, st in stats.items()))
+
+    def refresh_delta(self):
+        with self._refresh_lock:
+            self._refresh_delta()
+
+    def _refresh_delta(self):
+        started = time.time()
+        end_min, end_max = self._window()
+        updated = {}
+        oldest_needed = self._watermark
+        newest_seen = oldest_needed
+        caught_up = False
+        for page in range(UNIVERSE_DELTA_MAX_PAGES):
+            resp = http_pool.get(
+                f"{GAMMA_API}/markets",
+                params={
+                    "limit": UNIVERSE_DELTA_PAGE,
+                    "offset": page * UNIVERSE_DELTA_PAGE,
+                    "order": "updatedAt",
+                    "ascending": "false",
+                    "end_date_min": end_min,
+                    "end_date_max": end_max,
+                },
+                timeout=10,
+            )
+            resp.raise_for_status()
+            batch = resp.json()
+            reached_watermark = False
+            for m in batch:
+                ts = _iso_to_ts(m.get("updatedAt")) or started
+                if ts < oldest_needed:
+                    reached_watermark = True
+                    break
+                newest_seen = max(newest_seen, ts)
+                mid = str(m.get("id", ""))
+                if mid and mid not in updated:
+                    updated[mid] = m
+            if reached_watermark or len(batch) < UNIVERSE_DELTA_PAGE:
+                caught_up = True
+                break
+
+        with self._lock:
+            live = {}
+            for mid, m in updated.items():
+                if m.get("closed") or not m.get("active", True):
+                    self._markets.pop(mid, None)
+                else:
+                    prev = self._markets.get(mid)
+                    live[mid] = (prev["tag"] if prev else "date", m)
+            self._markets.update(self._entries(live))
+            expired = self._evict_expired(time.time())
+            if updated or expired:
+                self._reindex()
+            if caught_up:
+                self._watermark = max(self._watermark, newest_seen - self.WATERMARK_SLACK)
+            else:
+                # Updates between the watermark and the oldest page fetched were never seen
+                self._full_due = True
+            self._last_delta = started
+            self.delta_refreshes += 1
+            self.delta_updates += len(updated)
+        if not caught_up:
+            log.info("Universe delta hit its %d-page limit before the watermark — full refresh next",
+                     UNIVERSE_DELTA_MAX_PAGES)
+        if updated or expired:
+            log.debug("Universe delta: %d updated, %d expired in %.2fs",
+                      len(updated), expired, time.time() - started)
+
+    def query(self, exclude: set) -> list:
+        """Candidates (copies) in the price band and expiry window and not in `exclude`, by volume."""
+        now = time.time()
+        max_end = now + MAX_EXPIRY_DAYS * 86400
+        with self._lock:
+            out = []
+            for entry in self._markets.values():
+                if entry["end_ts"] is not None and not now <= entry["end_ts"] <= max_end:
                     continue
+                for tid, c in entry["tokens"].items():
+                    if tid not in exclude and _in_price_band(c["price"]):
+                        out.append(dict(c))
+        out.sort(key=lambda m: m["volume"], reverse=True)
+        return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "markets": len(self._markets),
+                "outcomes": len(self.by_token),
+                "conditions": len(self.by_condition),
+                "full_refreshes": self.full_refreshes,
+                "truncated_refreshes": self.truncated_refreshes,
+                "delta_refreshes": self.delta_refreshes,
+                "delta_updates": self.delta_updates,
+                "full_age": round(time.time() - self._last_full, 1) if self._last_full else None,
+                "delta_age": round(time.time() - self._last_delta, 1) if self._last_delta else None,
+            }
 
-                question = market.get("question", "Unknown")
-                outcome_name = str(outcome_list[i])
-                label = f"{question} → {outcome_name}"
-
-                found.append({
-                    "market_id": market.get("id"),
-                    "question": label,
-                    "token_id": tid,
-                    "condition_id": market.get("conditionId"),
-                    "price": p,
-                    "volume": volume,
-                    "tick_size": market.get("orderPriceMinTickSize", 0.01),
-                    "neg_risk": bool(market.get("negRisk")),
-                    "best_bid": float(market.get("bestBid") or 0),
-                    "best_ask": float(market.get("bestAsk") or 0),
-                    "spread": float(market.get("spread") or 0),
-                })
 
-        except Exception as e:
-            log.debug("Skipped market: %s", e)
-            continue
-    return found
+market_universe = MarketUniverse(UNIVERSE_FULL_REFRESH, UNIVERSE_DELTA_SECONDS)
 
 
-BLACKLIST_FILE = os.path.join(DATA_DIR, "blacklist.json")
+def scan_markets(active_token_ids: set, blacklist: frozenset) -> list:
+    """Candidate outcomes from the market universe index (full scan first if it is still empty).
 
+    `blacklist` is a snapshot taken by the caller: scans run on stage and
+    request threads while the main thread adds to blacklisted_tokens.
+    """
+    market_universe.ensure_ready()
+
+    t0 = time.time()
+    qualifying = market_universe.query(set(active_token_ids) | blacklist)
+    st = market_universe.stats()
+    tags = {}
+    for c in qualifying:
+        tags[c["_tag"]] = tags.get(c["_tag"], 0) + 1
+    tags_str = " ".join(f"{k}={v}" for k, v in tags.items())
+    log.info("Scan — %d candidates in %.0fms (universe %d markets, full %.0fs / delta %.0fs ago, "
+             "blacklisted %d) [%s]",
+             len(qualifying), (time.time() - t0) * 1000, st["markets"], st["full_age"] or 0,
+             st["delta_age"] or 0, len(blacklist), tags_str)
+    return qualifying
 
-def load_blacklist() -> set:
-    try:
-        with open(BLACKLIST_FILE) as f:
-            return set(json.load(f))
-    except (FileNotFoundError, json.JSONDecodeError):
-        return set()
 
+# ── Order Books ───────────────────────────────────────────────────────────────
 
-def save_blacklist(bl: set):
-    with open(BLACKLIST_FILE, "w") as f:
-        json.dump(list(bl), f)
+class BookCache:
+    """Process-wide TTL + LRU order-book cache shared by the main loop and dashboard.
 
+    Callers asking for a token that another thread is already fetching wait
+    for that request instead of issuing their own.
+    """
 
-blacklisted_tokens: set = load_blacklist()
+    INFLIGHT_WAIT = 20  # seconds to wait on another thread's fetch
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max(1, max_size)
+        self._books = OrderedDict()  # token_id -> (fetched_at, book)
+        self._inflight = {}          # token_id -> threading.Event
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get_many(self, token_ids: list, fetch) -> dict:
+        """Return {token_id: book}, calling fetch(missing_ids) -> dict for cache misses."""
+        result = {}
+        to_fetch = []
+        waiting = {}
+        now = time.monotonic()
+        with self._lock:
+            for tid in token_ids:
+                entry = self._books.get(tid)
+                if entry and now - entry[0] < self.ttl:
+                    self._books.move_to_end(tid)
+                    result[tid] = entry[1]
+                    self.hits += 1
+                elif tid in self._inflight:
+                    waiting[tid] = self._inflight[tid]
+                    self.coalesced += 1
+                else:
+                    self._inflight[tid] = threading.Event()
+                    to_fetch.append(tid)
+                    self.misses += 1
 
+        if to_fetch:
+            fetched = {}
+            try:
+                fetched = fetch(to_fetch) or {}
+            finally:
+                with self._lock:
+                    stamp = time.monotonic()
+                    for tid in to_fetch:
+                        book = fetched.get(tid)
+                        if book is not None:
+                            self._books[tid] = (stamp, book)
+                            self._books.move_to_end(tid)
+                            result[tid] = book
+                        self._inflight.pop(tid).set()
+                    while len(self._books) > self.max_size:
+                        self._books.popitem(last=False)
+                        self.evictions += 1
+
+        for tid, event in waiting.items():
+            event.wait(self.INFLIGHT_WAIT)
+            with self._lock:
+                entry = self._books.get(tid)
+            if entry:
+                result[tid] = entry[1]
+        return result
+
+    def invalidate(self, token_id: str):
+        with self._lock:
+            self._books.pop(str(token_id), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "size": len(self._books),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0,
+            }
 
-def _fetch_markets_by_date(end_date_min: str, end_date_max: str,
-                           limit: int = 500) -> list:
-    """Fetch active markets from /markets with server-side date filtering."""
-    try:
-        resp = requests.get(
-            f"{GAMMA_API}/markets",
-            params={
-                "closed": "false",
-                "active": "true",
-                "limit": limit,
-                "order": "volume24hr",
-                "ascending": "false",
-                "end_date_min": end_date_min,
-                "end_date_max": end_date_max,
-            },
-            timeout=15,
-        )
-        resp.raise_for_status()
-        return resp.json()
-    except Exception as e:
-        log.error("Date-filtered market scan failed: %s", e)
-        return []
 
+book_cache = BookCache(BOOK_CACHE_TTL, BOOK_CACHE_SIZE)
 
-def _fetch_events_markets(tag_slug: str, limit: int = 50) -> list:
-    """Fetch active markets from the /events endpoint using tag_slug filtering."""
-    markets = []
-    try:
-        resp = requests.get(
-            f"{GAMMA_API}/events",
-            params={
-                "closed": "false",
-                "active": "true",
-                "limit": limit,
-                "order": "volume24hr",
-                "ascending": "false",
-                "tag_slug": tag_slug,
-            },
-            timeout=15,
-        )
-        resp.raise_for_status()
-        for event in resp.json():
-            for m in event.get("markets", []):
-                if m.get("closed") or not m.get("active"):
+
+class MarketStream:
+    """Local L2 books kept current from the CLOB market WebSocket channel.
+
+    Books are seeded by `book` snapshots and updated by `price_change` deltas.
+    get_books() hands out OrderBookSummary objects ordered like the REST
+    response (best bid/ask last), so callers can't tell where a book came from.
+    A book is only served while the socket is up and the book is in sync: a
+    sequence gap (`seq` field, when the feed sends one) marks it out of sync
+    and re-requests a snapshot, and deltas older than the snapshot timestamp
+    are dropped. Unsynced tokens fall back to REST via fetch_books().
+    """
+
+    PING_SECONDS = 10
+    MAX_BACKOFF = 60
+    RESYNC_COOLDOWN = 5  # seconds between snapshot requests for one token
+
+    def __init__(self, url: str, max_assets: int):
+        self.url = url
+        self.max_assets = max_assets
+        self._books = {}       # asset_id -> {"bids", "asks", "last_trade", "timestamp", "seq", "synced"}
+        self._assets = set()
+        self._resync_at = {}   # asset_id -> monotonic time of last snapshot request
+        self._lock = threading.Lock()
+        self._ws = None
+        self._connected = False
+        self._subscribed = False
+        self.snapshots = 0
+        self.deltas = 0
+        self.gaps = 0
+        self.stale_dropped = 0
+        self.reconnects = 0
+
+    # ── lifecycle ──
+
+    def start(self) -> bool:
+        try:
+            import websocket
+        except ImportError as e:
+            log.warning("Market stream: import error — %s, using REST books", e)
+            return False
+        threading.Thread(target=self._run, args=(websocket,), daemon=True, name="market-ws").start()
+        threading.Thread(target=self._heartbeat, daemon=True, name="market-ws-ping").start()
+        log.info("Market stream: ENABLED (%s)", self.url)
+        return True
+
+    def _run(self, websocket):
+        backoff = 1
+        while True:
+            started = time.time()
+            ws = websocket.WebSocketApp(
+                self.url,
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=lambda _ws, e: log.debug("Market stream error: %s", e),
+            )
+            self._ws = ws
+            try:
+                ws.run_forever()
+            except Exception as e:
+                log.debug("Market stream run_forever: %s", e)
+            self._on_disconnect()
+            if time.time() - started > self.MAX_BACKOFF:
+                backoff = 1
+            self.reconnects += 1
+            log.warning("Market stream disconnected — reconnecting in %ds", backoff)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.MAX_BACKOFF)
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(self.PING_SECONDS)
+            if self._connected:
+                self._send("PING")
+
+    def _send(self, payload) -> bool:
+        ws = self._ws
+        if not ws or not self._connected:
+            return False
+        try:
+            ws.send(payload if isinstance(payload, str) else json.dumps(payload))
+            return True
+        except Exception as e:
+            log.debug("Market stream send failed: %s", e)
+            return False
+
+    def _on_open(self, ws):
+        self._connected = True
+        with self._lock:
+            assets = sorted(self._assets)
+        self._subscribed = False
+        if assets:
+            self._subscribed = self._send({"assets_ids": assets, "type": "market"})
+        log.info("Market stream connected — subscribed %d assets", len(assets))
+
+    def _on_disconnect(self):
+        self._connected = False
+        self._subscribed = False
+        with self._lock:
+            for book in self._books.values():
+                book["synced"] = False
+
+    # ── subscriptions ──
+
+    def set_assets(self, token_ids):
+        """Track exactly these tokens (capped at max_assets); diff is sent to the server."""
+        wanted = set(list(dict.fromkeys(str(t) for t in token_ids if t))[:self.max_assets])
+        with self._lock:
+            added = sorted(wanted - self._assets)
+            removed = sorted(self._assets - wanted)
+            self._assets = wanted
+            for tid in removed:
+                self._books.pop(tid, None)
+        if not self._connected:
+            return
+        if not self._subscribed:
+            if wanted:
+                self._subscribed = self._send({"assets_ids": sorted(wanted), "type": "market"})
+            return
+        if added:
+            self._send({"assets_ids": added, "operation": "subscribe"})
+        if removed:
+            self._send({"assets_ids": removed, "operation": "unsubscribe"})
+
+    def _resync(self, token_id: str):
+        """Ask the server for a fresh snapshot of one book (rate-limited per token)."""
+        now = time.monotonic()
+        if now - self._resync_at.get(token_id, 0) < self.RESYNC_COOLDOWN:
+            return
+        self._resync_at[token_id] = now
+        self._send({"assets_ids": [token_id], "operation": "unsubscribe"})
+        self._send({"assets_ids": [token_id], "operation": "subscribe"})
+
+    # ── message handling ──
+
+    def _on_message(self, ws, message: str):
+        if not message or message == "PONG":
+            return
+        try:
+            data = json.loads(message)
+        except (json.JSONDecodeError, TypeError):
+            return
+        for ev in data if isinstance(data, list) else [data]:
+            try:
+                self.apply(ev)
+            except Exception as e:
+                log.debug("Market stream bad event: %s", e)
+
+    @staticmethod
+    def _levels(raw) -> dict:
+        levels = {}
+        for lvl in raw or []:
+            size = float(lvl["size"])
+            if size > 0:
+                levels[round(float(lvl["price"]), 6)] = size
+        return levels
+
+    def apply(self, ev: dict):
+        """Apply one market-channel event to the local books."""
+        etype = ev.get("event_type")
+        if etype == "book":
+            tid = str(ev["asset_id"])
+            with self._lock:
+                if tid not in self._assets:
+                    return
+                prev = self._books.get(tid) or {}
+                self._books[tid] = {
+                    "bids": self._levels(ev.get("bids") or ev.get("buys")),
+                    "asks": self._levels(ev.get("asks") or ev.get("sells")),
+                    "last_trade": ev.get("last_trade_price") or prev.get("last_trade"),
+                    "timestamp": int(ev.get("timestamp") or 0),
+                    "seq": ev.get("seq"),
+                    "synced": True,
+                }
+            self.snapshots += 1
+        elif etype == "price_change":
+            changes = ev.get("price_changes")
+            if changes is None:  # legacy shape: one asset, list of changes
+                changes = [dict(c, asset_id=ev.get("asset_id")) for c in ev.get("changes", [])]
+            ts = int(ev.get("timestamp") or 0)
+            resync = set()
+            with self._lock:
+                seen_seq = set()
+                for ch in changes:
+                    tid = str(ch.get("asset_id"))
+                    book = self._books.get(tid)
+                    if not book or not book["synced"]:
+                        continue
+                    if ts and ts < book["timestamp"]:
+                        self.stale_dropped += 1
+                        continue
+                    seq = ch.get("seq", ev.get("seq"))
+                    if seq is not None and tid not in seen_seq:
+                        seen_seq.add(tid)
+                        if book["seq"] is not None and int(seq) != int(book["seq"]) + 1:
+                            book["synced"] = False
+                            self.gaps += 1
+                            resync.add(tid)
+                            continue
+                        book["seq"] = int(seq)
+                    side = book["bids"] if str(ch.get("side", "")).upper() == "BUY" else book["asks"]
+                    price = round(float(ch["price"]), 6)
+                    size = float(ch["size"])
+                    if size > 0:
+                        side[price] = size
+                    else:
+                        side.pop(price, None)
+                    if ts:
+                        book["timestamp"] = ts
+                    self.deltas += 1
+            for tid in resync:
+                log.info("Market stream: sequence gap on %s — resyncing", tid[:20])
+                self._resync(tid)
+        elif etype == "last_trade_price":
+            with self._lock:
+                book = self._books.get(str(ev.get("asset_id")))
+                if book:
+                    book["last_trade"] = ev.get("price")
+
+    # ── readers ──
+
+    def get_books(self, token_ids) -> dict:
+        """Return {token_id: OrderBookSummary} for tokens with an in-sync local book."""
+        if not self._connected:
+            return {}
+        out = {}
+        with self._lock:
+            for tid in token_ids:
+                book = self._books.get(str(tid))
+                if not book or not book["synced"]:
                     continue
-                markets.append(m)
-    except Exception as e:
-        log.debug("Events scan %s failed: %s", tag_slug, e)
-    return markets
+                out[str(tid)] = OrderBookSummary(
+                    asset_id=str(tid),
+                    bids=[OrderSummary(price=str(p), size=str(sz)) for p, sz in sorted(book["bids"].items())],
+                    asks=[OrderSummary(price=str(p), size=str(sz))
+                          for p, sz in sorted(book["asks"].items(), reverse=True)],
+                    last_trade_price=book["last_trade"],
+                    timestamp=str(book["timestamp"]),
+                )
+        return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            synced = sum(1 for b in self._books.values() if b["synced"])
+            return {
+                "connected": self._connected,
+                "assets": len(self._assets),
+                "synced_books": synced,
+                "snapshots": self.snapshots,
+                "deltas": self.deltas,
+                "gaps": self.gaps,
+                "stale_dropped": self.stale_dropped,
+                "reconnects": self.reconnects,
+            }
 
 
-def scan_markets(active_token_ids: set) -> list:
-    """Scan markets: date-filtered /markets API + tag-filtered /events."""
-    seen_tokens = set()
-    qualifying = []
-    total_scanned = 0
-    tag_counts = {}
+market_stream = MarketStream(MARKET_WS_URL, MARKET_WS_MAX_ASSETS)
 
-    now = datetime.now(timezone.utc)
-    end_min = now.strftime("%Y-%m-%dT%H:%M:%SZ")
-    end_max = (now + timedelta(days=MAX_EXPIRY_DAYS)).strftime("%Y-%m-%dT%H:%M:%SZ")
-
-    date_markets = _fetch_markets_by_date(end_min, end_max, limit=500)
-    tag_counts["expiring_7d"] = len(date_markets)
-    total_scanned += len(date_markets)
-
-    for c in _parse_market_candidates(date_markets, active_token_ids):
-        tid = c["token_id"]
-        if tid not in seen_tokens and tid not in blacklisted_tokens:
-            seen_tokens.add(tid)
-            c["_tag"] = "date"
-            qualifying.append(c)
-
-    for slug in SCAN_TAG_SLUGS:
-        markets = _fetch_events_markets(slug, limit=50)
-        tag_counts[slug] = len(markets)
-        total_scanned += len(markets)
-
-        for c in _parse_market_candidates(markets, active_token_ids):
-            tid = c["token_id"]
-            if tid not in seen_tokens and tid not in blacklisted_tokens:
-                seen_tokens.add(tid)
-                c["_tag"] = slug
-                qualifying.append(c)
-
-    tags_str = " ".join(f"{k}={v}" for k, v in tag_counts.items())
-    log.info("Scan — %d candidates (scanned %d, blacklisted %d) [%s]",
-             len(qualifying), total_scanned, len(blacklisted_tokens), tags_str)
-
-    qualifying.sort(key=lambda m: m["volume"], reverse=True)
-    return qualifying
+
+def fetch_books(client: ClobClient, token_ids) -> dict:
+    """Fetch many order books: in-sync stream books first, then book_cache.
+
+    Misses go to the CLOB batch endpoint, BOOK_BATCH_SIZE per request.
+    Returns {token_id: book}. Tokens whose book couldn't be fetched are absent.
+    """
+    ids = list(dict.fromkeys(str(t) for t in token_ids if t))
+    if not ids:
+        return {}
+    books = market_stream.get_books(ids) if MARKET_WS_ENABLED else {}
+    missing = [t for t in ids if t not in books]
+    if missing:
+        books.update(book_cache.get_many(missing, lambda m: _fetch_books_uncached(client, m)))
+    return books
+
+
+def fetch_book(client: ClobClient, token_id: str):
+    """Fetch a single order book (stream, then cache, then REST). Returns None on failure."""
+    tid = str(token_id)
+    if MARKET_WS_ENABLED:
+        book = market_stream.get_books([tid]).get(tid)
+        if book is not None:
+            return book
+    return book_cache.get_many([tid], lambda _: {tid: _fetch_book_uncached(client, tid)}).get(tid)
+
+
+def _fetch_books_uncached(client: ClobClient, ids: list) -> dict:
+    """Batch-fetch books straight from the CLOB.
+
+    A failed batch falls back to one request per token so a single bad ID
+    doesn't blank out the whole chunk.
+    """
+    books = {}
+    size = max(1, BOOK_BATCH_SIZE)
+    for i in range(0, len(ids), size):
+        chunk = ids[i:i + size]
+        try:
+            for book in client.get_order_books([BookParams(token_id=t) for t in chunk]):
+                if book and book.asset_id:
+                    books[str(book.asset_id)] = book
+        except Exception as e:
+            log.debug("Batch book fetch failed (%d tokens): %s — per-token fallback", len(chunk), e)
+            for tid in chunk:
+                book = _fetch_book_uncached(client, tid)
+                if book:
+                    books[tid] = book
+    return books
+
+
+def _fetch_book_uncached(client: ClobClient, token_id: str):
+    try:
+        return client.get_order_book(token_id)
+    except Exception as e:
+        log.debug("Book fetch failed for %s: %s", str(token_id)[:20], e)
+        return None
 
 
 # ── Order Placement ───────────────────────────────────────────────────────────
@@ -720,10 +2294,16 @@ def scan_markets(active_token_ids: set) -> list:
 STALE_ORDER_MINUTES = int(os.getenv("STALE_MINUTES", "10"))
 
 
-def score_market(token_id: str, client: ClobClient, label: str = "") -> dict | None:
-    """Score market by spread tightness and bid depth. Rejects outside buy range."""
+def score_market(token_id: str, client: ClobClient, label: str = "", book=None) -> dict | None:
+    """Score market by spread tightness and bid depth. Rejects outside buy range.
+
+    Pass a prefetched `book` to skip the network round trip.
+    """
     try:
-        book = client.get_order_book(token_id)
+        if book is None:
+            book = fetch_book(client, token_id)
+            if book is None:
+                return None
         bids = getattr(book, "bids", [])
         asks = getattr(book, "asks", [])
         ltp = float(getattr(book, "last_trade_price", 0) or 0)
@@ -765,8 +2345,401 @@ def score_market(token_id: str, client: ClobClient, label: str = "") -> dict | N
         return None
 
 
-def place_buy(client: ClobClient, market: dict) -> dict | None:
-    """Place a GTC limit buy at OUR price — we're the bid, waiting for sellers."""
+def _score_batch(client: ClobClient, batch: list) -> list:
+    """Fetch one batch of books and score each market. Returns the passing markets."""
+    books = fetch_books(client, [m["token_id"] for m in batch])
+    passed = []
+    for mkt in batch:
+        book = books.get(str(mkt["token_id"]))
+        if book is None:
+            continue
+        info = score_market(mkt["token_id"], client, mkt["question"], book=book)
+        if info:
+            mkt["_score"] = info
+            passed.append(mkt)
+    return passed
+
+
+def score_candidates(client: ClobClient, candidates: list, want: int) -> list:
+    """Score candidates in parallel (at most SCORE_WORKERS batch requests in flight).
+
+    Books are fetched BOOK_BATCH_SIZE at a time. Stops submitting once `want`
+    markets have passed; batches already in flight are still collected so
+    their scores aren't wasted.
+    """
+    scored = []
+    pending = set()
+    size = max(1, BOOK_BATCH_SIZE)
+    batches = iter([candidates[i:i + size] for i in range(0, len(candidates), size)])
+    workers = max(1, SCORE_WORKERS)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="score") as pool:
+        def submit_next() -> bool:
+            batch = next(batches, None)
+            if batch is None:
+                return False
+            pending.add(pool.submit(_score_batch, client, batch))
+            return True
+
+        for _ in range(workers):
+            if not submit_next():
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                pending.discard(fut)
+                scored.extend(fut.result())
+                if len(scored) < want:
+                    submit_next()
+    return scored
+
+
+def prepare_candidates(client: ClobClient, active_ids: set, blacklist: frozenset, want: int,
+                       stream: bool = False) -> dict:
+    """Scan, pick a check pool and score it — everything step 6 needs before buying.
+
+    Safe to run on a stage thread while the rest of the tick runs: it only
+    reads positions through `active_ids` and the blacklist through the
+    `blacklist` snapshot.
+    """
+    t_stage = time.time()
+    candidates = scan_markets(active_ids, blacklist)
+    t_scan = time.time() - t_stage
+
+    tagged = [c for c in candidates if c.get("_tag") != "volume"]
+    fallback = [c for c in candidates if c.get("_tag") == "volume"]
+    log.info("Candidates: %d tagged, %d volume-only (from %d total)",
+             len(tagged), len(fallback), len(candidates))
+
+    check_pool = tagged[:80]
+    remaining = 100 - len(check_pool)
+    if remaining > 0 and fallback:
+        check_pool += random.sample(fallback, min(remaining, len(fallback)))
+    random.shuffle(check_pool)
+    pool_ids = {m["token_id"] for m in check_pool}
+    if stream:
+        market_stream.set_assets(list(active_ids) + list(pool_ids))
+
+    t_stage = time.time()
+    scored = score_candidates(client, check_pool, want)
+    t_score = time.time() - t_stage
+
+    scored.sort(key=lambda m: m["_score"]["score"], reverse=True)
+    log.info("Scored %d/%d — top: %s",
+             len(scored), len(check_pool),
+             " | ".join(
+                 f"bid${m['_score']['all_bid_usd']:.0f}({m['_score']['n_bids']}lvl)@${m['_score']['best_bid']:.2f}"
+                 for m in scored[:5]
+             ))
+    return {"scored": scored, "pool_ids": pool_ids, "t_scan": t_scan, "t_score": t_score,
+            "ready_at": time.time()}
+
+
+def refresh_candidates(client: ClobClient, scored: list, exclude: set) -> list:
+    """Re-check prefetched candidates right before buying.
+
+    Drops tokens in `exclude` (held or blacklisted since the prefetch) and
+    re-scores the rest against current books (stream or cache), so the buy
+    price is today's ask rather than the one seen at tick start.
+    """
+    keep = [m for m in scored if str(m["token_id"]) not in exclude]
+    fresh = score_candidates(client, keep, len(keep))
+    fresh.sort(key=lambda m: m["_score"]["score"], reverse=True)
+    return fresh
+
+
+_worker_builder = None  # OrderBuilder inside a signing worker process
+
+
+def _signer_init(key: str, chain_id: int):
+    global _worker_builder
+    _worker_builder = OrderBuilder(Signer(key, chain_id))
+
+
+def _sign_in_worker(args: OrderArgs, options: CreateOrderOptions) -> tuple:
+    t0 = time.perf_counter()
+    signed = _worker_builder.create_order(args, options)
+    return signed, time.perf_counter() - t0
+
+
+def _percentiles(samples) -> dict:
+    if not samples:
+        return {"p50": None, "p90": None, "p99": None}
+    s = sorted(samples)
+    return {f"p{q}": round(s[min(len(s) - 1, int(len(s) * q / 100))] * 1000, 2) for q in (50, 90, 99)}
+
+
+class SigningService:
+    """Order signing off the hot path.
+
+    EIP-712 signing is pure-Python CPU work that holds the GIL, so orders are
+    signed on a small process pool (SIGNING_WORKERS; 0 signs inline). Tick
+    size, neg-risk and fee rate are resolved in the caller through the
+    ClobClient's own caches, mirroring ClobClient.create_order — only the
+    signature crosses the process boundary. presign_sell() starts signing a
+    position's sell as soon as its buy is posted; take_presigned() hands it
+    out if the price and size place_sells settles on still match. Every
+    sign() call draws a new salt, so each signed order has its own hash and
+    is posted at most once.
+    """
+
+    PRESIGN_MAX = 500
+
+    def __init__(self, workers: int):
+        self.workers = max(0, workers)
+        self._client = None
+        self._pool = None
+        self._presigned = OrderedDict()  # token_id -> (price, size, future)
+        self._lock = threading.Lock()
+        self._sign_times = deque(maxlen=2000)  # seconds spent signing (in the worker)
+        self._wait_times = deque(maxlen=2000)  # seconds callers blocked waiting for a signature
+        self.signed = 0
+        self.presigned = 0
+        self.presign_hits = 0
+        self.presign_misses = 0
+
+    def start(self, client: ClobClient):
+        self._client = client
+        if self.workers:
+            try:
+                # fork, and warm every worker now, while the bot is still single-threaded
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("fork"),
+                    initializer=_signer_init, initargs=(PRIVATE_KEY, POLYGON))
+                for fut in [self._pool.submit(os.getpid) for _ in range(self.workers)]:
+                    fut.result(timeout=30)
+            except Exception as e:
+                log.warning("Signing pool unavailable (%s) — signing inline", e)
+                self._pool = None
+        log.info("Order signing: %s", f"{self.workers} worker processes" if self._pool else "inline")
+
+    def _options(self, args: OrderArgs, opts: CreateOrderOptions) -> CreateOrderOptions:
+        client = self._client
+        min_tick = client.get_tick_size(args.token_id)
+        tick = opts.tick_size if opts and opts.tick_size else min_tick
+        if is_tick_size_smaller(tick, min_tick):
+            raise Exception(f"invalid tick size ({tick}), minimum for the market is {min_tick}")
+        if not price_valid(args.price, tick):
+            raise Exception(f"price ({args.price}), min: {tick} - max: {1 - float(tick)}")
+        neg_risk = opts.neg_risk if opts and opts.neg_risk else client.get_neg_risk(args.token_id)
+        args.fee_rate_bps = client.get_fee_rate_bps(args.token_id)
+        return CreateOrderOptions(tick_size=tick, neg_risk=neg_risk)
+
+    def sign(self, args: OrderArgs, opts: CreateOrderOptions) -> Future:
+        """Start signing one order; pass the future to result()."""
+        options = self._options(args, opts)
+        if self._pool is not None:
+            try:
+                return self._pool.submit(_sign_in_worker, args, options)
+            except BrokenProcessPool as e:
+                log.warning("Signing pool broken (%s) — signing inline", e)
+                self._pool = None
+        fut = Future()
+        t0 = time.perf_counter()
+        try:
+            fut.set_result((self._client.builder.create_order(args, options), time.perf_counter() - t0))
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+
+    def result(self, fut: Future):
+        t0 = time.perf_counter()
+        signed, took = fut.result()
+        with self._lock:
+            self._wait_times.append(time.perf_counter() - t0)
+            self._sign_times.append(took)
+            self.signed += 1
+        return signed
+
+    def presign_sell(self, position: dict, price: float = None):
+        """Sign a position's sell at `price` (default: its sell_target) ahead of need."""
+        price = round(price or position.get("sell_target") or SELL_TARGET, 4)
+        size = round(position["size"], 2)
+        token_id = position["token_id"]
+        try:
+            fut = self.sign(
+                OrderArgs(token_id=token_id, price=price, size=size, side=SELL),
+                CreateOrderOptions(tick_size=str(float(position.get("tick_size", 0.01))),
+                                   neg_risk=position.get("neg_risk", False)))
+        except Exception as e:
+            log.debug("Pre-sign failed for %s: %s", token_id[:20], e)
+            return
+        with self._lock:
+            self._presigned.pop(token_id, None)
+            self._presigned[token_id] = (price, size, fut)
+            while len(self._presigned) > self.PRESIGN_MAX:
+                self._presigned.popitem(last=False)
+            self.presigned += 1
+
+    def take_presigned(self, token_id: str, price: float, size: float):
+        """Return the pre-signed sell future for token_id if it matches price and size."""
+        with self._lock:
+            entry = self._presigned.pop(token_id, None)
+            if entry and entry[0] == price and entry[1] == size:
+                self.presign_hits += 1
+                return entry[2]
+            if entry:
+                self.presign_misses += 1
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers if self._pool else 0,
+                "signed": self.signed,
+                "presigned": self.presigned,
+                "presign_hits": self.presign_hits,
+                "presign_misses": self.presign_misses,
+                "sign_ms": _percentiles(self._sign_times),
+                "wait_ms": _percentiles(self._wait_times),
+            }
+
+
+signing_service = SigningService(SIGNING_WORKERS)
+
+
+DUPLICATE_ORDER_HINTS = ("already exists", "duplicate")
+
+
+def _order_hash(client: ClobClient, signed) -> str:
+    """The exchange's id for a signed order: its EIP-712 hash under the exchange's domain."""
+    order = signed.order
+    cfg = get_contract_config(client.chain_id, client.get_neg_risk(str(order["tokenId"])))
+    domain = make_domain(name="Polymarket CTF Exchange", version="1",
+                         chainId=str(client.chain_id), verifyingContract=Web3.to_checksum_address(cfg.exchange))
+    return "0x" + Web3.keccak(order.signable_bytes(domain=domain)).hex().removeprefix("0x")
+
+
+class OrderGateway:
+    """Batched order posts (post_orders) and cancellations (cancel_orders).
+
+    post() takes [(signed_order, order_type)] and returns one post_order-shaped
+    result per order, in the same order. A GTC order lost in transit — the
+    request raised, or the response has neither an orderID nor an errorMsg
+    for it — is resent up to `retries` times with the same signed payload;
+    if the exchange answers a resend with "already exists", the first post
+    landed and the order's hash is returned as its orderID. FAK orders are
+    never resent: a lost FAK may already have traded, so it comes back with
+    `_lost` set for reconciliation to settle, as do GTC orders still lost
+    after the resends. Explicit rejections are final.
+
+    cancel() returns {order_id: cancelled} and retries only the ids the
+    response neither cancelled nor refused.
+    """
+
+    def __init__(self, post_batch: int, cancel_batch: int, retries: int):
+        self.post_batch = max(1, post_batch)
+        self.cancel_batch = max(1, cancel_batch)
+        self.retries = max(0, retries)
+        self.post_requests = 0
+        self.cancel_requests = 0
+        self.posted = 0
+        self.cancelled = 0
+        self.retried = 0
+
+    def post(self, client: ClobClient, orders: list) -> list:
+        results = [None] * len(orders)
+        todo = list(range(len(orders)))
+        resent = set()
+        for attempt in range(self.retries + 1):
+            if not todo:
+                break
+            if attempt:
+                self.retried += len(todo)
+                log.info("Order gateway: resending %d order(s)", len(todo))
+            failed = []
+            for i in range(0, len(todo), self.post_batch):
+                chunk = todo[i:i + self.post_batch]
+                self.post_requests += 1
+                try:
+                    resp = client.post_orders([PostOrdersArgs(order=orders[j][0], orderType=orders[j][1])
+                                               for j in chunk])
+                except Exception as e:
+                    log.debug("post_orders failed (%d orders): %s", len(chunk), e)
+                    for j in chunk:
+                        results[j] = {"success": False, "errorMsg": str(e), "_lost": True}
+                    failed.extend(chunk)
+                    continue
+                resp = resp if isinstance(resp, list) else []
+                for k, j in enumerate(chunk):
+                    r = resp[k] if k < len(resp) and isinstance(resp[k], dict) else None
+                    if r is None or not (r.get("orderID") or r.get("errorMsg")):
+                        results[j] = {**(r or {}), "success": False, "errorMsg": "no result for order",
+                                      "_lost": True}
+                        failed.append(j)
+                    elif j in resent and not r.get("orderID") and self._duplicate(r):
+                        results[j] = self._landed(client, orders[j][0], r)
+                    else:
+                        results[j] = r
+            todo = [j for j in failed if orders[j][1] != OrderType.FAK]
+            resent.update(todo)
+        self.posted += len(orders)
+        return results
+
+    @staticmethod
+    def _duplicate(result: dict) -> bool:
+        msg = str(result.get("errorMsg") or "").lower()
+        return any(h in msg for h in DUPLICATE_ORDER_HINTS)
+
+    @staticmethod
+    def _landed(client: ClobClient, signed, result: dict) -> dict:
+        """A resend the exchange already has: the first post reached the book."""
+        try:
+            order_id = _order_hash(client, signed)
+        except Exception as e:
+            log.warning("Resent order already on the book, but its hash failed: %s", e)
+            return {**result, "success": False, "_lost": True}
+        log.info("Resent order already on the book: %s", order_id)
+        return {"success": True, "errorMsg": "", "orderID": order_id, "status": "live"}
+
+    def cancel(self, client: ClobClient, order_ids) -> dict:
+        ids = list(dict.fromkeys(i for i in order_ids if i))
+        done = {i: False for i in ids}
+        todo = ids
+        for attempt in range(self.retries + 1):
+            if not todo:
+                break
+            if attempt:
+                self.retried += len(todo)
+            failed = []
+            for i in range(0, len(todo), self.cancel_batch):
+                chunk = todo[i:i + self.cancel_batch]
+                self.cancel_requests += 1
+                try:
+                    resp = client.cancel_orders(chunk) or {}
+                except Exception as e:
+                    log.debug("cancel_orders failed (%d orders): %s", len(chunk), e)
+                    failed.extend(chunk)
+                    continue
+                cancelled = set(resp.get("canceled") or [])
+                refused = resp.get("not_canceled") or {}
+                for oid in chunk:
+                    if oid in cancelled:
+                        done[oid] = True
+                        self.cancelled += 1
+                    elif oid in refused:
+                        log.debug("Cancel refused for %s: %s", oid, refused[oid])
+                    else:
+                        failed.append(oid)
+            todo = failed
+        for oid in todo:
+            log.error("Cancel failed for %s", oid)
+        return done
+
+    def stats(self) -> dict:
+        return {
+            "post_requests": self.post_requests,
+            "posted": self.posted,
+            "cancel_requests": self.cancel_requests,
+            "cancelled": self.cancelled,
+            "retried": self.retried,
+        }
+
+
+order_gateway = OrderGateway(ORDER_BATCH_MAX, CANCEL_BATCH_MAX, ORDER_RETRIES)
+
+
+def _prepare_buy(client: ClobClient, market: dict, balance: float) -> dict | None:
+    """Price and size a GTC limit buy at OUR price — we're the bid, waiting for sellers."""
     token_id = market["token_id"]
     tick = float(market.get("tick_size", 0.01))
     neg_risk = market.get("neg_risk", False)
@@ -785,9 +2758,8 @@ def place_buy(client: ClobClient, market: dict) -> dict | None:
     if price < BUY_MIN or price > BUY_MAX:
         return None
 
-    bal = get_usdc_balance()
-    if bal < BET_SIZE * 1.1:
-        log.info("SKIP: low balance $%.2f", bal)
+    if balance < BET_SIZE * 1.1:
+        log.info("SKIP: low balance $%.2f", balance)
         return None
 
     size = int(BET_SIZE / price)
@@ -800,76 +2772,158 @@ def place_buy(client: ClobClient, market: dict) -> dict | None:
         market["question"][:30],
         size, price, cost, best_bid, best_ask, spread, info["all_bid_usd"],
     )
+    return {
+        "market": market,
+        "price": price,
+        "size": size,
+        "cost": cost,
+        "args": OrderArgs(token_id=token_id, price=round(price, 2), size=int(size), side=BUY),
+        "opts": CreateOrderOptions(tick_size=str(tick), neg_risk=neg_risk),
+    }
 
-    try:
-        buy_args = OrderArgs(
-            token_id=token_id,
-            price=round(price, 2),
-            size=int(size),
-            side=BUY,
-        )
-        opts = CreateOrderOptions(tick_size=str(tick), neg_risk=neg_risk)
 
-        signed = client.create_order(buy_args, options=opts)
-        result = client.post_order(signed, OrderType.FAK)
+def _sign_all(preps: list, what: str) -> list:
+    """Sign prepared orders in parallel (pre-signed ones are reused); drops and logs failures."""
+    pending = []
+    for prep in preps:
+        fut = prep.get("presigned")
+        try:
+            pending.append((prep, fut or signing_service.sign(prep["args"], prep["opts"])))
+        except Exception as e:
+            log.error("%s failed: %s", what, e)
+    signed = []
+    for prep, fut in pending:
+        try:
+            signed.append((prep, signing_service.result(fut)))
+        except Exception as e:
+            if fut is not prep.get("presigned"):
+                log.error("%s failed: %s", what, e)
+                continue
+            try:  # a stale pre-signature shouldn't cost the order
+                signed.append((prep, signing_service.result(signing_service.sign(prep["args"], prep["opts"]))))
+            except Exception as e2:
+                log.error("%s failed: %s", what, e2)
+    return signed
+
+
+def _bought(prep: dict, order_id: str, filled: bool) -> dict:
+    market = prep["market"]
+    log.info("Buy %s. ID: %s", "filled" if filled else "pending", order_id)
+    position = {
+        "buy_order_id": order_id,
+        "sell_order_id": None,
+        "market_id": market["market_id"],
+        "question": market["question"],
+        "token_id": market["token_id"],
+        "condition_id": market["condition_id"],
+        "outcome_index": market.get("outcome_index"),
+        "buy_price": prep["price"],
+        "sell_target": SELL_TARGET,
+        "size": prep["size"],
+        "cost": prep["cost"],
+        "tick_size": float(market.get("tick_size", 0.01)),
+        "neg_risk": market.get("neg_risk", False),
+        "end_date": market.get("end_date"),
+        "status": "held" if filled else "pending",
+        "placed_at": datetime.now(timezone.utc).isoformat(),
+    }
 
-        order_id = result.get("orderID", "")
-        filled = result.get("status") in ("MATCHED", "FILLED")
+    bot_state["total_buys"] += 1
+    bot_state["total_spent"] += prep["cost"]
+    add_trade({
+        "type": "BUY",
+        "question": market["question"][:80],
+        "price": prep["price"],
+        "size": prep["size"],
+        "cost": prep["cost"],
+        "time": datetime.now(timezone.utc).isoformat(),
+    })
+    return position
 
-        if not filled or not order_id:
-            signed2 = client.create_order(buy_args, options=opts)
-            result = client.post_order(signed2, OrderType.GTC)
-            order_id = result.get("orderID", "")
-            filled = result.get("status") in ("MATCHED", "FILLED")
 
-        if not order_id:
-            if result.get("errorMsg"):
-                log.warning("Buy rejected: %s", result["errorMsg"])
-            return None
+FAK_KILLED_HINTS = ("no orders found to match", "killed", "couldn't be fully filled")
 
-        status = "held" if filled else "pending"
-        log.info("Buy %s. ID: %s", "filled" if filled else "pending", order_id)
-
-        position = {
-            "buy_order_id": order_id,
-            "sell_order_id": None,
-            "market_id": market["market_id"],
-            "question": market["question"],
-            "token_id": token_id,
-            "condition_id": market["condition_id"],
-            "buy_price": price,
-            "sell_target": SELL_TARGET,
-            "size": size,
-            "cost": cost,
-            "tick_size": tick,
-            "neg_risk": neg_risk,
-            "status": status,
-            "placed_at": datetime.now(timezone.utc).isoformat(),
-        }
 
-        bot_state["total_buys"] += 1
-        bot_state["total_spent"] += cost
-        add_trade({
-            "type": "BUY",
-            "question": market["question"][:80],
-            "price": price,
-            "size": size,
-            "cost": cost,
-            "time": datetime.now(timezone.utc).isoformat(),
-        })
+def _post_filled(result: dict) -> bool:
+    return str(result.get("status", "")).upper() in ("MATCHED", "FILLED")
 
-        if filled:
-            place_sell(client, position)
 
-        return position
+def _fak_killed(result: dict) -> bool:
+    """True only when the exchange says a FAK found nothing to match (safe to rest it as GTC)."""
+    if result.get("_lost") or _post_filled(result):
+        return False
+    if result.get("orderID"):
+        return str(result.get("status", "")).upper() == "UNMATCHED"
+    msg = str(result.get("errorMsg") or "").lower()
+    return any(h in msg for h in FAK_KILLED_HINTS)
+
+
+def place_buys(client: ClobClient, markets: list, want: int) -> list:
+    """Buy up to `want` of `markets` (best first), a batch per round.
+
+    Each round posts every prepared buy as FAK in one request, then posts
+    the ones the exchange killed for lack of a match as GTC in a second.
+    The GTC copies are signed afresh (new salt, so a new order hash), and
+    only for the FAKs that came back killed — most FAKs fill.
+    A FAK whose outcome is unknown (lost in transit) is not reposted — it
+    may have executed, and reconciliation adopts it if so. Rejected buys are
+    replaced from the remaining markets in the next round. Filled buys get
+    their sells placed (batched) before returning.
+    """
+    positions = []
+    queue = list(markets)
+    while queue and len(positions) < want:
+        balance = get_usdc_balance()
+        preps = []
+        while queue and len(preps) < want - len(positions):
+            prep = _prepare_buy(client, queue.pop(0), balance)
+            if prep:
+                preps.append(prep)
+                balance -= prep["cost"]
+            elif balance < BET_SIZE * 1.1:
+                queue = []
+        signed = _sign_all(preps, "Buy")
+        if not signed:
+            break
+
+        results = order_gateway.post(client, [(s, OrderType.FAK) for _, s in signed])
+        done, retry = [], []
+        for (prep, s), result in zip(signed, results):
+            order_id = result.get("orderID", "")
+            if _fak_killed(result):
+                retry.append(prep)
+            elif result.get("_lost"):
+                log.warning("Buy outcome unknown (%s) — not reposting: %s",
+                            result.get("errorMsg"), prep["market"]["question"][:40])
+            elif order_id:
+                done.append((prep, order_id, _post_filled(result)))
+            elif result.get("errorMsg"):
+                log.warning("Buy rejected: %s", result["errorMsg"])
+        retry = _sign_all(retry, "Buy")
+        if retry:
+            results = order_gateway.post(client, [(s, OrderType.GTC) for _, s in retry])
+            for (prep, _), result in zip(retry, results):
+                order_id = result.get("orderID", "")
+                if not order_id:
+                    if result.get("errorMsg"):
+                        log.warning("Buy rejected: %s", result["errorMsg"])
+                    continue
+                done.append((prep, order_id, _post_filled(result)))
+        for prep, _ in signed:
+            book_cache.invalidate(prep["market"]["token_id"])
 
-    except Exception as e:
-        log.error("Buy failed: %s", e)
-        return None
+        for prep, order_id, filled in done:
+            pos = _bought(prep, order_id, filled)
+            if PRESIGN_SELLS:
+                signing_service.presign_sell(pos)
+            positions.append(pos)
 
+    place_sells(client, [p for p in positions if p["status"] == "held"])
+    return positions
 
-def place_sell(client: ClobClient, position: dict) -> bool:
-    """Place a SELL limit order — uses dynamic pricing based on order book."""
+
+def _prepare_sell(client: ClobClient, position: dict) -> dict | None:
+    """Price and size a SELL limit order — uses dynamic pricing based on order book."""
     token_id = position["token_id"]
     tick = float(position.get("tick_size", 0.01))
 
@@ -884,21 +2938,22 @@ def place_sell(client: ClobClient, position: dict) -> bool:
     size = min(position["size"], real_bal) if real_bal else position["size"]
     size = round(size, 2)
     if size < 1:
-        return False
+        return None
     neg_risk = position.get("neg_risk", False)
     buy_price = position.get("buy_price", 0)
 
     sell_price = position.get("sell_target") or SELL_TARGET
 
-    try:
-        book = client.get_order_book(token_id)
-        bids = getattr(book, "bids", [])
-        best_bid = float(bids[-1].price) if bids else 0
+    book = fetch_book(client, token_id)
+    if book is not None:
+        try:
+            bids = getattr(book, "bids", [])
+            best_bid = float(bids[-1].price) if bids else 0
 
-        if best_bid > sell_price:
-            sell_price = min(best_bid + tick, 0.99)
-    except Exception:
-        pass
+            if best_bid > sell_price:
+                sell_price = min(best_bid + tick, 0.99)
+        except Exception:
+            pass
 
     sell_price = round(sell_price, 4)
     position["sell_target"] = sell_price
@@ -909,21 +2964,34 @@ def place_sell(client: ClobClient, position: dict) -> bool:
         size, sell_price, buy_price,
         ((sell_price - buy_price) / buy_price * 100) if buy_price > 0 else 0,
     )
+    return {
+        "position": position,
+        "price": sell_price,
+        "size": size,
+        "args": OrderArgs(token_id=token_id, price=sell_price, size=size, side=SELL),
+        "opts": CreateOrderOptions(tick_size=str(tick), neg_risk=neg_risk),
+        "presigned": signing_service.take_presigned(token_id, sell_price, size),
+    }
 
-    try:
-        sell_args = OrderArgs(
-            token_id=token_id,
-            price=sell_price,
-            size=size,
-            side=SELL,
-        )
-        opts = CreateOrderOptions(tick_size=str(tick), neg_risk=neg_risk)
-        signed = client.create_order(sell_args, options=opts)
-        result = client.post_order(signed, OrderType.GTC)
 
+def place_sells(client: ClobClient, positions: list) -> int:
+    """Place GTC sells for many positions in one batch; returns how many went live."""
+    preps = [p for p in (_prepare_sell(client, pos) for pos in positions) if p]
+    signed = _sign_all(preps, "Sell")
+    if not signed:
+        return 0
+    results = order_gateway.post(client, [(s, OrderType.GTC) for _, s in signed])
+    live = 0
+    for (prep, _), result in zip(signed, results):
+        position = prep["position"]
+        book_cache.invalidate(position["token_id"])
+
+        if result.get("_lost"):
+            log.warning("Sell outcome unknown (%s): %s", result.get("errorMsg"), position["question"][:40])
+            continue
         if not result.get("success", True) and result.get("errorMsg"):
             log.warning("Sell rejected: %s", result["errorMsg"])
-            return False
+            continue
 
         sell_id = result.get("orderID", "?")
         position["sell_order_id"] = sell_id
@@ -934,201 +3002,1012 @@ def place_sell(client: ClobClient, position: dict) -> bool:
         add_trade({
             "type": "SELL",
             "question": position["question"][:80],
-            "price": sell_price,
-            "size": size,
+            "price": prep["price"],
+            "size": prep["size"],
             "time": datetime.now(timezone.utc).isoformat(),
         })
+        live += 1
+    return live
 
-        return True
 
-    except Exception as e:
-        log.error("Sell failed: %s", e)
-        return False
+def place_sell(client: ClobClient, position: dict) -> bool:
+    """Place a SELL limit order for one position."""
+    return place_sells(client, [position]) == 1
 
 
-def get_price_info(token_id: str) -> dict:
-    """Fetch last trade price and best bid/ask for a token."""
+def price_info_from_book(book) -> dict:
+    """Extract last trade price and best bid/ask from an order book (None-safe)."""
     info = {"last_trade": None, "best_bid": None, "best_ask": None}
     try:
-        if clob_client:
-            book = clob_client.get_order_book(token_id)
-            if book:
-                ltp = getattr(book, "last_trade_price", None)
-                if ltp and float(ltp) > 0:
-                    info["last_trade"] = round(float(ltp), 4)
-
-                bids = getattr(book, "bids", [])
-                asks = getattr(book, "asks", [])
-                if bids:
-                    info["best_bid"] = round(float(bids[-1].price), 4)
-                if asks:
-                    info["best_ask"] = round(float(asks[-1].price), 4)
+        if book:
+            ltp = getattr(book, "last_trade_price", None)
+            if ltp and float(ltp) > 0:
+                info["last_trade"] = round(float(ltp), 4)
+
+            bids = getattr(book, "bids", [])
+            asks = getattr(book, "asks", [])
+            if bids:
+                info["best_bid"] = round(float(bids[-1].price), 4)
+            if asks:
+                info["best_ask"] = round(float(asks[-1].price), 4)
     except Exception:
         pass
     return info
 
 
-def get_current_price(token_id: str) -> float | None:
-    """Shortcut: return last trade price."""
-    return get_price_info(token_id).get("last_trade")
+def get_price_info(token_id: str) -> dict:
+    """Fetch last trade price and best bid/ask for a token."""
+    book = fetch_book(clob_client, token_id) if clob_client else None
+    return price_info_from_book(book)
+
+
+def get_current_price(token_id: str) -> float | None:
+    """Shortcut: return last trade price."""
+    return get_price_info(token_id).get("last_trade")
+
+
+def cancel_order(client: ClobClient, order_id: str) -> bool:
+    """Cancel an open order."""
+    return order_gateway.cancel(client, [order_id]).get(order_id, False)
+
+
+def cancel_orders(client: ClobClient, order_ids) -> dict:
+    """Cancel many open orders in as few requests as possible; {order_id: cancelled}."""
+    return order_gateway.cancel(client, order_ids)
+
+
+def _order_status(order: dict) -> str:
+    status = order.get("status", "")
+    if status in ("MATCHED", "FILLED"):
+        return "FILLED"
+    if status in ("INVALID", "CANCELLED"):
+        return "INVALID"
+    return status
+
+
+def check_order_status(client: ClobClient, order_id: str) -> str:
+    """Check order status. Returns: FILLED, INVALID, LIVE, or UNKNOWN."""
+    try:
+        order = client.get_order(order_id)
+        if order:
+            return _order_status(order)
+    except Exception:
+        pass
+    return "UNKNOWN"
+
+
+class OrderIndex:
+    """Open orders from one get_orders() snapshot (py-clob-client pages through all of them).
+
+    status() answers from the snapshot; only ids missing from it — filled,
+    cancelled, or placed after the snapshot — are asked of the user stream
+    and then get_order(), and the answer is kept for the rest of the tick.
+    The stream never overrides an order the snapshot still lists. If the
+    snapshot call fails, every lookup falls back. discard() drops ids we
+    cancel ourselves so the orphan sweep doesn't cancel them twice.
+    """
+
+    def __init__(self, client: ClobClient):
+        self.client = client
+        self.orders = None    # order_id -> order dict, None when the snapshot failed
+        self._looked_up = {}  # order_id -> status from get_order()
+        self.hits = 0
+        self.lookups = 0
+
+    def refresh(self) -> bool:
+        self._looked_up = {}
+        try:
+            self.orders = {o.get("id"): o for o in self.client.get_orders() if o.get("id")}
+            return True
+        except Exception as e:
+            log.debug("Order snapshot failed: %s", e)
+            self.orders = None
+            return False
+
+    def status(self, order_id: str) -> str:
+        if self.orders is not None and order_id in self.orders:
+            self.hits += 1
+            return _order_status(self.orders[order_id])
+        streamed = user_stream.status(order_id) if user_stream_on else None
+        if streamed in ("FILLED", "INVALID"):
+            self.hits += 1
+            return streamed
+        if order_id not in self._looked_up:
+            self.lookups += 1
+            self._looked_up[order_id] = check_order_status(self.client, order_id)
+        return self._looked_up[order_id]
+
+    def filled(self, order_id: str) -> bool:
+        return self.status(order_id) == "FILLED"
+
+    def discard(self, order_id: str):
+        if self.orders is not None:
+            self.orders.pop(order_id, None)
+
+    def live(self) -> list:
+        if self.orders is None:
+            return []
+        return [o for o in self.orders.values() if o.get("status") == "LIVE"]
+
+    def take_metrics(self) -> tuple:
+        m = (len(self.orders) if self.orders is not None else None, self.hits, self.lookups)
+        self.hits = self.lookups = 0
+        return m
+
+
+class UserStream:
+    """Our own order and trade events from the CLOB user WebSocket channel.
+
+    `order` events (PLACEMENT / UPDATE / CANCELLATION) carry original_size
+    and the cumulative size_matched, which is the only fill count used;
+    `trade` events describe the same matches again and are only counted.
+    An order counts as FILLED once size_matched reaches its original size,
+    and INVALID once cancelled. Newly filled ids are queued
+    for take_filled() and `wake` is set, so the main loop can act between
+    ticks. status() returns None for orders the stream knows nothing about —
+    callers then fall back to REST.
+    """
+
+    PING_SECONDS = 10
+    MAX_BACKOFF = 60
+    MAX_ORDERS = 5000  # tracked order ids before the oldest half is dropped
+
+    def __init__(self, url: str):
+        self.url = url
+        self.wake = threading.Event()
+        self._creds = None
+        self._orders = {}      # order_id -> {"size", "matched", "status"}
+        self._filled = deque()  # (order_id, monotonic time of the event)
+        self._lock = threading.Lock()
+        self._ws = None
+        self._connected = False
+        self.events = 0
+        self.fills = 0
+        self.reconnects = 0
+        self.last_latency_ms = None
+
+    # ── lifecycle ──
+
+    def start(self, creds) -> bool:
+        try:
+            import websocket
+        except ImportError as e:
+            log.warning("User stream: import error — %s, using REST fill checks", e)
+            return False
+        if creds is None:
+            log.warning("User stream: no API credentials, using REST fill checks")
+            return False
+        self._creds = creds
+        threading.Thread(target=self._run, args=(websocket,), daemon=True, name="user-ws").start()
+        threading.Thread(target=self._heartbeat, daemon=True, name="user-ws-ping").start()
+        log.info("User stream: ENABLED (%s)", self.url)
+        return True
+
+    def _run(self, websocket):
+        backoff = 1
+        while True:
+            started = time.time()
+            ws = websocket.WebSocketApp(
+                self.url,
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=lambda _ws, e: log.debug("User stream error: %s", e),
+            )
+            self._ws = ws
+            try:
+                ws.run_forever()
+            except Exception as e:
+                log.debug("User stream run_forever: %s", e)
+            self._connected = False
+            if time.time() - started > self.MAX_BACKOFF:
+                backoff = 1
+            self.reconnects += 1
+            log.warning("User stream disconnected — reconnecting in %ds", backoff)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.MAX_BACKOFF)
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(self.PING_SECONDS)
+            ws = self._ws
+            if ws and self._connected:
+                try:
+                    ws.send("PING")
+                except Exception as e:
+                    log.debug("User stream ping failed: %s", e)
+
+    def _on_open(self, ws):
+        creds = self._creds
+        try:
+            ws.send(json.dumps({
+                "auth": {"apiKey": creds.api_key, "secret": creds.api_secret,
+                         "passphrase": creds.api_passphrase},
+                "markets": [],
+                "type": "user",
+            }))
+        except Exception as e:
+            log.warning("User stream subscribe failed: %s", e)
+            return
+        self._connected = True
+        log.info("User stream connected")
+
+    def _on_message(self, ws, message: str):
+        if not message or message == "PONG":
+            return
+        try:
+            data = json.loads(message)
+        except (json.JSONDecodeError, TypeError):
+            return
+        for ev in data if isinstance(data, list) else [data]:
+            try:
+                self.apply(ev)
+            except Exception as e:
+                log.debug("User stream bad event: %s", e)
+
+    # ── event handling ──
+
+    def _order(self, order_id: str) -> dict:
+        o = self._orders.get(order_id)
+        if o is None:
+            if len(self._orders) >= self.MAX_ORDERS:
+                for oid in list(self._orders)[:self.MAX_ORDERS // 2]:
+                    del self._orders[oid]
+            o = self._orders[order_id] = {"size": None, "matched": 0.0, "status": "LIVE"}
+        return o
+
+    def _check_filled(self, order_id: str, o: dict, now: float):
+        if o["status"] == "LIVE" and o["size"] and o["matched"] >= o["size"] - 1e-9:
+            o["status"] = "FILLED"
+            self._filled.append((order_id, now))
+            self.fills += 1
+            self.wake.set()
+
+    def apply(self, ev: dict):
+        """Apply one user-channel event to the order table."""
+        etype = ev.get("event_type")
+        now = time.monotonic()
+        if etype == "order":
+            oid = ev.get("id")
+            if not oid:
+                return
+            with self._lock:
+                self.events += 1
+                o = self._order(oid)
+                if ev.get("original_size") is not None:
+                    o["size"] = float(ev["original_size"])
+                if ev.get("size_matched") is not None:
+                    o["matched"] = max(o["matched"], float(ev["size_matched"]))
+                if str(ev.get("type", "")).upper() == "CANCELLATION":
+                    if o["status"] == "LIVE":
+                        o["status"] = "INVALID"
+                    return
+                self._check_filled(oid, o, now)
+        elif etype == "trade":
+            # The order's own UPDATE carries the cumulative size_matched; adding
+            # matched_amount here as well would count the match twice.
+            with self._lock:
+                self.events += 1
+
+    # ── readers ──
+
+    def status(self, order_id: str):
+        """FILLED / INVALID / LIVE from the stream, or None if the order is unknown to it."""
+        with self._lock:
+            o = self._orders.get(order_id)
+            return o["status"] if o else None
+
+    def take_filled(self) -> list:
+        """Drain [(order_id, event_time)] for orders that filled since the last call."""
+        with self._lock:
+            out = list(self._filled)
+            self._filled.clear()
+        return out
+
+    def wait(self, timeout: float) -> bool:
+        """Sleep up to `timeout` seconds; True if woken early by a fill."""
+        if timeout <= 0:
+            return False
+        fired = self.wake.wait(timeout)
+        self.wake.clear()
+        return fired
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "connected": self._connected,
+                "orders": len(self._orders),
+                "events": self.events,
+                "fills": self.fills,
+                "reconnects": self.reconnects,
+                "last_fill_latency_ms": self.last_latency_ms,
+            }
+
+
+user_stream = UserStream(USER_WS_URL)
+user_stream_on = False  # set in run() once the stream has started
+
+
+def _record_sell_fill(pos: dict):
+    actual_sell = pos.get("sell_target", pos.get("buy_price", 0) * (1 + PROFIT_PCT))
+    log.info("Sell filled: %s @ $%.3f", pos["question"][:50], actual_sell)
+    pos["status"] = "done"
+    close_position(pos, "sold", actual_sell)
+    add_trade({
+        "type": "SELL",
+        "question": pos["question"][:80],
+        "price": actual_sell,
+        "size": pos["size"],
+        "time": datetime.now(timezone.utc).isoformat(),
+    })
+
+
+def handle_stream_fills(client: ClobClient, positions: list) -> int:
+    """Advance positions whose orders the user stream reported filled.
+
+    pending → held (and the sell is placed right away) on a buy fill,
+    held → done on a sell fill. Returns the number of positions moved.
+    """
+    moved = 0
+    for order_id, seen_at in user_stream.take_filled():
+        for pos in positions:
+            if pos["status"] == "pending" and pos.get("buy_order_id") == order_id:
+                log.info("Buy filled (stream): %s", pos["question"][:50])
+                pos["status"] = "held"
+                place_sell(client, pos)
+            elif pos["status"] == "held" and pos.get("sell_order_id") == order_id:
+                _record_sell_fill(pos)
+            else:
+                continue
+            user_stream.last_latency_ms = round((time.monotonic() - seen_at) * 1000, 1)
+            moved += 1
+            break
+    return moved
+
+
+# ── Claim / Settlement ────────────────────────────────────────────────────────
+
+RESOLUTION_BATCH_SIZE = int(os.getenv("RESOLUTION_BATCH_SIZE", "50"))
+RESOLUTION_PRE_END_RECHECK = int(os.getenv("RESOLUTION_PRE_END_RECHECK", "1800"))
+
+
+class ResolutionTracker:
+    """Batched, end-date-aware market resolution checks against Gamma.
+
+    Markets are looked up many ids per request (/markets?id=..&id=..). A
+    market whose endDate is still in the future is only rechecked every
+    pre_end_recheck seconds (early resolutions still get picked up); once
+    the end date passes it is checked on every call until it resolves.
+    Resolved markets are cached in the state store and never asked about
+    again.
+    """
+
+    def __init__(self, store: StateStore, batch_size: int, pre_end_recheck: float):
+        self.store = store
+        self.batch_size = max(1, batch_size)
+        self.pre_end_recheck = pre_end_recheck
+        self._lock = threading.Lock()
+        self._state = store.load_market_resolution()
+        self.requests = 0
+        self.skipped = 0
+
+    def _due(self, market_id: str, now: float) -> bool:
+        st = self._state.get(market_id)
+        if st is None:
+            return True
+        if st["resolved"]:
+            return False
+        if st["end_ts"] is None or st["end_ts"] <= now:
+            return True
+        return now - st["checked_at"] >= self.pre_end_recheck
+
+    def resolved_markets(self, positions: list) -> set:
+        """Return the market ids among `positions` that are closed or resolved."""
+        now = time.time()
+        ids = []
+        with self._lock:
+            for p in positions:
+                mid = str(p.get("market_id") or "")
+                if not mid or mid in ids:
+                    continue
+                ids.append(mid)
+                st = self._state.get(mid)
+                end_ts = _iso_to_ts(p.get("end_date"))
+                if st is None and end_ts is not None:
+                    # End date known from the scan: no need to ask Gamma before it passes
+                    self._state[mid] = {"end_ts": end_ts, "resolved": False, "checked_at": now}
+            due = [mid for mid in ids if self._due(mid, now)]
+            self.skipped += len(ids) - len(due)
+
+        changed = {}
+        for i in range(0, len(due), self.batch_size):
+            batch = due[i:i + self.batch_size]
+            try:
+                resp = http_pool.get(
+                    f"{GAMMA_API}/markets",
+                    params=[("id", mid) for mid in batch] + [("limit", len(batch))],
+                    timeout=10,
+                )
+                self.requests += 1
+                if resp.status_code != 200:
+                    continue
+                markets = resp.json()
+            except Exception as e:
+                log.debug("Resolution check failed (%d markets): %s", len(batch), e)
+                continue
+            for m in markets if isinstance(markets, list) else []:
+                mid = str(m.get("id", ""))
+                if mid in batch:
+                    changed[mid] = {
+                        "end_ts": _iso_to_ts(m.get("endDate")),
+                        "resolved": bool(m.get("closed") or m.get("resolved")),
+                        "checked_at": now,
+                    }
+            for mid in batch:
+                # Not returned: keep what we know, back off like any other check
+                if mid not in changed:
+                    prev = self._state.get(mid) or {"end_ts": None, "resolved": False}
+                    changed[mid] = dict(prev, checked_at=now)
+
+        with self._lock:
+            self._state.update(changed)
+            out = {mid for mid in ids if self._state.get(mid, {}).get("resolved")}
+        if changed:
+            self.store.save_market_resolution(changed)
+        return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            resolved = sum(1 for st in self._state.values() if st["resolved"])
+            return {"tracked": len(self._state), "resolved": resolved,
+                    "requests": self.requests, "skipped": self.skipped}
+
+
+_resolution_tracker = None
+
+
+def resolution_tracker() -> ResolutionTracker:
+    global _resolution_tracker
+    if _resolution_tracker is None:
+        _resolution_tracker = ResolutionTracker(state_store(), RESOLUTION_BATCH_SIZE, RESOLUTION_PRE_END_RECHECK)
+    return _resolution_tracker
+
+
+def check_market_resolved(position: dict) -> bool:
+    mid = str(position.get("market_id") or "")
+    return bool(mid) and mid in resolution_tracker().resolved_markets([position])
+
+
+TX_RECEIPT_POLL_SECONDS = 3
+TX_STUCK_SECONDS = int(os.getenv("TX_STUCK_SECONDS", "60"))   # unmined this long → replace with higher fees
+TX_MAX_BUMPS = 3
+TX_FEE_BUMP = 1.15          # replacements must beat the old fee by >10%
+TX_GIVE_UP_SECONDS = 900
+TX_SHUTDOWN_WAIT = 8        # seconds to let pending receipts land on shutdown (docker stop allows 10)
+
+
+class NonceManager:
+    """Hands out wallet nonces locally so several transactions can be in flight.
+
+    Seeded from the chain's pending count (which also resyncs after a
+    restart, picking up anything we left in the mempool). A nonce that was
+    taken but never broadcast is handed back with release() and reused
+    before a new one. sync() only moves forward, so it never hands out a
+    nonce another thread has taken but not yet sent.
+    """
+
+    def __init__(self, w3: Web3, address: str):
+        self.w3 = w3
+        self.address = address
+        self._lock = threading.Lock()
+        self._next = None
+        self._free = set()  # released nonces below _next
+
+    def sync(self) -> int:
+        """Catch up with the chain's pending count (e.g. after "nonce too low")."""
+        with self._lock:
+            chain = self.w3.eth.get_transaction_count(self.address, "pending")
+            self._next = max(self._next or 0, chain)
+            self._free = {n for n in self._free if n >= chain}
+            return self._next
+
+    def take(self) -> int:
+        with self._lock:
+            if self._next is None:
+                self._next = self.w3.eth.get_transaction_count(self.address, "pending")
+            if self._free:
+                n = min(self._free)
+                self._free.discard(n)
+                return n
+            n = self._next
+            self._next += 1
+            return n
+
+    def release(self, nonce: int):
+        """Return a nonce that was never broadcast, so the next take() fills the gap."""
+        with self._lock:
+            if self._next is not None and nonce < self._next:
+                self._free.add(nonce)
+
+
+class ReceiptTracker:
+    """Sends direct transactions without blocking on their receipts.
+
+    submit() takes a nonce from the NonceManager, signs and broadcasts, and
+    returns the hash right away. The nonce goes back to the manager only if
+    the transaction never left: signing failed or the node replied with an
+    error. A send that timed out or lost its connection may already be in
+    the mempool, so it keeps its nonce and is tracked like a sent one — a
+    fee bump at that nonce lands it or fills the gap if it never arrived.
+    A background thread polls receipts every
+    TX_RECEIPT_POLL_SECONDS and calls each transaction's on_done(receipt,
+    tx_hash). A transaction still unmined after TX_STUCK_SECONDS is
+    re-signed at the same nonce with fees raised by TX_FEE_BUMP (up to
+    TX_MAX_BUMPS times); whichever version lands is reported.
+    """
+
+    NONCE_ERRORS = ("nonce", "already known", "underpriced")
+
+    def __init__(self, w3: Web3, account, nonces: NonceManager):
+        self.w3 = w3
+        self.account = account
+        self.nonces = nonces
+        self._lock = threading.Lock()
+        self._pending = []   # {"nonce", "build", "fees", "hashes", "sent_at", "first_sent", "bumps", "label", "on_done"}
+        self._thread = None
+        self.confirmed = 0
+        self.failed = 0
+        self.replaced = 0
+        self.dropped = 0
+
+    def _fees(self, eip1559: bool, prev: dict | None = None) -> dict:
+        gas_price = self.w3.eth.gas_price
+        if eip1559:
+            fees = {"maxFeePerGas": int(gas_price * 1.5), "maxPriorityFeePerGas": self.w3.to_wei(30, "gwei")}
+        else:
+            fees = {"gasPrice": gas_price}
+        if prev:
+            fees = {k: max(v, int(prev[k] * TX_FEE_BUMP) + 1) for k, v in fees.items()}
+        return fees
+
+    def _send(self, build, nonce: int, fees: dict) -> str:
+        signed = self.account.sign_transaction(build(nonce, fees))
+        return self.w3.eth.send_raw_transaction(signed.raw_transaction).hex()
+
+    def submit(self, build, eip1559: bool, label: str, on_done) -> str:
+        """build(nonce, fee_fields) -> tx dict. Returns the tx hash once broadcast (or possibly broadcast)."""
+        fees = self._fees(eip1559)
+        for attempt in range(2):
+            nonce = self.nonces.take()
+            try:
+                signed = self.account.sign_transaction(build(nonce, fees))
+            except Exception:
+                self.nonces.release(nonce)       # never left this process
+                raise
+            tx_hash = signed.hash.hex()
+            try:
+                self.w3.eth.send_raw_transaction(signed.raw_transaction)
+                break
+            except Exception as e:
+                if any(h in str(e).lower() for h in self.NONCE_ERRORS):
+                    self.nonces.sync()           # the chain already has this nonce; move past it
+                    if attempt:
+                        raise
+                    continue
+                if isinstance(e, (Web3RPCError, ValueError)):
+                    self.nonces.release(nonce)   # the node refused it; reuse the nonce
+                    raise
+                # Timeout or dropped connection: it may be in the mempool, so the nonce stays taken
+                log.warning("TX %s: send outcome unknown (%s) — tracking nonce %d", label, e, nonce)
+                self.nonces.sync()
+                break
+        now = time.time()
+        with self._lock:
+            self._pending.append({"nonce": nonce, "build": build, "fees": fees, "eip1559": eip1559,
+                                  "hashes": [tx_hash], "sent_at": now, "first_sent": now, "bumps": 0,
+                                  "label": label, "on_done": on_done})
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._poll, daemon=True, name="tx-receipts")
+                self._thread.start()
+        log.info("TX sent: %s nonce=%d tx=%s", label, nonce, tx_hash)
+        return tx_hash
+
+    def _poll(self):
+        while True:
+            time.sleep(TX_RECEIPT_POLL_SECONDS)
+            with self._lock:
+                pending = list(self._pending)
+            for item in pending:
+                try:
+                    self._check(item)
+                except Exception as e:
+                    log.debug("Receipt check %s: %s", item["label"], e)
+
+    def _receipt(self, item: dict):
+        for h in reversed(item["hashes"]):
+            try:
+                receipt = self.w3.eth.get_transaction_receipt(h)
+            except Exception:
+                receipt = None  # not mined (web3 raises TransactionNotFound)
+            if receipt is not None:
+                return receipt, h
+        return None, None
+
+    def _finish(self, item: dict, receipt, tx_hash):
+        """Hand the outcome to on_done; receipt is None if the transaction was dropped."""
+        with self._lock:
+            self._pending = [p for p in self._pending if p is not item]
+        try:
+            item["on_done"](receipt, tx_hash)
+        except Exception as e:
+            log.error("TX callback failed for %s: %s", item["label"], e)
+
+    def _check(self, item: dict):
+        receipt, tx_hash = self._receipt(item)
+        now = time.time()
+        if receipt is not None:
+            if receipt.status == 1:
+                self.confirmed += 1
+            else:
+                self.failed += 1
+            self._finish(item, receipt, tx_hash)
+            return
+        if now - item["first_sent"] > TX_GIVE_UP_SECONDS:
+            self.dropped += 1
+            log.warning("TX %s (nonce %d) not mined after %ds — giving up", item["label"], item["nonce"],
+                        TX_GIVE_UP_SECONDS)
+            self.nonces.release(item["nonce"])
+            self.nonces.sync()  # drops the released nonce again if the chain has used it after all
+            self._finish(item, None, item["hashes"][-1])
+            return
+        if now - item["sent_at"] > TX_STUCK_SECONDS and item["bumps"] < TX_MAX_BUMPS:
+            fees = self._fees(item["eip1559"], item["fees"])
+            try:
+                new_hash = self._send(item["build"], item["nonce"], fees)
+            except Exception as e:
+                # "nonce too low" here means one of our versions was just mined
+                log.debug("TX replace %s: %s", item["label"], e)
+                item["sent_at"] = now
+                return
+            item["fees"] = fees
+            item["hashes"].append(new_hash)
+            item["sent_at"] = now
+            item["bumps"] += 1
+            self.replaced += 1
+            log.info("TX replaced: %s nonce=%d bump=%d tx=%s", item["label"], item["nonce"],
+                     item["bumps"], new_hash)
+
+    def wait_idle(self, timeout: float) -> bool:
+        """Block until nothing is pending (used at shutdown); False on timeout."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._lock:
+                if not self._pending:
+                    return True
+            time.sleep(0.2)
+        return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = len(self._pending)
+        return {"pending": pending, "confirmed": self.confirmed, "failed": self.failed,
+                "replaced": self.replaced, "dropped": self.dropped}
 
 
-def cancel_order(client: ClobClient, order_id: str) -> bool:
-    """Cancel an open order."""
-    try:
-        result = client.cancel(order_id)
-        return bool(result)
-    except Exception as e:
-        log.error("Cancel failed for %s: %s", order_id, e)
-        return False
+def _submit_redeem(fn, gas: int, eip1559: bool, label: str, trade_type: str, question: str,
+                   on_result=None) -> str:
+    """Simulate a redeem call, then broadcast it through the receipt tracker.
 
+    Raises if the call would revert. The trade is recorded once the receipt
+    confirms it; on_result(ok) is then called with the outcome: True, False
+    if it reverted, None if it was dropped without a receipt.
+    """
+    fn.call({"from": tx_tracker.account.address})
 
-def check_order_status(client: ClobClient, order_id: str) -> str:
-    """Check order status. Returns: FILLED, INVALID, LIVE, or UNKNOWN."""
-    try:
-        order = client.get_order(order_id)
-        if order:
-            status = order.get("status", "")
-            if status in ("MATCHED", "FILLED"):
-                return "FILLED"
-            if status in ("INVALID", "CANCELLED"):
-                return "INVALID"
-            return status
-    except Exception:
-        pass
-    return "UNKNOWN"
+    def build(nonce, fees):
+        return fn.build_transaction({"from": tx_tracker.account.address, "nonce": nonce, "gas": gas, **fees})
 
+    def on_done(receipt, tx_hash):
+        if receipt is not None and receipt.status == 1:
+            log.info("%s confirmed: %s tx=%s", label, question[:50], tx_hash)
+            add_trade({
+                "type": trade_type,
+                "question": question[:80],
+                "tx": tx_hash,
+                "time": datetime.now(timezone.utc).isoformat(),
+            })
+        elif receipt is not None:
+            log.warning("%s reverted: %s tx=%s", label, question[:50], tx_hash)
+        else:
+            log.warning("%s dropped: %s tx=%s", label, question[:50], tx_hash)
+        if on_result:
+            on_result(None if receipt is None else receipt.status == 1)
 
-def check_order_filled(client: ClobClient, order_id: str) -> bool:
-    return check_order_status(client, order_id) == "FILLED"
+    return tx_tracker.submit(build, eip1559, f"{label} {question[:30]}", on_done)
 
 
-# ── Claim / Settlement ────────────────────────────────────────────────────────
+def _outcome_index(position: dict) -> int:
+    """The position's outcome slot in its market; looked up for positions saved before it was stored."""
+    idx = position.get("outcome_index")
+    if idx is None and position.get("token_id"):
+        meta, _ = token_meta_cache().get(str(position["token_id"]))
+        idx = meta["outcome_index"] if meta else None
+    return int(idx or 0)
 
-def check_market_resolved(position: dict) -> bool:
-    try:
-        resp = requests.get(
-            f"{GAMMA_API}/markets/{position['market_id']}",
-            timeout=5,
-        )
-        if resp.status_code == 200:
-            data = resp.json()
-            return data.get("closed", False) or data.get("resolved", False)
-    except Exception:
-        pass
-    return False
 
+def try_claim(w3: Web3, account, ctf, position: dict, balance: int | None = None, on_result=None) -> bool:
+    """Redeem a resolved position with a direct transaction (gasless redeems go through
+    redemption_batcher). `balance` is the prefetched token balance (neg-risk only).
 
-def try_claim(w3: Web3, account, ctf, position: dict) -> bool:
+    Returns True once the transaction is broadcast; on_result(ok) reports the receipt.
+    """
     condition_id = position.get("condition_id")
     if not condition_id:
         return False
 
-    is_neg_risk_pos = position.get("neg_risk", False)
-    # Try gasless relayer first
-    if relay_client and _relayer_redeem(ctf, condition_id, neg_risk=is_neg_risk_pos,
-                                         token_id=position.get("token_id"), outcome_index=0):
-        add_trade({
-            "type": "CLAIM",
-            "question": position["question"][:80],
-            "tx": "relayer",
-            "time": datetime.now(timezone.utc).isoformat(),
-        })
-        return True
-
     is_neg_risk = position.get("neg_risk", False)
     try:
         log.info("Claiming (direct): %s", position["question"][:60])
         if is_neg_risk and neg_risk_adapter:
             token_id = int(position.get("token_id", 0))
-            bal = ctf.functions.balanceOf(account.address, token_id).call()
-            outcome_idx = 0  # default; ideally track outcomeIndex
-            amounts = [bal, 0] if outcome_idx == 0 else [0, bal]
-            tx = neg_risk_adapter.functions.redeemPositions(
+            bal = balance if balance is not None else ctf.functions.balanceOf(account.address, token_id).call()
+            amounts = [bal, 0] if _outcome_index(position) == 0 else [0, bal]
+            fn = neg_risk_adapter.functions.redeemPositions(
                 bytes.fromhex(condition_id.replace("0x", "")),
                 amounts,
-            ).build_transaction({
-                "from": account.address,
-                "nonce": w3.eth.get_transaction_count(account.address),
-                "gas": 400_000,
-                "maxFeePerGas": int(w3.eth.gas_price * 1.5),
-                "maxPriorityFeePerGas": w3.to_wei(30, "gwei"),
-            })
+            )
+            _submit_redeem(fn, 400_000, True, "CLAIM", "CLAIM", position["question"], on_result)
         else:
-            tx = ctf.functions.redeemPositions(
+            fn = ctf.functions.redeemPositions(
                 Web3.to_checksum_address(USDC_ADDRESS),
                 b"\x00" * 32,
                 bytes.fromhex(condition_id.replace("0x", "")),
                 [1, 2],
-            ).build_transaction({
-                "from": account.address,
-                "nonce": w3.eth.get_transaction_count(account.address),
-                "gas": 200_000,
-                "gasPrice": w3.eth.gas_price,
-            })
-
-        signed = account.sign_transaction(tx)
-        tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
-        receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=60)
-
-        if receipt.status == 1:
-            log.info("Claim OK. TX: %s", tx_hash.hex())
-            add_trade({
-                "type": "CLAIM",
-                "question": position["question"][:80],
-                "tx": tx_hash.hex(),
-                "time": datetime.now(timezone.utc).isoformat(),
-            })
-            return True
+            )
+            _submit_redeem(fn, 200_000, False, "CLAIM", "CLAIM", position["question"], on_result)
+        # Simulated OK and broadcast; the receipt is confirmed in the background
+        return True
     except Exception as e:
         if "revert" not in str(e).lower():
             log.error("Claim error: %s", e)
     return False
 
 
+TOKEN_META_RESOLVE_TTL = int(os.getenv("TOKEN_META_RESOLVE_TTL", "600"))
+DISCOVERY_LOOKBACK_BLOCKS = 700_000  # first scan: ~14 days of blocks at ~2s/block
+DISCOVERY_CONFIRMATIONS = 64  # checkpoint this far below head so reorgs are not baked in
+DISCOVERY_CHUNK_BLOCKS = int(os.getenv("DISCOVERY_CHUNK_BLOCKS", "45000"))  # starting size; adapts
+DISCOVERY_MIN_CHUNK = 500
+DISCOVERY_MAX_CHUNK = 200_000
+LOG_FETCH_WORKERS = int(os.getenv("LOG_FETCH_WORKERS", "4"))
+TRANSFER_SINGLE_TOPIC = Web3.to_hex(Web3.keccak(text="TransferSingle(address,address,address,uint256,uint256)"))
+TRANSFER_BATCH_TOPIC = Web3.to_hex(Web3.keccak(text="TransferBatch(address,address,address,uint256[],uint256[])"))
+
+
+class LogRangeFetcher:
+    """Concurrent eth_getLogs over block ranges with adaptive range sizing.
+
+    Up to `workers` ranges are in flight at once. When the provider rejects a
+    range as too large or with too many results, the range is split in half
+    and requeued, and the chunk size for new ranges shrinks with it. After
+    GROW_AFTER successes in a row the chunk size grows again (up to max_chunk).
+    Rate-limited ranges are requeued after a jittered exponential backoff,
+    without splitting. Other errors get one retry before the range is
+    reported as failed. The chunk size persists across runs, so later sweeps
+    start at a size the provider accepts.
+    """
+
+    # Provider wording for "range too large / too many results" (Infura, Alchemy, Ankr, bor/erigon, ...)
+    SPLIT_HINTS = ("returned more than", "too many results", "too many logs", "block range",
+                   "range too large", "range is too wide", "response size", "query exceeds max")
+    RATE_LIMIT_HINTS = ("429", "rate limit", "too many requests", "request rate", "exceeded the rate",
+                        "capacity limit", "throttl")
+    GROW_AFTER = 3
+    MAX_ATTEMPTS = 2
+    RATE_LIMIT_ATTEMPTS = 6
+
+    def __init__(self, workers: int, chunk: int, min_chunk: int, max_chunk: int):
+        self.workers = max(1, workers)
+        self.chunk = chunk
+        self.min_chunk = max(1, min_chunk)
+        self.max_chunk = max(chunk, max_chunk)
+        self._streak = 0
+
+    def _is_rate_limited(self, err: Exception) -> bool:
+        msg = str(err).lower()
+        return any(h in msg for h in self.RATE_LIMIT_HINTS)
+
+    def _should_split(self, err: Exception) -> bool:
+        msg = str(err).lower()
+        return any(h in msg for h in self.SPLIT_HINTS)
+
+    @staticmethod
+    def _after(delay: float, fetch, a: int, b: int):
+        if delay:
+            time.sleep(delay)
+        return fetch(a, b)
+
+    def run(self, fetch, start: int, end: int, extra_ranges=()) -> tuple:
+        """Call fetch(a, b) over `extra_ranges` and then [start, end].
+
+        Returns ([((a, b), result)], [failed (a, b)], stats dict).
+        """
+        queue = deque((a, b, 0, 0.0) for a, b in extra_ranges)
+        cursor = start
+        results, failed = [], []
+        splits = 0
+        throttled = 0
+        blocks = 0
+        t0 = time.time()
+
+        def next_range():
+            nonlocal cursor
+            if queue:
+                return queue.popleft()
+            if cursor > end:
+                return None
+            b = min(cursor + self.chunk - 1, end)
+            rng = (cursor, b, 0, 0.0)
+            cursor = b + 1
+            return rng
+
+        pending = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="getlogs") as pool:
+            def fill():
+                while len(pending) < self.workers:
+                    rng = next_range()
+                    if rng is None:
+                        return
+                    pending[pool.submit(self._after, rng[3], fetch, rng[0], rng[1])] = rng
+
+            fill()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    a, b, attempts, _ = pending.pop(fut)
+                    try:
+                        results.append(((a, b), fut.result()))
+                        blocks += b - a + 1
+                        self._streak += 1
+                        if self._streak >= self.GROW_AFTER and self.chunk < self.max_chunk:
+                            self.chunk = min(self.max_chunk, self.chunk * 3 // 2)
+                            self._streak = 0
+                    except Exception as e:
+                        size = b - a + 1
+                        if self._is_rate_limited(e) and attempts + 1 < self.RATE_LIMIT_ATTEMPTS:
+                            delay = random.uniform(0.5, 1) * min(HTTP_MAX_BACKOFF, HTTP_BACKOFF * 2 ** (attempts + 1))
+                            queue.append((a, b, attempts + 1, delay))
+                            throttled += 1
+                            continue
+                        self._streak = 0
+                        if self._should_split(e) and size > self.min_chunk:
+                            mid = a + size // 2
+                            queue.appendleft((mid, b, 0, 0.0))
+                            queue.appendleft((a, mid - 1, 0, 0.0))
+                            self.chunk = max(self.min_chunk, min(self.chunk, size // 2))
+                            splits += 1
+                        elif attempts + 1 < self.MAX_ATTEMPTS:
+                            queue.append((a, b, attempts + 1, 0.0))
+                        else:
+                            log.debug("getLogs %d-%d failed: %s", a, b, e)
+                            failed.append((a, b))
+                fill()
+
+        elapsed = max(time.time() - t0, 1e-6)
+        stats = {"blocks": blocks, "seconds": round(elapsed, 2), "blocks_per_sec": round(blocks / elapsed),
+                 "ranges": len(results), "splits": splits, "throttled": throttled, "failed": len(failed),
+                 "chunk": self.chunk}
+        return results, failed, stats
+
+
+class TokenDiscovery:
+    """Persistent index of CTF token IDs and balances for our wallet.
+
+    Scans stop DISCOVERY_CONFIRMATIONS blocks below head; that block is the
+    checkpoint. The first run scans DISCOVERY_LOOKBACK_BLOCKS and seeds each
+    token it finds with balanceOf at the checkpoint. After that, only blocks
+    past the checkpoint are scanned. Their TransferSingle and TransferBatch
+    logs are applied as balance deltas to tokens already in the index.
+
+    A token seen for the first time is seeded with balanceOf instead. So is
+    any token in a retried failed range. This covers tokens whose inbound
+    transfer predates the lookback. Deltas are never applied on top of a
+    balance that may already include them. IDs whose balanceOf read fails
+    are persisted and seeded on the next run. Failed ranges are recorded and
+    retried on the next run.
+    """
+
+    def __init__(self, store: StateStore):
+        self.store = store
+        self.balances = store.load_chain_tokens()
+        last = store.get_meta("discovery_last_block")
+        self.last_block = int(last) if last else None
+        self.fetcher = LogRangeFetcher(LOG_FETCH_WORKERS, DISCOVERY_CHUNK_BLOCKS,
+                                       DISCOVERY_MIN_CHUNK, DISCOVERY_MAX_CHUNK)
+
+    @staticmethod
+    def _addr_topic(address: str) -> str:
+        return "0x" + "0" * 24 + address.lower().replace("0x", "")
+
+    def _fetch_range(self, w3: Web3, ctf, me: str, start: int, end: int) -> list:
+        """Return [(token_id, signed_delta)] for our transfers in [start, end]."""
+        me_topic = self._addr_topic(me)
+        topic0 = [TRANSFER_SINGLE_TOPIC, TRANSFER_BATCH_TOPIC]
+        deltas = []
+        for sign, topics in ((1, [topic0, None, None, me_topic]), (-1, [topic0, None, me_topic])):
+            logs = w3.eth.get_logs({
+                "address": ctf.address, "fromBlock": start, "toBlock": end, "topics": topics,
+            })
+            for raw in logs:
+                if Web3.to_hex(raw["topics"][0]) == TRANSFER_SINGLE_TOPIC:
+                    args = ctf.events.TransferSingle().process_log(raw)["args"]
+                    deltas.append((int(args["id"]), sign * int(args["value"])))
+                else:
+                    args = ctf.events.TransferBatch().process_log(raw)["args"]
+                    deltas.extend((int(i), sign * int(v)) for i, v in zip(args["ids"], args["values"]))
+        return deltas
+
+    def update(self, w3: Web3, account, ctf) -> list[int]:
+        """Scan new blocks (plus previously failed ranges) and return token IDs with balance > 0."""
+        me = account.address
+        safe = max(0, w3.eth.block_number - DISCOVERY_CONFIRMATIONS)
+        first_run = self.last_block is None
+        start = max(0, safe - DISCOVERY_LOOKBACK_BLOCKS) if first_run else self.last_block + 1
+        retry = self.store.load_failed_ranges()
+        results, failed, stats = self.fetcher.run(
+            lambda a, b: self._fetch_range(w3, ctf, me, a, b), start, safe, extra_ranges=retry)
+
+        # Deltas only apply to known tokens in freshly scanned blocks; anything else is read from chain
+        to_seed = self.store.load_unseeded_tokens()
+        fresh = []
+        for rng, deltas in results:
+            delta_range = not first_run and rng[0] >= start
+            for tid, delta in deltas:
+                if delta_range and tid in self.balances:
+                    fresh.append((tid, delta))
+                else:
+                    to_seed.add(tid)
+
+        changed = {}
+        for tid, delta in fresh:
+            if tid not in to_seed:
+                changed[tid] = self.balances[tid] = self.balances[tid] + delta
+        seeded = read_token_balances(ctf, me, to_seed, block_identifier=safe)
+        for tid, bal in seeded.items():
+            changed[tid] = self.balances[tid] = bal
+        unseeded = to_seed - seeded.keys()
+
+        self.last_block = safe
+        # Retried ranges may come back split, so replace them wholesale with whatever failed this run
+        self.store.save_discovery(changed, safe, unseeded, add_failed=failed, remove_failed=retry)
+        held = [tid for tid, bal in self.balances.items() if bal > 0]
+        log.info("SWEEP: scanned %d blocks in %d range(s) to block %d — %.1fs, %d blocks/s, "
+                 "%d split(s), %d throttled, chunk now %d, %d failed, %d retried, %d seeded, %d unseeded"
+                 " — %d/%d tokens held",
+                 stats["blocks"], stats["ranges"], safe, stats["seconds"], stats["blocks_per_sec"],
+                 stats["splits"], stats["throttled"], stats["chunk"], len(failed), len(retry), len(seeded), len(unseeded),
+                 len(held), len(self.balances))
+        return held
+
+
+_token_discovery = None
+
+
 def _discover_held_token_ids(w3: Web3, account, ctf) -> list[int]:
-    """Scan on-chain ERC-1155 TransferSingle events to find token IDs with nonzero balance."""
-    token_ids = set()
-    CHUNK = 45_000
+    """Return token IDs with nonzero balance from the incremental on-chain discovery index."""
+    global _token_discovery
     try:
-        latest = w3.eth.block_number
-        # ~14 days of blocks at ~2s/block ≈ 600k blocks
-        scan_start = max(0, latest - 700_000)
-        cursor = scan_start
-        while cursor <= latest:
-            end = min(cursor + CHUNK, latest)
-            try:
-                events = ctf.events.TransferSingle.get_logs(
-                    from_block=cursor,
-                    to_block=end,
-                    argument_filters={"to": account.address},
-                )
-                for ev in events:
-                    token_ids.add(ev.args["id"])
-            except Exception:
-                pass
-            cursor = end + 1
-        log.info("SWEEP: discovered %d unique token IDs from on-chain events", len(token_ids))
+        if _token_discovery is None:
+            _token_discovery = TokenDiscovery(state_store())
+        return _token_discovery.update(w3, account, ctf)
     except Exception as e:
         log.warning("SWEEP: event scan failed: %s", e)
-
-    # Filter to only tokens we actually still hold
-    held = []
-    for tid in token_ids:
-        try:
-            bal = ctf.functions.balanceOf(account.address, tid).call()
-            if bal > 0:
-                held.append(tid)
-        except Exception:
-            pass
-    log.info("SWEEP: %d/%d tokens still held in wallet", len(held), len(token_ids))
-    return held
+        return []
 
 
 def _resolve_token_metadata(token_id: str) -> dict | None:
-    """Look up condition_id, market_id, resolution status for a token_id via the Gamma API."""
+    """Look up static market metadata plus resolution status for a token_id via the Gamma API."""
     try:
-        resp = requests.get(
+        resp = http_pool.get(
             f"{GAMMA_API}/markets",
             params={"clob_token_ids": token_id, "limit": 1},
             timeout=10,
@@ -1137,17 +4016,109 @@ def _resolve_token_metadata(token_id: str) -> dict | None:
             data = resp.json()
             if data:
                 m = data[0]
+                outcome_index = 0
+                try:
+                    tokens = m.get("clobTokenIds") or "[]"
+                    tokens = json.loads(tokens) if isinstance(tokens, str) else tokens
+                    outcome_index = [str(t) for t in tokens].index(str(token_id))
+                except (ValueError, TypeError):
+                    pass
                 return {
                     "condition_id": m.get("conditionId") or m.get("condition_id", ""),
                     "market_id": str(m.get("id", "")),
                     "question": m.get("question", "?")[:80],
-                    "resolved": m.get("closed", False) or m.get("resolved", False),
+                    "neg_risk": bool(m.get("negRisk")),
+                    "outcome_index": outcome_index,
+                    "end_date": m.get("endDate") or m.get("endDateIso") or "",
+                    "resolved": bool(m.get("closed", False) or m.get("resolved", False)),
                 }
     except Exception:
         pass
     return None
 
 
+class TokenMetaCache:
+    """Disk-backed (state.db) Gamma metadata per CTF token.
+
+    condition_id, market_id, question, negRisk, outcome index and end date
+    never change, so they are fetched once per token. Only the resolution
+    flag is rechecked, at most every TOKEN_META_RESOLVE_TTL seconds, until it
+    reads resolved. Resolution is shared by every token of a condition.
+    """
+
+    def __init__(self, store: StateStore, resolve_ttl: float):
+        self.store = store
+        self.resolve_ttl = resolve_ttl
+        self._lock = threading.Lock()
+        self._meta = store.load_token_meta()
+
+    def get(self, token_id: str) -> tuple:
+        """Return (meta or None, hit_network)."""
+        tid = str(token_id)
+        with self._lock:
+            meta = self._meta.get(tid)
+        if meta is None:
+            fetched = _resolve_token_metadata(tid)
+            if not fetched:
+                return None, True
+            meta = dict(fetched, token_id=tid, checked_at=time.time())
+            self._save(meta)
+            return meta, True
+        if meta["resolved"] or time.time() - meta["checked_at"] < self.resolve_ttl:
+            return meta, False
+        resolved = check_market_resolved({"market_id": meta["market_id"], "end_date": meta["end_date"]})
+        meta = dict(meta, resolved=resolved, checked_at=time.time())
+        self._save(meta)
+        return meta, True
+
+    def _save(self, meta: dict):
+        with self._lock:
+            self._meta[meta["token_id"]] = meta
+            if meta["resolved"] and meta["condition_id"]:
+                for other in self._meta.values():
+                    if other["condition_id"] == meta["condition_id"]:
+                        other["resolved"] = True
+        self.store.upsert_token_meta(meta)
+
+
+_token_meta_cache = None
+
+
+def token_meta_cache() -> TokenMetaCache:
+    global _token_meta_cache
+    if _token_meta_cache is None:
+        _token_meta_cache = TokenMetaCache(state_store(), TOKEN_META_RESOLVE_TTL)
+    return _token_meta_cache
+
+
+def _sweep_direct(ctf, cid: str, is_neg_risk: bool, outcome_index: int, bal: int, question: str) -> bool:
+    """Send one orphan redeem as a direct transaction. False if it would revert or failed to send."""
+    try:
+        if is_neg_risk and neg_risk_adapter:
+            amounts = [bal, 0] if outcome_index == 0 else [0, bal]
+            fn = neg_risk_adapter.functions.redeemPositions(
+                bytes.fromhex(cid.replace("0x", "")),
+                amounts,
+            )
+            _submit_redeem(fn, 400_000, True, "SWEEP", "REDEEM", question)
+        else:
+            fn = ctf.functions.redeemPositions(
+                Web3.to_checksum_address(USDC_ADDRESS),
+                b"\x00" * 32,
+                bytes.fromhex(cid.replace("0x", "")),
+                [1, 2],
+            )
+            _submit_redeem(fn, 200_000, False, "SWEEP", "REDEEM", question)
+        return True
+    except Exception as e:
+        err = str(e).lower()
+        if "revert" in err or "execution reverted" in err:
+            log.debug("SWEEP: %s not redeemable yet", question[:40])
+        else:
+            log.error("SWEEP error for %s: %s", question[:50], e)
+    return False
+
+
 def sweep_orphaned_tokens(w3: Web3, account, ctf) -> int:
     """Scan for leftover conditional tokens and redeem resolved ones."""
     active_token_ids = {int(p["token_id"]) for p in bot_state.get("positions", [])}
@@ -1164,125 +4135,84 @@ def sweep_orphaned_tokens(w3: Web3, account, ctf) -> int:
             closed_by_tid[int(tid)] = pos
 
     seen_conditions = set()
-    redeemed = 0
+    redeemed = 0  # direct transactions sent (receipts confirm in the background)
+    queued = 0    # handed to redemption_batcher
     usdc_before = 0
     try:
         usdc_before = usdc_contract.functions.balanceOf(account.address).call() / 1e6
     except Exception:
         pass
 
-    nonce = w3.eth.get_transaction_count(account.address)
+    balances = read_token_balances(ctf, account.address,
+                                   [t for t in on_chain_ids if t not in active_token_ids])
 
     for tid in on_chain_ids:
         if tid in active_token_ids:
             continue
 
-        # Look up metadata: first from closed positions, then from Gamma API
-        meta = closed_by_tid.get(tid)
-        cid = meta.get("condition_id") if meta else None
-        question = meta.get("question", "?") if meta else "?"
-        market_id = meta.get("market_id", "") if meta else ""
-        resolved = False
-
-        if not cid or not market_id:
-            gamma = _resolve_token_metadata(str(tid))
-            if gamma:
-                cid = cid or gamma["condition_id"]
-                question = gamma["question"]
-                market_id = gamma["market_id"]
-                resolved = gamma["resolved"]
+        # Look up metadata: cached Gamma metadata first, closed positions as fallback
+        closed_meta = closed_by_tid.get(tid) or {}
+        meta, hit_network = token_meta_cache().get(str(tid))
+        if hit_network:
             time.sleep(0.3)
+        if meta:
+            cid = closed_meta.get("condition_id") or meta["condition_id"]
+            question = meta["question"]
+            market_id = meta["market_id"]
+            resolved = meta["resolved"]
+            is_neg_risk = meta["neg_risk"]
+            outcome_index = meta["outcome_index"]
+        else:
+            cid = closed_meta.get("condition_id")
+            question = closed_meta.get("question", "?")
+            market_id = closed_meta.get("market_id", "")
+            resolved = bool(market_id) and check_market_resolved({"market_id": market_id})
+            is_neg_risk = bool(closed_meta.get("neg_risk", False))
+            outcome_index = 0
 
         if not cid or cid in seen_conditions:
             continue
         seen_conditions.add(cid)
 
-        if not resolved and market_id:
-            dummy_pos = {"market_id": market_id, "question": question}
-            resolved = check_market_resolved(dummy_pos)
-
         if not resolved:
             log.debug("SWEEP skip (not resolved): %s", question[:50])
             continue
 
-        bal = ctf.functions.balanceOf(account.address, tid).call()
-        log.info("SWEEP: redeeming %s (%.2f tokens) — %s", str(cid)[:16], bal / 1e6, question[:50])
-
-        # Detect neg_risk from gamma metadata
-        is_neg_risk = meta.get("neg_risk", False) if meta else False
-        if not is_neg_risk and market_id:
-            try:
-                gr = requests.get(f"{GAMMA_API}/markets/{market_id}", timeout=5)
-                if gr.ok:
-                    is_neg_risk = bool(gr.json().get("negRisk"))
-            except Exception:
-                pass
-
-        # Try gasless relayer first
-        if relay_client and _relayer_redeem(ctf, cid, neg_risk=is_neg_risk,
-                                             token_id=str(tid), outcome_index=0):
-            redeemed += 1
-            add_trade({
-                "type": "REDEEM",
-                "question": question[:80],
-                "tx": "relayer",
-                "time": datetime.now(timezone.utc).isoformat(),
-            })
+        bal = balances.get(tid)
+        if not bal:
             continue
+        log.info("SWEEP: redeeming %s (%.2f tokens) — %s", str(cid)[:16], bal / 1e6, question[:50])
 
-        try:
-            if is_neg_risk and neg_risk_adapter:
-                amounts = [bal, 0]  # try Yes first; if fails, try No
-                tx = neg_risk_adapter.functions.redeemPositions(
-                    bytes.fromhex(cid.replace("0x", "")),
-                    amounts,
-                ).build_transaction({
-                    "from": account.address, "nonce": nonce, "gas": 400_000,
-                    "maxFeePerGas": int(w3.eth.gas_price * 1.5),
-                    "maxPriorityFeePerGas": w3.to_wei(30, "gwei"),
-                })
-            else:
-                tx = ctf.functions.redeemPositions(
-                    Web3.to_checksum_address(USDC_ADDRESS),
-                    b"\x00" * 32,
-                    bytes.fromhex(cid.replace("0x", "")),
-                    [1, 2],
-                ).build_transaction({
-                    "from": account.address, "nonce": nonce, "gas": 200_000,
-                    "gasPrice": w3.eth.gas_price,
-                })
-            signed = account.sign_transaction(tx)
-            tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
-            receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=90)
-            if receipt.status == 1:
-                redeemed += 1
-                nonce += 1
-                log.info("SWEEP OK: %s tx=%s", question[:50], tx_hash.hex())
+        # Gasless relayer first (batched, sent at the end of the tick); direct tx otherwise
+        def on_relayer(ok, cid=cid, is_neg_risk=is_neg_risk, outcome_index=outcome_index, bal=bal,
+                       question=question):
+            if ok:
                 add_trade({
                     "type": "REDEEM",
                     "question": question[:80],
-                    "tx": tx_hash.hex(),
+                    "tx": "relayer",
                     "time": datetime.now(timezone.utc).isoformat(),
                 })
             else:
-                nonce += 1
-                log.warning("SWEEP reverted: %s (market may not be resolved)", question[:50])
-        except Exception as e:
-            err = str(e).lower()
-            if "revert" in err or "execution reverted" in err:
-                log.debug("SWEEP: %s not redeemable yet", question[:40])
-            else:
-                log.error("SWEEP error for %s: %s", question[:50], e)
+                _sweep_direct(ctf, cid, is_neg_risk, outcome_index, bal, question)
+
+        if redemption_batcher.add(ctf, cid, question, on_relayer, neg_risk=is_neg_risk, token_id=str(tid),
+                                  outcome_index=outcome_index, balance=bal):
+            queued += 1
+        elif _sweep_direct(ctf, cid, is_neg_risk, outcome_index, bal, question):
+            redeemed += 1
 
+    if queued:
+        log.info("SWEEP: %d redeem(s) queued for the gasless batch", queued)
     if redeemed > 0:
         try:
             usdc_after = usdc_contract.functions.balanceOf(account.address).call() / 1e6
             gained = usdc_after - usdc_before
-            log.info("SWEEP done: %d redeemed, USDC gained: $%.2f (now $%.2f)",
+            log.info("SWEEP done: %d sent direct, USDC gained so far: $%.2f (now $%.2f)",
                      redeemed, gained, usdc_after)
         except Exception:
-            log.info("SWEEP done: %d redeemed", redeemed)
-    return redeemed
+            log.info("SWEEP done: %d sent direct", redeemed)
+    return redeemed + queued
 
 
 # ── Dashboard ─────────────────────────────────────────────────────────────────
@@ -1436,7 +4366,7 @@ async function refresh(){
     document.getElementById('dot').className='dot '+(isLive?'on':'off');
     const tick=d.last_tick?new Date(d.last_tick).toLocaleTimeString('en-US',{timeZone:'America/New_York'}):'--';
     const stLabel=d.paused?'Paused':(d.running?'Running':'Offline');
-    document.getElementById('sub').textContent=stLabel+' \u00b7 Last tick '+tick+' ET \u00b7 Poll '+d.config.poll_seconds+'s'+(d.builder_relayer?' \u00b7 Builder':'');
+    document.getElementById('sub').textContent=stLabel+' \u00b7 Last tick '+tick+' ET \u00b7 Poll '+d.config.poll_seconds+'s'+(d.builder_relayer?' \u00b7 Builder':'')+' \u00b7 Data '+(d.snapshot_age||0).toFixed(0)+'s old';
     document.getElementById('wallet').textContent=d.wallet||'';
     document.getElementById('strat').textContent=
       'Buy '+d.config.buy_range+' \u2192 Sell '+d.config.profit_target+' GTC'+
@@ -1581,12 +4511,18 @@ def dashboard():
     return Response(DASHBOARD_HTML, content_type="text/html")
 
 
-@flask_app.route("/api/status")
-def api_status():
+_status_snapshot = None           # (built_at epoch, status dict) — replaced, never mutated
+_status_lock = threading.Lock()
+_status_wake = threading.Event()  # set to make the refresher rebuild early
+
+
+def build_status() -> dict:
+    """Collect everything /api/status shows that costs I/O (books, balances, Data API)."""
     positions_with_prices = []
+    books = fetch_books(clob_client, [p["token_id"] for p in bot_state["positions"]]) if clob_client else {}
     for p in bot_state["positions"]:
         pp = dict(p)
-        pi = get_price_info(p["token_id"])
+        pi = price_info_from_book(books.get(str(p["token_id"])))
         pp["current_price"] = pi["last_trade"]
         pp["best_bid"] = pi["best_bid"]
         pp["best_ask"] = pi["best_ask"]
@@ -1605,11 +4541,8 @@ def api_status():
     except Exception:
         pass
 
-    return jsonify({
-        "running": bot_state["running"],
-        "paused": bot_state.get("paused", False),
+    return {
         "started_at": bot_state["started_at"],
-        "last_tick": bot_state["last_tick"],
         "wallet": bot_state["wallet"],
         "usdc_balance": get_usdc_balance(),
         "gas_balance": get_matic_balance(),
@@ -1626,6 +4559,17 @@ def api_status():
         "open_cost": round(open_cost, 2),
         "portfolio_value": pv,
         "builder_relayer": relay_client is not None,
+        "book_cache": book_cache.stats(),
+        "persistence": position_persister.stats(),
+        "market_stream": market_stream.stats() if MARKET_WS_ENABLED else None,
+        "user_stream": user_stream.stats() if user_stream_on else None,
+        "orders": order_gateway.stats(),
+        "signing": signing_service.stats(),
+        "resolution": resolution_tracker().stats(),
+        "universe": market_universe.stats(),
+        "http": http_pool.stats(),
+        "transactions": tx_tracker.stats() if tx_tracker else None,
+        "redemptions": redemption_batcher.stats(),
         "closed_positions": closed_all[-50:],
         "trades": trade_history[-30:],
         "config": {
@@ -1636,9 +4580,53 @@ def api_status():
             "poll_seconds": POLL_SECONDS,
         },
         "timezone": "UTC",
+    }
+
+
+def refresh_status_snapshot():
+    global _status_snapshot
+    with _status_lock:
+        _status_snapshot = (time.time(), build_status())
+
+
+def status_refresher():
+    """Rebuild the status snapshot every STATUS_REFRESH_SECONDS (or sooner when woken)."""
+    while True:
+        try:
+            refresh_status_snapshot()
+        except Exception as e:
+            log.warning("Status snapshot failed: %s", e)
+        _status_wake.wait(STATUS_REFRESH_SECONDS)
+        _status_wake.clear()
+
+
+@flask_app.route("/api/status")
+def api_status():
+    """Serve the latest prebuilt snapshot plus a few live flags — no I/O per request."""
+    snap = _status_snapshot
+    if snap is None:
+        refresh_status_snapshot()
+        snap = _status_snapshot
+    built_at, status = snap
+    return jsonify({
+        **status,
+        "running": bot_state["running"],
+        "paused": bot_state.get("paused", False),
+        "last_tick": bot_state["last_tick"],
+        "snapshot_age": round(time.time() - built_at, 2),
     })
 
 
+@flask_app.route("/api/trades")
+def api_trades():
+    """Tail the trade journal: /api/trades?limit=N (default 100, max 5000)."""
+    try:
+        limit = max(1, min(int(flask_request.args.get("limit", 100)), 5000))
+    except ValueError:
+        limit = 100
+    return jsonify({"trades": trade_journal().tail(limit), "journal": trade_journal().stats()})
+
+
 @flask_app.route("/api/withdraw", methods=["POST"])
 def api_withdraw():
     if not w3_instance or not account_instance or not usdc_contract:
@@ -1653,24 +4641,29 @@ def api_withdraw():
     if amount <= 0:
         return jsonify({"success": False, "error": "Invalid amount"})
 
+    nonce = None
+    sent = False
     try:
         raw_amount = int(amount * 1e6)
+        nonce = tx_tracker.nonces.take()
         tx = usdc_contract.functions.transfer(
             Web3.to_checksum_address(to_addr),
             raw_amount,
         ).build_transaction({
             "from": account_instance.address,
-            "nonce": w3_instance.eth.get_transaction_count(account_instance.address),
+            "nonce": nonce,
             "gas": 100_000,
             "gasPrice": w3_instance.eth.gas_price,
         })
 
         signed = account_instance.sign_transaction(tx)
         tx_hash = w3_instance.eth.send_raw_transaction(signed.raw_transaction)
+        sent = True
         receipt = w3_instance.eth.wait_for_transaction_receipt(tx_hash, timeout=60)
 
         if receipt.status == 1:
             log.info("Withdraw %s USDC to %s. TX: %s", amount, to_addr, tx_hash.hex())
+            _status_wake.set()
             add_trade({
                 "type": "WITHDRAW",
                 "question": f"${amount} USDC to {to_addr[:10]}...",
@@ -1681,6 +4674,8 @@ def api_withdraw():
             return jsonify({"success": False, "error": "Transaction reverted"})
 
     except Exception as e:
+        if nonce is not None and not sent:
+            tx_tracker.nonces.release(nonce)  # never broadcast; the next transaction reuses it
         return jsonify({"success": False, "error": str(e)})
 
 
@@ -1733,7 +4728,9 @@ def api_close():
             size = min(pos["size"], real_bal) if real_bal else pos["size"]
             size = round(size, 2)
 
-            book = clob_client.get_order_book(token_id)
+            book = fetch_book(clob_client, token_id)
+            if book is None:
+                return jsonify({"success": False, "error": "Could not fetch order book"})
             bids = getattr(book, "bids", [])
             ltp = float(getattr(book, "last_trade_price", 0) or 0)
 
@@ -1752,7 +4749,8 @@ def api_close():
             )
             opts = CreateOrderOptions(tick_size=str(tick), neg_risk=neg_risk)
             signed = clob_client.create_order(sell_args, options=opts)
-            result = clob_client.post_order(signed, OrderType.FAK)
+            result = order_gateway.post(clob_client, [(signed, OrderType.FAK)])[0]
+            book_cache.invalidate(token_id)
 
             order_id = result.get("orderID", "")
             if order_id:
@@ -1802,6 +4800,7 @@ def api_close():
 
         msg = "; ".join(actions) if actions else "Position closed"
         log.info("Manual close: %s — %s", pos["question"][:50], msg)
+        _status_wake.set()
         return jsonify({"success": True, "message": msg})
 
     except Exception as e:
@@ -1836,6 +4835,7 @@ def api_cancel_sell():
             pos["hold_override"] = True
             save_positions(bot_state["positions"])
             log.info("Cancel sell: %s — GTC removed, holding", pos["question"][:50])
+            _status_wake.set()
             return jsonify({"success": True,
                 "message": f"GTC sell cancelled. Position stays held — bot will NOT auto-sell."})
         else:
@@ -1852,6 +4852,7 @@ def api_pause():
     global bot_paused
     bot_paused = True
     bot_state["paused"] = True
+    _status_wake.set()
     log.info("BOT PAUSED by user")
     return jsonify({"success": True, "paused": True})
 
@@ -1861,6 +4862,7 @@ def api_resume():
     global bot_paused
     bot_paused = False
     bot_state["paused"] = False
+    _status_wake.set()
     log.info("BOT RESUMED by user")
     return jsonify({"success": True, "paused": False})
 
@@ -1885,10 +4887,12 @@ def api_scan():
     try:
         results = []
         active_ids = {p["token_id"] for p in bot_state.get("positions", [])}
-        candidates = scan_markets(active_ids)
+        candidates = scan_markets(active_ids, frozenset(blacklisted_tokens))
         sample = random.sample(candidates[:3000], min(30, len(candidates)))
+        books = fetch_books(clob_client, [m["token_id"] for m in sample])
         for mkt in sample:
-            info = score_market(mkt["token_id"], clob_client, mkt["question"])
+            book = books.get(str(mkt["token_id"]))
+            info = score_market(mkt["token_id"], clob_client, mkt["question"], book=book) if book else None
             results.append({
                 "question": mkt["question"][:60],
                 "gamma_price": mkt["price"],
@@ -1951,56 +4955,219 @@ def init_builder_relayer():
         log.warning("Builder relayer init failed: %s — using direct tx", e)
 
 
-def _relayer_redeem(ctf, condition_id: str, neg_risk=False, token_id=None, outcome_index=0) -> bool:
-    """Attempt gasless redeem via Builder relayer. Returns True on success."""
-    if not relay_client:
-        return False
-    try:
-        from py_builder_relayer_client.models import SafeTransaction, OperationType
-        if neg_risk:
+def _relayer_redeem_tx(ctf, condition_id: str, neg_risk=False, token_id=None, outcome_index=0,
+                       balance: int | None = None):
+    """Build the SafeTransaction that redeems one condition, or None if there is nothing to redeem."""
+    from py_builder_relayer_client.models import SafeTransaction, OperationType
+    if neg_risk:
+        bal = balance
+        if bal is None:
             bal = ctf.functions.balanceOf(account_instance.address, int(token_id)).call() if token_id else 0
-            if bal == 0:
-                return False
-            amounts = [bal, 0] if outcome_index == 0 else [0, bal]
-            redeem_data = neg_risk_adapter.encode_abi(
-                abi_element_identifier="redeemPositions",
-                args=[bytes.fromhex(condition_id.replace("0x", "")), amounts]
-            )
-            target = NEG_RISK_ADAPTER
-        else:
-            redeem_data = ctf.encode_abi(
-                abi_element_identifier="redeemPositions",
-                args=[
-                    Web3.to_checksum_address(USDC_ADDRESS),
-                    b"\x00" * 32,
-                    bytes.fromhex(condition_id.replace("0x", "")),
-                    [1, 2],
-                ]
-            )
-            target = CTF_ADDRESS
-        tx = SafeTransaction(
-            to=target,
-            operation=OperationType.Call,
-            data=redeem_data,
-            value="0",
+        if bal == 0:
+            return None
+        amounts = [bal, 0] if outcome_index == 0 else [0, bal]
+        redeem_data = neg_risk_adapter.encode_abi(
+            abi_element_identifier="redeemPositions",
+            args=[bytes.fromhex(condition_id.replace("0x", "")), amounts]
+        )
+        target = NEG_RISK_ADAPTER
+    else:
+        redeem_data = ctf.encode_abi(
+            abi_element_identifier="redeemPositions",
+            args=[
+                Web3.to_checksum_address(USDC_ADDRESS),
+                b"\x00" * 32,
+                bytes.fromhex(condition_id.replace("0x", "")),
+                [1, 2],
+            ]
         )
-        response = relay_client.execute([tx], f"Redeem {condition_id[:16]}")
-        result = response.wait()
+        target = CTF_ADDRESS
+    return SafeTransaction(
+        to=target,
+        operation=OperationType.Call,
+        data=redeem_data,
+        value="0",
+    )
+
+
+REDEEM_BATCH_MAX = int(os.getenv("REDEEM_BATCH_MAX", "20"))  # redeems per Safe multi-call
+
+
+class RedemptionBatcher:
+    """Collects a tick's gasless redemptions and sends them as one Safe multi-call.
+
+    Step 4, reconciliation and the orphan sweep add() conditions as they find
+    them (duplicates share one call); flush() at the end of the tick submits
+    them through relay_client.execute() in chunks of REDEEM_BATCH_MAX. A
+    failed batch is split in half and retried down to single redeems. Every
+    on_done(ok) callback runs on the flushing thread once its condition's
+    outcome is known; on False the caller falls back to a direct transaction.
+    """
+
+    def __init__(self, max_batch: int):
+        self.max_batch = max(1, max_batch)
+        self._lock = threading.Lock()
+        self._queue = {}   # condition_id -> {"tx", "label", "callbacks"}
+        self.batches = 0
+        self.redeemed = 0
+        self.failed = 0
+        self.splits = 0
+
+    def add(self, ctf, condition_id: str, label: str, on_done, neg_risk=False, token_id=None,
+            outcome_index=0, balance: int | None = None) -> bool:
+        """Queue a redeem. False if no relayer tx could be built (the caller should go direct now)."""
+        if not relay_client or not condition_id:
+            return False
+        with self._lock:
+            item = self._queue.get(condition_id)
+            if item:
+                item["callbacks"].append(on_done)
+                return True
+        try:
+            tx = _relayer_redeem_tx(ctf, condition_id, neg_risk=neg_risk, token_id=token_id,
+                                    outcome_index=outcome_index, balance=balance)
+        except Exception as e:
+            log.error("RELAYER REDEEM ERROR: %s — falling back to direct tx", e)
+            return False
+        if tx is None:
+            return False
+        with self._lock:
+            item = self._queue.setdefault(condition_id, {"tx": tx, "label": label, "callbacks": []})
+            item["callbacks"].append(on_done)
+        return True
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._queue)
+
+    def flush(self) -> int:
+        """Submit everything queued. Returns the number of conditions redeemed through the relayer."""
+        with self._lock:
+            items = list(self._queue.items())
+            self._queue = {}
+        ok = 0
+        for i in range(0, len(items), self.max_batch):
+            ok += self._execute(items[i:i + self.max_batch])
+        return ok
+
+    def _execute(self, items: list) -> int:
+        cids = [cid for cid, _ in items]
+        desc = f"Redeem {cids[0][:16]}" if len(items) == 1 else f"Redeem {len(items)} conditions"
+        result = None
+        try:
+            self.batches += 1
+            response = relay_client.execute([item["tx"] for _, item in items], desc)
+            result = response.wait()
+        except Exception as e:
+            log.error("RELAYER REDEEM ERROR (%d): %s", len(items), e)
+
         if result:
-            log.info("REDEEMED (gasless) condition %s...", condition_id[:16])
-            return True
-        log.error("RELAYER REDEEM FAILED %s...", condition_id[:16])
-        return False
+            log.info("REDEEMED (gasless) %d condition(s): %s", len(items),
+                     ", ".join(c[:16] + "..." for c in cids[:5]) + (" ..." if len(cids) > 5 else ""))
+            self.redeemed += len(items)
+            self._done(items, True)
+            return len(items)
+        if len(items) > 1:
+            self.splits += 1
+            mid = len(items) // 2
+            log.warning("RELAYER batch of %d failed — retrying as %d + %d", len(items), mid, len(items) - mid)
+            return self._execute(items[:mid]) + self._execute(items[mid:])
+        log.error("RELAYER REDEEM FAILED %s...", cids[0][:16])
+        self.failed += 1
+        self._done(items, False)
+        return 0
+
+    @staticmethod
+    def _done(items: list, ok: bool):
+        for _, item in items:
+            for cb in item["callbacks"]:
+                try:
+                    cb(ok)
+                except Exception as e:
+                    log.error("Redeem callback failed for %s: %s", item["label"][:40], e)
+
+    def stats(self) -> dict:
+        return {"queued": self.pending(), "batches": self.batches, "redeemed": self.redeemed,
+                "failed": self.failed, "splits": self.splits}
+
+
+redemption_batcher = RedemptionBatcher(REDEEM_BATCH_MAX)
+
+
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def _flush_on_exit():
+    """Last-chance flush if we exit outside the loop's KeyboardInterrupt handler (e.g. mid-sleep)."""
+    if tx_tracker:
+        tx_tracker.wait_idle(TX_SHUTDOWN_WAIT)  # receipt callbacks record their trades
+    position_persister.flush()
+    if _trade_journal:
+        _trade_journal.sync()
+
+
+_claim_results = deque()  # (position, ok) from direct claims whose receipts came in
+
+
+def _finish_claim(w3: Web3, account, ctf, pos: dict, balance, relayed: bool):
+    """Close a resolved position: relayer outcome first, direct transaction if that failed.
+
+    A direct claim leaves the position "claiming" until its receipt is in;
+    apply_claim_results() closes it then.
+    """
+    if pos["status"] == "done":  # reconciliation already closed it this tick
+        return
+    if relayed:
+        add_trade({
+            "type": "CLAIM",
+            "question": pos["question"][:80],
+            "tx": "relayer",
+            "time": datetime.now(timezone.utc).isoformat(),
+        })
+        pos["status"] = "done"
+        close_position(pos, "won", 1.0)
+    elif try_claim(w3, account, ctf, pos, balance=balance,
+                   on_result=lambda ok: _claim_results.append((pos, ok))):
+        pos["status"] = "claiming"
+    else:
+        pos["status"] = "done"
+        close_position(pos, "lost", 0.0)
+
+
+def apply_claim_results() -> int:
+    """Close positions whose direct claim receipts have arrived (main thread). Returns how many.
+
+    A claim dropped without a receipt goes back to "held", so step 4 claims
+    it again next tick.
+    """
+    n = 0
+    while _claim_results:
+        pos, ok = _claim_results.popleft()
+        if pos["status"] != "claiming":
+            continue
+        if ok is None:
+            log.warning("Claim dropped, retrying next tick: %s", pos["question"][:50])
+            pos["status"] = "held"
+            continue
+        pos["status"] = "done"
+        close_position(pos, "won" if ok else "lost", 1.0 if ok else 0.0)
+        n += 1
+    return n
+
+
+def _sweep_stage(w3: Web3, account, ctf):
+    try:
+        sweep_orphaned_tokens(w3, account, ctf)
     except Exception as e:
-        log.error("RELAYER REDEEM ERROR: %s — falling back to direct tx", e)
-        return False
+        log.debug("Token sweep failed: %s", e)
 
 
 def run():
     if not PRIVATE_KEY:
         raise ValueError("PRIVATE_KEY not set in .env")
 
-    global clob_client
+    global clob_client, user_stream_on
     log.info("Starting Vig swing bot")
     log.info("Buy range    : $%.2f - $%.2f", BUY_MIN, BUY_MAX)
     log.info("Sell target  : $%.2f", SELL_TARGET)
@@ -2011,17 +5178,22 @@ def run():
 
     clob = build_clob_client()
     clob_client = clob
+    signing_service.start(clob)
     w3, account, ctf, neg_risk_adapter = build_web3()
     init_builder_relayer()
+    stream_on = MARKET_WS_ENABLED and market_stream.start()
+    stream_candidates = set()
+    user_stream_on = USER_WS_ENABLED and user_stream.start(clob.creds)
 
     global trade_history
     positions = load_positions()
     for p in positions:
         if p.get("status") == "buying":
             p["status"] = "pending"
-        elif p.get("status") in ("selling", "bought"):
+        elif p.get("status") in ("selling", "bought", "claiming"):
             p["status"] = "held"
     trade_history = load_trades()
+    blacklisted_tokens.update(load_blacklist())
     bot_state["closed_positions"] = load_closed()
     closed = bot_state["closed_positions"]
     filled_closed = [c for c in closed if c.get("exit_type") not in ("expired", "cancelled")]
@@ -2042,6 +5214,8 @@ def run():
     bot_state["positions"] = positions
 
     threading.Thread(target=start_dashboard, daemon=True).start()
+    threading.Thread(target=status_refresher, daemon=True, name="status").start()
+    market_universe.start()
 
     # Initial reconciliation — adopt any untracked positions
     try:
@@ -2051,16 +5225,39 @@ def run():
     except Exception as e:
         log.warning("Initial reconciliation failed: %s", e)
 
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)  # docker stop → clean flush
+    atexit.register(_flush_on_exit)
+
+    stage_pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix="stage")
     tick_count = 0
     while True:
+        resolve_fut = prefetch_fut = sweep_fut = None
+        t_tick = time.time()
         try:
             tick_count += 1
             bot_state["last_tick"] = datetime.now(timezone.utc).isoformat()
             log.info("── Tick ──────────────────────────────────────────")
             log.info("Positions: %d / %d", len(positions), MAX_BETS)
+            log.info("Book cache: %s", " ".join(f"{k}={v}" for k, v in book_cache.stats().items()))
+
+            # Overlapped stages: resolution lookups and candidate scoring only read
+            # positions, so they run on stage threads while steps 1–5 do their I/O.
+            if TICK_OVERLAP:
+                resolve_fut = stage_pool.submit(
+                    resolution_tracker().resolved_markets,
+                    [p for p in positions if p["status"] in ("pending", "held")])
+                if len(positions) < MAX_BETS and not bot_paused:
+                    prefetch_fut = stage_pool.submit(
+                        prepare_candidates, clob, {p["token_id"] for p in positions},
+                        frozenset(blacklisted_tokens), (MAX_BETS - len(positions)) * 3, stream_on)
+
+            # One open-orders snapshot serves fill checks (2), sell checks and orphan cleanup (5b)
+            order_index = OrderIndex(clob)
+            order_index.refresh()
 
             # 1. Auto-cancel stale pending orders
             now = datetime.now(timezone.utc)
+            stale = []
             for pos in positions:
                 if pos["status"] == "pending":
                     try:
@@ -2071,75 +5268,99 @@ def run():
                     if age_min > STALE_ORDER_MINUTES:
                         log.info("AUTO-CANCEL: %s (pending %.0f min)",
                                  pos["question"][:40], age_min)
-                        cancel_order(clob, pos["buy_order_id"])
-                        close_position(pos, "cancelled", 0)
-                        pos["status"] = "done"
-
-            # 2. Check pending buys — if filled, place sell
+                        stale.append(pos)
+            cancel_orders(clob, [p["buy_order_id"] for p in stale])
+            for pos in stale:
+                order_index.discard(pos["buy_order_id"])
+                close_position(pos, "cancelled", 0)
+                pos["status"] = "done"
+
+            # 2. Check pending buys — if filled, place sell (one batch for the tick)
+            to_sell = []
             for pos in positions:
                 if pos["status"] == "pending":
-                    if check_order_filled(clob, pos["buy_order_id"]):
+                    if order_index.filled(pos["buy_order_id"]):
                         log.info("Buy filled: %s", pos["question"][:50])
                         pos["status"] = "held"
-                        place_sell(clob, pos)
-                        save_positions(positions)
+                        to_sell.append(pos)
 
                 elif pos["status"] == "held" and not pos.get("sell_order_id") and not pos.get("hold_override"):
                     log.info("Placing sell for unmanaged position: %s", pos["question"][:50])
-                    place_sell(clob, pos)
-                    save_positions(positions)
+                    to_sell.append(pos)
 
                 elif pos["status"] == "held" and pos.get("sell_order_id"):
-                    sell_status = check_order_status(clob, pos["sell_order_id"])
+                    sell_status = order_index.status(pos["sell_order_id"])
                     if sell_status == "FILLED":
-                        actual_sell = pos.get("sell_target", pos.get("buy_price", 0) * (1 + PROFIT_PCT))
-                        log.info("Sell filled: %s @ $%.3f", pos["question"][:50], actual_sell)
-                        pos["status"] = "done"
-                        close_position(pos, "sold", actual_sell)
-                        add_trade({
-                            "type": "SELL",
-                            "question": pos["question"][:80],
-                            "price": actual_sell,
-                            "size": pos["size"],
-                            "time": datetime.now(timezone.utc).isoformat(),
-                        })
+                        _record_sell_fill(pos)
                     elif sell_status == "INVALID":
                         log.info("Sell order invalidated: %s — clearing for re-sell or redeem", pos["question"][:50])
                         pos["sell_order_id"] = None
                         save_positions(positions)
+            if to_sell:
+                place_sells(clob, to_sell)
+                save_positions(positions)
 
             # 3. Re-price stale sell orders if market moved up
-            for pos in positions:
+            reprice = [p for p in positions if p["status"] == "held" and p.get("sell_order_id")]
+            held_books = fetch_books(clob, [p["token_id"] for p in reprice])
+            repriced = []
+            for pos in reprice:
                 if pos["status"] == "held" and pos.get("sell_order_id"):
                     try:
-                        info = score_market(pos["token_id"], clob, pos.get("question", ""))
+                        book = held_books.get(str(pos["token_id"]))
+                        if book is None:
+                            continue
+                        info = score_market(pos["token_id"], clob, pos.get("question", ""), book=book)
                         cur_target = pos.get("sell_target", pos.get("buy_price", 0) * (1 + PROFIT_PCT))
                         if info and info["best_bid"] > cur_target * 1.05:
                             new_target = min(info["best_bid"] + float(pos.get("tick_size", 0.01)), 0.99)
                             log.info("REPRICE: %s sell $%.3f → $%.3f (bid=$%.3f)",
                                      pos["question"][:35], cur_target,
                                      new_target, info["best_bid"])
-                            cancel_order(clob, pos["sell_order_id"])
-                            pos["sell_target"] = new_target
-                            pos["sell_order_id"] = None
-                            place_sell(clob, pos)
-                            save_positions(positions)
+                            repriced.append((pos, new_target))
                     except Exception:
                         pass
-
-            # 4. Check resolved markets — claim on-chain
-            for pos in positions:
-                if pos["status"] in ("pending", "held"):
-                    if check_market_resolved(pos):
-                        claimed = try_claim(w3, account, ctf, pos)
-                        pos["status"] = "done"
-                        exit_price = 1.0 if claimed else 0.0
-                        close_position(pos, "won" if claimed else "lost", exit_price)
+            if repriced:
+                # One cancel batch, one post batch — however many books moved.
+                # With PRESIGN_SELLS the new sells are signed while the cancels are in flight.
+                if PRESIGN_SELLS:
+                    for pos, new_target in repriced:
+                        signing_service.presign_sell(pos, new_target)
+                cancel_orders(clob, [p["sell_order_id"] for p, _ in repriced])
+                for pos, new_target in repriced:
+                    order_index.discard(pos["sell_order_id"])
+                    pos["sell_target"] = new_target
+                    pos["sell_order_id"] = None
+                place_sells(clob, [p for p, _ in repriced])
+                save_positions(positions)
+
+            # 4. Check resolved markets — claim on-chain (direct claims close once their receipt is in)
+            apply_claim_results()
+            open_positions = [p for p in positions if p["status"] in ("pending", "held")]
+            if resolve_fut is not None:
+                resolved_ids = resolve_fut.result()
+            else:
+                resolved_ids = resolution_tracker().resolved_markets(open_positions)
+            resolved = [p for p in open_positions if str(p.get("market_id") or "") in resolved_ids]
+            claim_bal = read_token_balances(
+                ctf, account.address, [p["token_id"] for p in resolved if p.get("neg_risk")])
+            for pos in resolved:
+                bal = claim_bal.get(int(pos["token_id"]))
+                if redemption_batcher.add(ctf, pos.get("condition_id"), pos["question"],
+                                          partial(_finish_claim, w3, account, ctf, pos, bal),
+                                          neg_risk=pos.get("neg_risk", False), token_id=pos.get("token_id"),
+                                          outcome_index=_outcome_index(pos) if pos.get("neg_risk") else 0,
+                                          balance=bal):
+                    pos["status"] = "claiming"  # closed when the tick's gasless batch lands
+                    continue
+                _finish_claim(w3, account, ctf, pos, bal, False)
 
             # 5. Remove done positions
             positions = [p for p in positions if p["status"] != "done"]
             save_positions(positions)
             bot_state["positions"] = positions
+            if stream_on:
+                market_stream.set_assets([p["token_id"] for p in positions] + list(stream_candidates))
 
             # 5b. Cleanup orphaned CLOB orders (sell orders for closed positions)
             try:
@@ -2150,84 +5371,115 @@ def run():
                     if p.get("sell_order_id"):
                         active_order_ids.add(p["sell_order_id"])
 
-                clob_orders = clob.get_orders()
-                for o in clob_orders:
-                    if o.get("status") == "LIVE" and o.get("id") not in active_order_ids:
-                        cancel_order(clob, o["id"])
+                if order_index.orders is None:
+                    order_index.refresh()  # snapshot failed at tick start; one more try
+                orphans = [o for o in order_index.live() if o.get("id") not in active_order_ids]
+                cancelled = cancel_orders(clob, [o["id"] for o in orphans])
+                for o in orphans:
+                    if cancelled.get(o["id"]):
                         log.info("CLEANUP: cancelled orphan %s order %s",
                                  o.get("side", "?"), o.get("id", "")[:20])
             except Exception as e:
                 log.debug("Order cleanup check failed: %s", e)
+            snap, hits, lookups = order_index.take_metrics()
+            log.info("Orders: snapshot=%s, %d answered from it, %d per-order lookups",
+                     snap if snap is not None else "failed", hits, lookups)
 
-            # 5c. Sweep orphaned conditional tokens from closed positions (every 5 ticks)
-            if tick_count % 5 == 1:
-                try:
-                    sweep_orphaned_tokens(w3, account, ctf)
-                except Exception as e:
-                    log.debug("Token sweep failed: %s", e)
-
-            # 5d. Data API reconciliation — adopt untracked positions, redeem redeemable
+            # 5c. Data API reconciliation — adopt untracked positions, redeem redeemable
             try:
                 reconcile_positions()
             except Exception as e:
                 log.debug("Reconciliation failed: %s", e)
 
+            # 5d. Sweep orphaned conditional tokens from closed positions (every 5 ticks).
+            # Runs after every other on-chain write of the tick, so with overlap on
+            # it can proceed alongside the CLOB-only buys in step 6.
+            if tick_count % 5 == 1:
+                if TICK_OVERLAP:
+                    sweep_fut = stage_pool.submit(_sweep_stage, w3, account, ctf)
+                else:
+                    _sweep_stage(w3, account, ctf)
+
             # 6. Fill empty slots — score a batch, buy the best
             slots = MAX_BETS - len(positions)
             log.info("Open slots: %d%s", slots, " (PAUSED)" if bot_paused else "")
 
             if slots > 0 and not bot_paused:
-                active_ids = {p["token_id"] for p in positions}
-                candidates = scan_markets(active_ids)
-
-                tagged = [c for c in candidates if c.get("_tag") != "volume"]
-                fallback = [c for c in candidates if c.get("_tag") == "volume"]
-                log.info("Candidates: %d tagged, %d volume-only (from %d total)",
-                         len(tagged), len(fallback), len(candidates))
-
-                check_pool = tagged[:80]
-                remaining = 100 - len(check_pool)
-                if remaining > 0 and fallback:
-                    check_pool += random.sample(fallback, min(remaining, len(fallback)))
-                random.shuffle(check_pool)
-
-                scored = []
-                for mkt in check_pool:
-                    info = score_market(mkt["token_id"], clob, mkt["question"])
-                    if info:
-                        mkt["_score"] = info
-                        scored.append(mkt)
-                    if len(scored) >= slots * 3:
-                        break
-
-                scored.sort(key=lambda m: m["_score"]["score"], reverse=True)
-                log.info("Scored %d/%d — top: %s",
-                         len(scored), len(check_pool),
-                         " | ".join(
-                             f"bid${m['_score']['all_bid_usd']:.0f}({m['_score']['n_bids']}lvl)@${m['_score']['best_bid']:.2f}"
-                             for m in scored[:5]
-                         ))
-
-                filled = 0
-                for mkt in scored:
-                    if filled >= slots:
-                        break
-                    pos = place_buy(clob, mkt)
-                    if pos:
-                        positions.append(pos)
-                        save_positions(positions)
-                        bot_state["positions"] = positions
-                        filled += 1
-                        time.sleep(1)
+                prefetched = prefetch_fut is not None
+                if prefetched:
+                    prep = prefetch_fut.result()
+                    prefetch_fut = None
+                else:
+                    prep = prepare_candidates(clob, {p["token_id"] for p in positions},
+                                              frozenset(blacklisted_tokens), slots * 3, stream_on)
+                scored = prep["scored"]
+                if stream_on:
+                    stream_candidates = prep["pool_ids"]
+                    market_stream.set_assets([p["token_id"] for p in positions] + list(stream_candidates))
+
+                t_stage = time.time()
+                age = t_stage - prep["ready_at"]
+                if prefetched:
+                    # Steps 1–5 may have blacklisted or adopted tokens, and the scores' books are old
+                    scored = refresh_candidates(
+                        clob, scored, {str(p["token_id"]) for p in positions} | blacklisted_tokens)
+                bought = place_buys(clob, scored, slots)
+                if bought:
+                    positions.extend(bought)
+                    save_positions(positions)
+                    bot_state["positions"] = positions
+                log.info("Stage timing: scan=%.2fs score=%.2fs (%d workers) buy=%.2fs%s",
+                         prep["t_scan"], prep["t_score"], SCORE_WORKERS, time.time() - t_stage,
+                         f" (prefetched {age:.1f}s earlier, {len(scored)}/{len(prep['scored'])} still pass)"
+                         if prefetched else "")
 
         except KeyboardInterrupt:
             log.info("Shutting down.")
+            stage_pool.shutdown(wait=False, cancel_futures=True)
+            if tx_tracker and not tx_tracker.wait_idle(TX_SHUTDOWN_WAIT):
+                log.warning("Shutting down with %d transaction(s) unconfirmed", tx_tracker.stats()["pending"])
+            apply_claim_results()
+            positions = [p for p in positions if p["status"] != "done"]
             save_positions(positions)
+            position_persister.flush()
+            trade_journal().sync()
             break
         except Exception as e:
             log.error("Main loop error: %s", e)
 
-        time.sleep(POLL_SECONDS)
+        # Never let a stage spill into the next tick (the sweep shares the wallet nonce)
+        for fut in (prefetch_fut, resolve_fut, sweep_fut):
+            if fut is not None:
+                try:
+                    fut.result()
+                except Exception as e:
+                    log.debug("Stage failed: %s", e)
+        if redemption_batcher.pending():
+            try:
+                redemption_batcher.flush()
+                save_positions(positions)
+            except Exception as e:
+                log.error("Redemption batch failed: %s", e)
+        log.info("Tick took %.1fs%s", time.time() - t_tick, " (stages overlapped)" if TICK_OVERLAP else "")
+
+        position_persister.flush()
+        m = position_persister.take_tick_metrics()
+        log.info("Persist: %d flush(es), %d rows, %d bytes this tick", m["flushes"], m["rows"], m["bytes"])
+
+        if not user_stream_on:
+            time.sleep(POLL_SECONDS)
+            continue
+        # Between ticks, user-channel fills wake the loop: sells go out (and filled
+        # sells are closed) as the events arrive; step 2 stays as the REST check.
+        next_tick = time.time() + POLL_SECONDS
+        try:
+            while user_stream.wait(next_tick - time.time()):
+                if handle_stream_fills(clob, positions):
+                    positions = [p for p in positions if p["status"] != "done"]
+                    save_positions(positions)
+                    bot_state["positions"] = positions
+        except Exception as e:
+            log.error("Stream fill handling error: %s", e)
 
 
 if __name__ == "__main__":
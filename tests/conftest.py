@@ -0,0 +1,38 @@
+"""
+Shared setup: bot.py imported against a throwaway DATA_DIR, and the local
+mock stack from bench/mock_stack.py as a fixture.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="vig-tests-"))
+
+
+def wait_for(cond, timeout: float = 5.0) -> bool:
+    """Poll cond() until it is truthy or timeout passes."""
+    import time
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if cond():
+            return True
+        time.sleep(0.02)
+    return bool(cond())
+
+
+@pytest.fixture
+def stack():
+    from eth_account import Account
+    from mock_stack import MockStack, Universe, BENCH_KEY
+
+    universe = Universe(200, 10, Account.from_key(BENCH_KEY).address)
+    mock = MockStack(universe)
+    mock.start()
+    yield mock
+    mock.stop()
@@ -0,0 +1,156 @@
+"""LogRangeFetcher range splitting and retries, TokenDiscovery checkpoints against the mock RPC, NonceManager."""
+
+from types import SimpleNamespace
+
+from web3 import Web3
+
+import bot
+
+
+def _fetcher(chunk=1000, min_chunk=10, max_chunk=5000, workers=4):
+    return bot.LogRangeFetcher(workers, chunk, min_chunk, max_chunk)
+
+
+def _covered(results) -> list:
+    blocks = []
+    for (a, b), _ in results:
+        blocks.extend(range(a, b + 1))
+    return sorted(blocks)
+
+
+def test_wide_ranges_are_split_until_accepted():
+    def fetch(a, b):
+        if b - a + 1 > 300:
+            raise ValueError("query returned more than 10000 results")
+        return b - a + 1
+
+    fetcher = _fetcher(chunk=1000)
+    results, failed, stats = fetcher.run(fetch, 0, 9_999)
+    assert failed == []
+    assert _covered(results) == list(range(10_000))  # every block exactly once
+    assert stats["splits"] > 0 and stats["blocks"] == 10_000
+    assert fetcher.chunk < 1000  # new ranges start closer to what the provider takes
+
+
+def test_chunk_grows_after_a_streak_of_successes():
+    fetcher = _fetcher(chunk=100, max_chunk=400, workers=1)
+    fetcher.run(lambda a, b: [], 0, 9_999)
+    assert fetcher.chunk == 400
+
+
+def test_rate_limits_are_retried_without_splitting(monkeypatch):
+    monkeypatch.setattr(bot, "HTTP_BACKOFF", 0)
+    calls = {}
+
+    def fetch(a, b):
+        calls[(a, b)] = calls.get((a, b), 0) + 1
+        if calls[(a, b)] <= 2:
+            raise ValueError("429 Too Many Requests")
+        return []
+
+    fetcher = _fetcher(chunk=1000)
+    results, failed, stats = fetcher.run(fetch, 0, 2_999)
+    assert failed == [] and stats["splits"] == 0
+    assert stats["throttled"] == 6
+    assert sorted(rng for rng, _ in results) == [(0, 999), (1000, 1999), (2000, 2999)]
+    assert fetcher.chunk >= 1000
+
+
+def test_other_errors_fail_after_max_attempts():
+    calls = []
+
+    def fetch(a, b):
+        calls.append((a, b))
+        if a == 1000:
+            raise ValueError("internal error")
+        return []
+
+    results, failed, _ = _fetcher(chunk=1000).run(fetch, 0, 2_999, extra_ranges=[(50, 60)])
+    assert failed == [(1000, 1999)]
+    assert calls.count((1000, 1999)) == bot.LogRangeFetcher.MAX_ATTEMPTS
+    assert sorted(rng for rng, _ in results) == [(0, 999), (50, 60), (2000, 2999)]
+
+
+def _chain(stack):
+    w3 = Web3(Web3.HTTPProvider(stack.urls["rpc"]))
+    ctf = w3.eth.contract(address=Web3.to_checksum_address(bot.CTF_ADDRESS), abi=bot.CTF_ABI)
+    return w3, SimpleNamespace(address=stack.u.wallet), ctf
+
+
+def test_discovery_checkpoints_and_deltas(stack, tmp_path):
+    u = stack.u
+    w3, account, ctf = _chain(stack)
+    store = bot.StateStore(str(tmp_path / "state.db"))
+    u.max_log_range = 30_000
+
+    discovery = bot.TokenDiscovery(store)
+    discovery.fetcher.chunk = 200_000
+    held = discovery.update(w3, account, ctf)
+    assert set(held) == {tid for tid, bal in u.balances.items() if bal > 0}
+    assert discovery.fetcher.chunk < 200_000  # split down after the provider refused the wide ranges
+    safe = u.head - bot.DISCOVERY_CONFIRMATIONS
+    assert store.get_meta("discovery_last_block") == str(safe)
+    assert store.load_chain_tokens() == {tid: u.balances[tid] for tid in held}
+
+    # the next run picks up from the checkpoint, with the index reloaded from disk
+    known = held[0]
+    before = u.balances[known]
+    u.balances[known] += 999  # not announced by a log: a delta run must not re-read it
+    u.receive(known, 5, blocks=100)
+    u.receive(424242, 7, blocks=100)
+    discovery = bot.TokenDiscovery(store)
+    assert discovery.last_block == safe
+    held = discovery.update(w3, account, ctf)
+    assert discovery.balances[known] == before + 5  # applied as a delta
+    assert discovery.balances[424242] == 7  # first sighting: seeded from balanceOf
+    assert 424242 in held
+    assert store.get_meta("discovery_last_block") == str(u.head - bot.DISCOVERY_CONFIRMATIONS)
+
+
+def test_discovery_retries_failed_ranges(stack, tmp_path):
+    u = stack.u
+    w3, account, ctf = _chain(stack)
+    store = bot.StateStore(str(tmp_path / "state.db"))
+    discovery = bot.TokenDiscovery(store)
+    discovery.update(w3, account, ctf)
+
+    u.logs_down = True
+    u.receive(515151, 3, blocks=200)
+    held = discovery.update(w3, account, ctf)
+    assert 515151 not in held
+    failed = store.load_failed_ranges()
+    assert failed and failed[0][0] == discovery.last_block - 199
+
+    u.logs_down = False
+    held = bot.TokenDiscovery(store).update(w3, account, ctf)
+    assert 515151 in held
+    assert store.load_failed_ranges() == []
+
+
+def _nonces(chain: list) -> bot.NonceManager:
+    w3 = SimpleNamespace(eth=SimpleNamespace(get_transaction_count=lambda address, block: chain[0]))
+    return bot.NonceManager(w3, "0xabc")
+
+
+def test_nonces_are_sequential_and_released_gaps_refilled():
+    nonces = _nonces([5])
+    assert [nonces.take() for _ in range(3)] == [5, 6, 7]
+    nonces.release(6)
+    nonces.release(42)  # never handed out: ignored
+    assert nonces.take() == 6
+    assert nonces.take() == 8
+
+
+def test_sync_only_moves_forward_and_drops_used_gaps():
+    chain = [10]
+    nonces = _nonces(chain)
+    assert [nonces.take() for _ in range(3)] == [10, 11, 12]
+    nonces.release(10)
+    nonces.release(12)
+    chain[0] = 11  # nonce 10 was mined after all
+    assert nonces.sync() == 13
+    assert nonces.take() == 12
+    assert nonces.take() == 13
+    chain[0] = 20  # transactions sent from elsewhere
+    assert nonces.sync() == 20
+    assert nonces.take() == 20
@@ -0,0 +1,95 @@
+"""MarketStream: local L2 books from snapshots and deltas, and against the mock ws:// channel."""
+
+import bot
+from conftest import wait_for
+
+
+def _stream(*token_ids):
+    stream = bot.MarketStream("ws://unused", 100)
+    stream.set_assets(token_ids)
+    stream._connected = True  # get_books() only serves while "connected"
+    return stream
+
+
+def _book(tid, seq=1, ts=1000):
+    return {"event_type": "book", "asset_id": tid, "timestamp": str(ts), "seq": seq,
+            "bids": [{"price": "0.20", "size": "10"}, {"price": "0.21", "size": "5"}],
+            "asks": [{"price": "0.24", "size": "7"}, {"price": "0.23", "size": "3"}]}
+
+
+def _change(tid, side, price, size, seq, ts=2000):
+    return {"event_type": "price_change", "timestamp": str(ts), "seq": seq,
+            "price_changes": [{"asset_id": tid, "side": side, "price": price, "size": size}]}
+
+
+def test_snapshot_orders_levels_like_rest():
+    stream = _stream("t1")
+    stream.apply(_book("t1"))
+    book = stream.get_books(["t1"])["t1"]
+    assert [lvl.price for lvl in book.bids] == ["0.2", "0.21"]  # best bid last
+    assert [lvl.price for lvl in book.asks] == ["0.24", "0.23"]  # best ask last
+
+
+def test_deltas_set_and_remove_levels():
+    stream = _stream("t1")
+    stream.apply(_book("t1", seq=1))
+    stream.apply(_change("t1", "BUY", "0.22", "4", seq=2))
+    stream.apply(_change("t1", "SELL", "0.23", "0", seq=3))
+    book = stream.get_books(["t1"])["t1"]
+    assert book.bids[-1].price == "0.22" and book.bids[-1].size == "4.0"
+    assert [lvl.price for lvl in book.asks] == ["0.24"]
+    assert stream.stats()["deltas"] == 2
+
+
+def test_untracked_assets_are_ignored():
+    stream = _stream("t1")
+    stream.apply(_book("t2"))
+    assert stream.get_books(["t2"]) == {}
+
+
+def test_sequence_gap_unsyncs_the_book():
+    stream = _stream("t1")
+    stream.apply(_book("t1", seq=1))
+    stream.apply(_change("t1", "BUY", "0.22", "4", seq=3))
+    assert stream.get_books(["t1"]) == {}
+    assert stream.stats()["gaps"] == 1
+    stream.apply(_book("t1", seq=3))  # the resync snapshot
+    assert "t1" in stream.get_books(["t1"])
+
+
+def test_deltas_older_than_the_snapshot_are_dropped():
+    stream = _stream("t1")
+    stream.apply(_book("t1", seq=None, ts=5000))
+    stream.apply(_change("t1", "BUY", "0.22", "4", seq=None, ts=4000))
+    assert stream.stats()["stale_dropped"] == 1
+    assert stream.get_books(["t1"])["t1"].bids[-1].price == "0.21"
+
+
+def test_stream_against_mock_channel(stack):
+    t1, t2, t3 = list(stack.u.tokens)[:3]
+    stream = bot.MarketStream(stack.urls["ws"] + "/ws/market", 100)
+    stream.set_assets([t1, t2])
+    assert stream.start()
+    assert wait_for(lambda: stream.stats()["synced_books"] == 2)
+    rest = stack.u.book(t1)
+    assert stream.get_books([t1])[t1].asks[-1].price == str(float(rest["asks"][-1]["price"]))
+
+    # delta in sequence
+    stack.push_price_change(t1, "BUY", 0.002, 999)
+    assert wait_for(lambda: stream.stats()["deltas"] == 1)
+    assert any(lvl.size == "999.0" for lvl in stream.get_books([t1])[t1].bids)
+
+    # a skipped seq resyncs that one book from a fresh snapshot
+    stack.push_price_change(t1, "BUY", 0.003, 5, seq=stack._ws_seq[t1] + 2)
+    assert wait_for(lambda: stream.stats()["gaps"] == 1)
+    assert wait_for(lambda: t1 in stream.get_books([t1]))
+
+    # adding an asset while connected subscribes just that one
+    stream.set_assets([t1, t2, t3])
+    assert wait_for(lambda: stream.stats()["synced_books"] == 3)
+
+    # server drops the socket: books go unsynced, then come back after resubscribing
+    stack.drop_ws()
+    assert wait_for(lambda: stream.stats()["reconnects"] == 1)
+    assert wait_for(lambda: stream.stats()["synced_books"] == 3, timeout=10)
+    assert set(stream.get_books([t1, t2, t3])) == {t1, t2, t3}
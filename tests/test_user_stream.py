@@ -0,0 +1,90 @@
+"""UserStream fill accounting, OrderIndex precedence, and the stream against the mock ws:// user channel."""
+
+from types import SimpleNamespace
+
+import bot
+from conftest import wait_for
+
+
+def _order(oid, matched, size="10", kind="UPDATE"):
+    return {"event_type": "order", "type": kind, "id": oid, "original_size": size, "size_matched": matched}
+
+
+def _trade(oid, amount):
+    return {"event_type": "trade", "taker_order_id": oid, "matched_amount": amount, "size": amount}
+
+
+def test_fills_come_from_cumulative_size_matched():
+    stream = bot.UserStream("ws://unused")
+    stream.apply(_order("o1", "0", kind="PLACEMENT"))
+    stream.apply(_order("o1", "4"))
+    assert stream.status("o1") == "LIVE"
+    stream.apply(_order("o1", "10"))
+    assert stream.status("o1") == "FILLED"
+    assert [oid for oid, _ in stream.take_filled()] == ["o1"]
+    assert stream.wake.is_set()
+    stream.apply(_order("o1", "10"))  # repeated update: no second fill
+    assert stream.take_filled() == [] and stream.stats()["fills"] == 1
+
+
+def test_trade_events_do_not_add_to_the_match():
+    stream = bot.UserStream("ws://unused")
+    stream.apply(_order("o1", "5"))
+    stream.apply(_trade("o1", "5"))
+    assert stream.status("o1") == "LIVE"
+    assert stream.stats()["events"] == 2
+
+
+def test_size_matched_never_goes_backwards():
+    stream = bot.UserStream("ws://unused")
+    stream.apply(_order("o1", "8"))
+    stream.apply(_order("o1", "3"))  # late, out-of-order update
+    stream.apply(_order("o1", None))
+    stream.apply(_order("o1", "10"))
+    assert stream.status("o1") == "FILLED"
+
+
+def test_cancellation_invalidates_only_live_orders():
+    stream = bot.UserStream("ws://unused")
+    stream.apply(_order("o1", "2"))
+    stream.apply(_order("o1", "2", kind="CANCELLATION"))
+    assert stream.status("o1") == "INVALID"
+    stream.apply(_order("o2", "10"))
+    stream.apply(_order("o2", "10", kind="CANCELLATION"))
+    assert stream.status("o2") == "FILLED"
+    assert stream.status("unknown") is None
+
+
+def test_order_index_prefers_the_snapshot(monkeypatch):
+    stream = bot.UserStream("ws://unused")
+    stream.apply(_order("listed", "10"))
+    stream.apply(_order("gone", "10"))
+    monkeypatch.setattr(bot, "user_stream", stream)
+    monkeypatch.setattr(bot, "user_stream_on", True)
+    client = SimpleNamespace(get_orders=lambda: [{"id": "listed", "status": "LIVE"}],
+                             get_order=lambda oid: {"id": oid, "status": "LIVE"})
+    index = bot.OrderIndex(client)
+    assert index.refresh()
+    assert index.status("listed") == "LIVE"   # still on the book: the stream doesn't override it
+    assert index.status("gone") == "FILLED"   # off the book: the stream answers before REST
+    assert index.lookups == 0
+
+
+def test_stream_against_mock_channel(stack):
+    live = [oid for oid, o in stack.u.orders.items() if o["status"] == "LIVE"][:2]
+    creds = SimpleNamespace(api_key="bench-key", api_secret="s", api_passphrase="p")
+    stream = bot.UserStream(stack.urls["ws"] + "/ws/user")
+    assert stream.start(creds)
+    assert wait_for(lambda: any(c.authed for c in stack.ws_connections("user")))
+
+    stack.u.fill(live[0])
+    assert wait_for(lambda: stream.status(live[0]) == "FILLED")
+    assert [oid for oid, _ in stream.take_filled()] == [live[0]]
+
+    # fills announced after a reconnect still arrive
+    stack.drop_ws()
+    assert wait_for(lambda: stream.stats()["reconnects"] == 1)
+    assert wait_for(lambda: any(c.authed for c in stack.ws_connections("user")), timeout=10)
+    stack.u.fill(live[1])
+    assert wait_for(lambda: stream.status(live[1]) == "FILLED")
+    assert stream.stats()["fills"] == 2